@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import List, Sequence, Tuple
+
+from timeseries import METRICS, to_epoch
+
+AGGREGATES = ("mean", "min", "max", "p95", "count")
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+def parse_resolution(value: str) -> int:
+    """Parse a bucket size like '30s', '5m', '1h', '1d' or plain seconds"""
+    value = str(value).strip().lower()
+    if value.isdigit():
+        seconds = int(value)
+    elif len(value) > 1 and value[-1] in _UNITS and value[:-1].isdigit():
+        seconds = int(value[:-1]) * _UNITS[value[-1]]
+    else:
+        raise ValueError(f"Invalid resolution: {value}")
+    if seconds <= 0:
+        raise ValueError("Resolution must be positive")
+    return seconds
+
+def arrays_from_records(records: Sequence[dict]) -> Tuple[np.ndarray, np.ndarray]:
+    """Turn reading dicts (e.g. database rows) into timestamp/value arrays"""
+    if not records:
+        return np.empty(0), np.empty((0, len(METRICS)))
+    df = pd.DataFrame.from_records(records)
+    timestamps = np.array([to_epoch(ts) for ts in df["timestamp"]], dtype=np.float64)
+    values = df.reindex(columns=list(METRICS)).to_numpy(dtype=np.float64, na_value=np.nan)
+    order = np.argsort(timestamps, kind="stable")
+    return timestamps[order], values[order]
+
+def bucket_aggregate(timestamps: np.ndarray, values: np.ndarray, resolution: int,
+                     aggregates: Sequence[str] = AGGREGATES) -> pd.DataFrame:
+    """Aggregate readings into fixed time buckets.
+
+    Returns a frame indexed by bucket start (epoch seconds) with one column per
+    (metric, aggregate) pair plus a ``count`` column of readings per bucket.
+    """
+    unknown = set(aggregates) - set(AGGREGATES)
+    if unknown:
+        raise ValueError(f"Unknown aggregate: {', '.join(sorted(unknown))}")
+    df = pd.DataFrame(values, columns=list(METRICS))
+    buckets = (timestamps // resolution) * resolution
+    grouped = df.groupby(buckets, sort=True)
+
+    parts = {}
+    for agg in aggregates:
+        if agg == "count":
+            continue
+        frame = grouped.quantile(0.95) if agg == "p95" else grouped.agg(agg)
+        for metric in METRICS:
+            parts[(metric, agg)] = frame[metric]
+    result = pd.DataFrame(parts)
+    result["count"] = grouped.size()
+    return result
+
+def aggregate_records(timestamps: np.ndarray, values: np.ndarray, resolution: int,
+                      agg: str = "mean") -> List[dict]:
+    """Bucketed records for the API.
+
+    A single aggregate gives ``{"pm25": 12.3, ...}``; ``agg="all"`` nests every
+    aggregate per metric as ``{"pm25": {"mean": ..., "min": ..., ...}}``.
+    """
+    aggregates = [a for a in AGGREGATES if a != "count"] if agg == "all" else [agg]
+    if not len(timestamps):
+        return []
+    frame = bucket_aggregate(timestamps, values, resolution, aggregates)
+    frame = frame.astype(object).where(frame.notna(), None)
+
+    records = []
+    starts = frame.index.to_numpy()
+    counts = frame["count"].tolist()
+    columns = {key: frame[key].tolist() for key in frame.columns if key != "count"}
+    for i, start in enumerate(starts):
+        record = {
+            "timestamp": datetime.fromtimestamp(float(start)).isoformat(),
+            "count": int(counts[i])
+        }
+        for metric in METRICS:
+            if agg == "count":
+                continue
+            if agg == "all":
+                record[metric] = {a: columns[(metric, a)][i] for a in aggregates}
+            else:
+                record[metric] = columns[(metric, agg)][i]
+        records.append(record)
+    return records
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets downsampling; returns the kept indices.
+
+    NaN values in ``y`` are skipped before downsampling.
+    """
+    valid = np.flatnonzero(~np.isnan(y))
+    n = len(valid)
+    if threshold >= n or threshold < 3:
+        return valid
+    xs, ys = x[valid], y[valid]
+
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        lo = int(i * every) + 1
+        hi = int((i + 1) * every) + 1
+        next_hi = min(int((i + 2) * every) + 1, n)
+        avg_x = xs[hi:next_hi].mean()
+        avg_y = ys[hi:next_hi].mean()
+        area = np.abs((xs[a] - avg_x) * (ys[lo:hi] - ys[a]) - (xs[a] - xs[lo:hi]) * (avg_y - ys[a]))
+        a = lo + int(np.argmax(area))
+        kept[i + 1] = a
+    return valid[kept]
+
+def lttb(timestamps: np.ndarray, values: np.ndarray, points: int,
+         metric: str = "pm25") -> Tuple[np.ndarray, np.ndarray]:
+    """Downsample rows to ``points`` using LTTB on one metric"""
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric: {metric}")
+    indices = lttb_indices(timestamps, values[:, METRICS.index(metric)], points)
+    return timestamps[indices], values[indices]
@@ -0,0 +1,286 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import itertools
+
+from models import Alert, AlertSeverity, AlertType
+from timeseries import to_epoch
+
+ABOVE = "above"
+BELOW = "below"
+
+# Metric watched by each threshold alert type, and its unit for messages
+ALERT_METRICS = {
+    AlertType.HIGH_PM25: ("pm25", "μg/m³"),
+    AlertType.HIGH_PM10: ("pm10", "μg/m³"),
+    AlertType.HIGH_CO2: ("co2", "ppm"),
+    AlertType.TEMPERATURE_EXTREME: ("temperature", "°C"),
+    AlertType.HUMIDITY_EXTREME: ("humidity", "%"),
+}
+
+METRIC_LABELS = {"pm25": "PM2.5", "pm10": "PM10", "co2": "CO2"}
+
+# Rules with this sensor_id apply to every sensor
+ANY_SENSOR = "*"
+
+class AlertRule:
+    """A threshold rule with hysteresis and debounce.
+
+    The rule fires once the metric has been past ``threshold`` (in
+    ``direction``) for ``debounce_seconds``, and resolves once it is back by more
+    than ``hysteresis``, so a value hovering around the threshold fires once.
+    """
+
+    __slots__ = ("id", "sensor_id", "alert_type", "metric", "unit", "threshold", "direction",
+                 "hysteresis", "debounce_seconds", "severity", "created_at")
+
+    def __init__(self, rule_id: str, sensor_id: str, alert_type: AlertType, threshold: float,
+                 direction: str = ABOVE, hysteresis: float = 0.0, debounce_seconds: float = 0.0,
+                 severity: Optional[AlertSeverity] = None):
+        if alert_type not in ALERT_METRICS:
+            raise ValueError(f"Alert type {alert_type.value} is not a threshold alert")
+        if direction not in (ABOVE, BELOW):
+            raise ValueError(f"Unknown direction: {direction}")
+        if hysteresis < 0 or debounce_seconds < 0:
+            raise ValueError("hysteresis and debounce_seconds must not be negative")
+        self.id = rule_id
+        self.sensor_id = sensor_id
+        self.alert_type = alert_type
+        self.metric, self.unit = ALERT_METRICS[alert_type]
+        self.threshold = threshold
+        self.direction = direction
+        self.hysteresis = hysteresis
+        self.debounce_seconds = debounce_seconds
+        self.severity = severity
+        self.created_at = datetime.now()
+
+    def breached(self, value: float) -> bool:
+        return value > self.threshold if self.direction == ABOVE else value < self.threshold
+
+    def cleared(self, value: float) -> bool:
+        if self.direction == ABOVE:
+            return value <= self.threshold - self.hysteresis
+        return value >= self.threshold + self.hysteresis
+
+    def severity_for(self, value: float) -> AlertSeverity:
+        """Explicit severity, or one derived from how far past the threshold the value is"""
+        if self.severity is not None:
+            return self.severity
+        if not self.threshold:
+            return AlertSeverity.MODERATE
+        ratio = value / self.threshold if self.direction == ABOVE else self.threshold / max(value, 1e-9)
+        if ratio >= 2:
+            return AlertSeverity.CRITICAL
+        if ratio >= 1.5:
+            return AlertSeverity.HIGH
+        if ratio >= 1.2:
+            return AlertSeverity.MODERATE
+        return AlertSeverity.LOW
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "sensor_id": self.sensor_id,
+            "alert_type": self.alert_type.value,
+            "threshold": self.threshold,
+            "direction": self.direction,
+            "hysteresis": self.hysteresis,
+            "debounce_seconds": self.debounce_seconds,
+            "severity": self.severity.value if self.severity else None,
+            "created_at": self.created_at.isoformat()
+        }
+
+class _RuleState:
+    __slots__ = ("breach_since", "alert")
+
+    def __init__(self):
+        self.breach_since: Optional[float] = None
+        self.alert: Optional[dict] = None
+
+class AlertEngine:
+    """Evaluates threshold rules against each reading as it arrives.
+
+    Rules are indexed by (sensor_id, metric), with ``*`` rules indexed by
+    metric alone, so a reading only touches the rules that apply to it.
+    ``evaluate`` returns fired and resolved alerts as dicts ready to broadcast.
+    """
+
+    def __init__(self, id_prefix: str = "rule_"):
+        self.id_prefix = id_prefix
+        self.rules: Dict[str, AlertRule] = {}
+        self._index: Dict[Tuple[str, str], Dict[str, AlertRule]] = {}
+        # Keyed by (rule id, sensor id) since ``*`` rules track every sensor separately
+        self._states: Dict[Tuple[str, str], _RuleState] = {}
+        self.active: Dict[str, dict] = {}
+        self._offline_alerts: Dict[str, dict] = {}
+        self._ids = itertools.count(1)
+        self.evaluations = 0
+        self.fired = 0
+        self.resolved = 0
+
+    def new_rule_id(self) -> str:
+        return f"{self.id_prefix}{next(self._ids)}"
+
+    def add_rule(self, sensor_id: str, alert_type: AlertType, threshold: float,
+                 rule_id: Optional[str] = None, **options) -> AlertRule:
+        """Register a rule and return it"""
+        rule = AlertRule(rule_id or self.new_rule_id(), sensor_id, alert_type, threshold, **options)
+        self.rules[rule.id] = rule
+        self._index.setdefault((sensor_id, rule.metric), {})[rule.id] = rule
+        return rule
+
+    def remove_rule(self, rule_id: str) -> Tuple[Optional[AlertRule], List[dict]]:
+        """Drop a rule; returns it and the resolutions of the alerts it had active,
+        ready to broadcast like ``evaluate``'s"""
+        rule = self.rules.pop(rule_id, None)
+        if rule is None:
+            return None, []
+        bucket = self._index.get((rule.sensor_id, rule.metric))
+        if bucket is not None:
+            bucket.pop(rule_id, None)
+            if not bucket:
+                del self._index[(rule.sensor_id, rule.metric)]
+        resolved = []
+        for key in [key for key in self._states if key[0] == rule_id]:
+            state = self._states.pop(key)
+            if state.alert is not None:
+                resolved.append(self._resolve(state.alert, state.alert["value"]))
+        return rule, resolved
+
+    def _matching_rules(self, sensor_id: str, metric: str):
+        specific = self._index.get((sensor_id, metric))
+        if specific:
+            yield from specific.values()
+        wildcard = self._index.get((ANY_SENSOR, metric))
+        if wildcard:
+            yield from wildcard.values()
+
+    def evaluate(self, reading: dict) -> List[dict]:
+        """Check a reading against its rules; returns alerts that fired or resolved"""
+        sensor_id = reading.get("sensor_id")
+        if sensor_id is None or not self._index:
+            return []
+        try:
+            now = to_epoch(reading.get("timestamp"))
+        except (TypeError, ValueError):
+            now = datetime.now().timestamp()
+
+        events = []
+        for metric, _ in ALERT_METRICS.values():
+            value = reading.get(metric)
+            if value is None:
+                continue
+            for rule in self._matching_rules(sensor_id, metric):
+                self.evaluations += 1
+                key = (rule.id, sensor_id)
+                state = self._states.get(key)
+                if state is None:
+                    if not rule.breached(value):
+                        continue
+                    state = self._states[key] = _RuleState()
+
+                if state.alert is None:
+                    if not rule.breached(value):
+                        # Back under the threshold before the debounce elapsed
+                        del self._states[key]
+                        continue
+                    if state.breach_since is None:
+                        state.breach_since = now
+                    if now - state.breach_since >= rule.debounce_seconds:
+                        state.alert = self._fire(rule, sensor_id, value, reading.get("location"), now)
+                        events.append(state.alert)
+                elif rule.cleared(value):
+                    events.append(self._resolve(state.alert, value))
+                    del self._states[key]
+        return events
+
+    def _fire(self, rule: AlertRule, sensor_id: str, value: float, location: Optional[str], now: float) -> dict:
+        self.fired += 1
+        comparison = "above" if rule.direction == ABOVE else "below"
+        label = METRIC_LABELS.get(rule.metric, rule.metric.capitalize())
+        where = f" at {location}" if location else ""
+        alert = {
+            # From the reading that fired it, so every worker gives the alert the same id
+            "id": f"alert_{sensor_id}_{rule.id}_{int(now * 1000)}",
+            "rule_id": rule.id,
+            "sensor_id": sensor_id,
+            "type": rule.alert_type.value,
+            "message": f"{label} {comparison} {rule.threshold:g} {rule.unit}{where} ({value:g} {rule.unit})",
+            "severity": rule.severity_for(value).value,
+            "threshold": rule.threshold,
+            "value": value,
+            "timestamp": datetime.now().isoformat(),
+            "active": True
+        }
+        self.active[alert["id"]] = alert
+        return alert
+
+    def _resolve(self, alert: dict, value: float) -> dict:
+        self.resolved += 1
+        self.active.pop(alert["id"], None)
+        return {
+            **alert,
+            "value": value,
+            "active": False,
+            "resolved_at": datetime.now().isoformat()
+        }
+
+    def sensor_offline(self, sensor_id: str, last_seen: Optional[datetime]) -> dict:
+        """Raise a SENSOR_OFFLINE alert for a sensor that stopped reporting"""
+        self.fired += 1
+        since = f" since {last_seen.strftime('%H:%M:%S')}" if last_seen else ""
+        alert = {
+            "id": f"alert_{sensor_id}_offline_{int(datetime.now().timestamp() * 1000)}",
+            "sensor_id": sensor_id,
+            "type": AlertType.SENSOR_OFFLINE.value,
+            "message": f"Sensor {sensor_id} has not reported{since}",
+            "severity": AlertSeverity.HIGH.value,
+            "threshold": 0,
+            "last_seen": last_seen.isoformat() if last_seen else None,
+            "timestamp": datetime.now().isoformat(),
+            "active": True
+        }
+        self.active[alert["id"]] = alert
+        self._offline_alerts[sensor_id] = alert
+        return alert
+
+    def sensor_online(self, sensor_id: str) -> Optional[dict]:
+        """Resolve the SENSOR_OFFLINE alert for a sensor that reported again"""
+        alert = self._offline_alerts.pop(sensor_id, None)
+        if alert is None:
+            return None
+        self.resolved += 1
+        self.active.pop(alert["id"], None)
+        return {**alert, "active": False, "resolved_at": datetime.now().isoformat()}
+
+    def get_active_alerts(self) -> List[dict]:
+        """Alerts that have fired and not yet resolved, newest first"""
+        return sorted(self.active.values(), key=lambda alert: alert["timestamp"], reverse=True)
+
+    def get_stats(self) -> dict:
+        """Report rule and alert counters"""
+        return {
+            "rules": len(self.rules),
+            "active_alerts": len(self.active),
+            "evaluations": self.evaluations,
+            "fired": self.fired,
+            "resolved": self.resolved
+        }
+
+def alert_row(alert: dict) -> dict:
+    """Row for the alerts table, built through the ``Alert`` model.
+
+    ``alert_id`` is the alert's own id, so the row written when it fires is
+    updated in place when it resolves.
+    """
+    model = Alert(
+        alert_id=alert["id"],
+        sensor_id=alert["sensor_id"],
+        alert_type=AlertType(alert["type"]),
+        message=alert["message"],
+        severity=AlertSeverity(alert["severity"]),
+        threshold=alert["threshold"],
+        active=alert["active"],
+        created_at=datetime.fromisoformat(alert["timestamp"]),
+        resolved_at=datetime.fromisoformat(alert["resolved_at"]) if alert.get("resolved_at") else None
+    )
+    return model.model_dump(mode="json", exclude={"id"}, exclude_none=True)
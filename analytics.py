@@ -0,0 +1,373 @@
+import asyncio
+import time
+import warnings
+from collections import OrderedDict
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+from rollups import STATS, RollupStore
+from snapshot import Snapshot, dumps
+from timeseries import METRICS, TimeSeriesStore
+
+# Exceedance thresholds, compared with bucket means
+THRESHOLDS = {
+    "pm25": 15.0,   # WHO 2021 24-hour guideline, µg/m³
+    "pm10": 45.0,   # WHO 2021 24-hour guideline, µg/m³
+    "aqi": 100.0    # above "Moderate" on the US AQI scale
+}
+PERCENTILES = (50, 95)
+MAX_BUCKETS = 20000
+# sensors × buckets held in memory at once; each per-block array is ~5 MB
+MAX_BLOCK_CELLS = 100_000
+# Sensors read from the stores between yields to the event loop
+FILL_STEP = 8
+# sensors × buckets per request, which bounds its CPU time
+MAX_CELLS = 50_000_000
+# Fleet percentiles come from a histogram over asinh(value), ±0.25% relative
+_HISTOGRAM_BINS = 6000
+_HISTOGRAM_RANGE = 15.0
+_BIN_WIDTH = 2 * _HISTOGRAM_RANGE / _HISTOGRAM_BINS
+_SUM, _COUNT = STATS.index("sum"), STATS.index("count")
+_THRESHOLD_COLUMNS = [METRICS.index(metric) for metric in THRESHOLDS]
+
+def default_bucket(range_seconds: int) -> int:
+    """Bucket size for a range when the client doesn't pick one"""
+    if range_seconds <= 6 * 3600:
+        return 60
+    if range_seconds <= 2 * 86400:
+        return 300
+    return 3600
+
+def _nanpercentiles(values: np.ndarray) -> np.ndarray:
+    """``np.nanpercentile(values, PERCENTILES, axis=1)`` for (sensors, buckets, metrics), in one sort"""
+    ordered = np.sort(values, axis=1)  # NaNs sort last
+    valid = (~np.isnan(values)).sum(axis=1)
+    last = np.maximum(valid - 1, 0)[:, None, :]
+    result = []
+    for p in PERCENTILES:
+        position = p / 100 * last
+        below = np.floor(position).astype(np.intp)
+        above = np.minimum(below + 1, last)
+        low = np.take_along_axis(ordered, below, axis=1)
+        high = np.take_along_axis(ordered, above, axis=1)
+        result.append((low + (high - low) * (position - below))[:, 0, :])
+    result = np.stack(result)
+    result[:, valid == 0] = np.nan
+    return result
+
+def _by_metric(row, metrics=METRICS) -> Dict[str, Optional[float]]:
+    return {metric: None if value != value else round(value, 3) for metric, value in zip(metrics, row.tolist())}
+
+class _FleetAccumulator:
+    """Fleet-wide statistics over bucket means, fed one block of sensors at a time"""
+
+    def __init__(self, buckets: int):
+        width = len(METRICS)
+        self.sums = np.zeros((buckets, width))
+        self.counts = np.zeros((buckets, width))
+        self.maximum = np.full(width, np.nan)
+        self.histogram = np.zeros((width, _HISTOGRAM_BINS), dtype=np.int64)
+        # Pairwise-complete co-moments for the metric correlations, around ``shift``
+        self.shift: Optional[np.ndarray] = None
+        self.n = np.zeros((width, width))
+        self.sx = np.zeros((width, width))
+        self.sxx = np.zeros((width, width))
+        self.sxy = np.zeros((width, width))
+
+    def add(self, sums: np.ndarray, counts: np.ndarray, means: np.ndarray):
+        self.sums += sums.sum(axis=0)
+        self.counts += counts.sum(axis=0)
+        pooled = means.reshape(-1, means.shape[-1])
+        valid = ~np.isnan(pooled)
+        self.maximum = np.fmax(self.maximum, np.nanmax(pooled, axis=0))
+        for column in range(pooled.shape[1]):
+            values = pooled[valid[:, column], column]
+            bins = ((np.arcsinh(values) + _HISTOGRAM_RANGE) / _BIN_WIDTH).astype(np.intp)
+            self.histogram[column] += np.bincount(np.clip(bins, 0, _HISTOGRAM_BINS - 1), minlength=_HISTOGRAM_BINS)
+        if self.shift is None:
+            self.shift = np.nan_to_num(np.nanmean(pooled, axis=0))
+        x = np.where(valid, pooled - self.shift, 0.0)
+        v = valid.astype(np.float64)
+        self.n += v.T @ v
+        self.sx += x.T @ v
+        self.sxx += (x * x).T @ v
+        self.sxy += x.T @ x
+
+    def percentiles(self) -> np.ndarray:
+        """(len(PERCENTILES), metrics) from the histogram; NaN for metrics without data"""
+        result = np.full((len(PERCENTILES), len(METRICS)), np.nan)
+        cumulative = np.cumsum(self.histogram, axis=1)
+        for column, counts in enumerate(cumulative):
+            total = counts[-1]
+            if not total:
+                continue
+            for row, p in enumerate(PERCENTILES):
+                index = int(np.searchsorted(counts, max(1, int(np.ceil(p / 100 * total)))))
+                result[row, column] = np.sinh((index + 0.5) * _BIN_WIDTH - _HISTOGRAM_RANGE)
+        return result
+
+    def correlations(self) -> np.ndarray:
+        """Pearson correlation between metrics, NaN with fewer than 3 common buckets"""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            covariance = self.n * self.sxy - self.sx * self.sx.T
+            variance = self.n * self.sxx - self.sx * self.sx
+            correlations = covariance / np.sqrt(variance * variance.T)
+        correlations[self.n < 3] = np.nan
+        return np.clip(correlations, -1.0, 1.0)
+
+class AnalyticsEngine:
+    """Per-sensor and fleet statistics over a time range, vectorized over blocks of sensors.
+
+    Each block's readings are folded into a (sensors, buckets, metrics) grid
+    of sums and counts, from rollups when a tier covers the range and bucket
+    size, and from the raw history otherwise. Blocks hold at most
+    ``MAX_BLOCK_CELLS`` sensors × buckets, so memory stays bounded whatever
+    the fleet size; fleet statistics are accumulated block by block:
+
+    - ``mean``: count-weighted mean of all readings
+    - ``p50``/``p95``/``max``: over bucket means (per sensor; fleet-wide, over
+      every sensor's bucket means, with percentiles from a histogram within
+      ±0.25%)
+    - ``exceedance_hours``: hours of bucket means above ``THRESHOLDS``, per
+      sensor and for the fleet-mean series
+    - ``diurnal``: fleet mean per local hour of day (buckets up to 1h)
+    - ``correlations``: Pearson correlation between metrics over bucket means
+    - ``series``: fleet mean per bucket
+
+    The stores are only safe to read on the event loop, where ingest writes
+    to them: ``compute_async`` fills each block's sums and counts there (they
+    are copies) and leaves the statistics to a worker thread.
+    """
+
+    def __init__(self, history: TimeSeriesStore, rollups: RollupStore):
+        self.history = history
+        self.rollups = rollups
+
+    def _fill(self, sensor_id: str, start: float, end: float, span: int, bucket: int,
+              sums: np.ndarray, counts: np.ndarray) -> str:
+        """Add a sensor's readings to its (buckets, metrics) slices; returns the source used"""
+        tier = self.rollups.tier_for(bucket)
+        if tier and sensor_id in self.rollups and self.rollups.retention_seconds(tier) >= span:
+            starts, stats = self.rollups.query(sensor_id, tier, start, end)
+            values, present = stats[:, _SUM], stats[:, _COUNT]
+            source = f"rollup_{tier}"
+        else:
+            starts, values = self.history.query(sensor_id, start, end)
+            present = ~np.isnan(values)
+            values = np.where(present, values, 0.0)
+            source = "history"
+        index = ((starts - start) // bucket).astype(np.intp)
+        keep = (index >= 0) & (index < len(sums))
+        index, values, present = index[keep], values[keep], present[keep]
+        for column in range(sums.shape[1]):
+            sums[:, column] += np.bincount(index, values[:, column], minlength=len(sums))
+            counts[:, column] += np.bincount(index, present[:, column], minlength=len(counts))
+        return source
+
+    def _plan(self, range_seconds: int, bucket_seconds: int, now: Optional[float]) -> "_Run":
+        now = time.time() if now is None else now
+        start = ((now - range_seconds) // bucket_seconds) * bucket_seconds
+        buckets = int(np.ceil((now - start) / bucket_seconds)) or 1
+        if buckets > MAX_BUCKETS:
+            raise ValueError(f"range/bucket gives {buckets} buckets; the limit is {MAX_BUCKETS}")
+        sensor_ids = sorted(set(self.history.buffers) | set(self.rollups.series))
+        if len(sensor_ids) * buckets > MAX_CELLS:
+            raise ValueError(f"{len(sensor_ids)} sensors × {buckets} buckets is over the limit of "
+                             f"{MAX_CELLS}; use a larger bucket or a shorter range")
+        return _Run(range_seconds, bucket_seconds, start, now, buckets, sensor_ids)
+
+    def compute(self, range_seconds: int, bucket_seconds: int, now: Optional[float] = None) -> dict:
+        """Compute in one go, for callers that nothing else is ingesting for (tests, benchmarks)"""
+        run = self._plan(range_seconds, bucket_seconds, now)
+        for block_ids in run.blocks():
+            sums, counts = run.grid(len(block_ids))
+            for row, sensor_id in enumerate(block_ids):
+                run.sources.add(self._fill(sensor_id, run.start, run.now, range_seconds, bucket_seconds,
+                                           sums[row], counts[row]))
+            run.add(block_ids, sums, counts)
+        return run.result()
+
+    async def compute_async(self, range_seconds: int, bucket_seconds: int, now: Optional[float] = None) -> dict:
+        """Compute while ingest runs: the stores are read on the event loop, ``FILL_STEP``
+        sensors at a time, and only the copied sums and counts go to a worker thread"""
+        run = self._plan(range_seconds, bucket_seconds, now)
+        for block_ids in run.blocks():
+            sums, counts = run.grid(len(block_ids))
+            for row, sensor_id in enumerate(block_ids):
+                run.sources.add(self._fill(sensor_id, run.start, run.now, range_seconds, bucket_seconds,
+                                           sums[row], counts[row]))
+                if row % FILL_STEP == FILL_STEP - 1:
+                    await asyncio.sleep(0)
+            await asyncio.to_thread(run.add, block_ids, sums, counts)
+        return await asyncio.to_thread(run.result)
+
+class _Run:
+    """One analytics computation: per-sensor summaries and the fleet accumulator, fed block by block.
+
+    Works only on the sums and counts it is given, never on the stores, so
+    ``add`` and ``result`` can run in a worker thread.
+    """
+
+    def __init__(self, range_seconds: int, bucket_seconds: int, start: float, now: float,
+                 buckets: int, sensor_ids: List[str]):
+        self.range_seconds = range_seconds
+        self.bucket_seconds = bucket_seconds
+        self.start = start
+        self.now = now
+        self.buckets = buckets
+        self.sensor_ids = sensor_ids
+        self.fleet = _FleetAccumulator(buckets)
+        self.sensors: Dict[str, dict] = {}
+        self.sources: Set[str] = set()
+
+    def blocks(self) -> Iterator[List[str]]:
+        block = max(1, MAX_BLOCK_CELLS // self.buckets)
+        for offset in range(0, len(self.sensor_ids), block):
+            yield self.sensor_ids[offset:offset + block]
+
+    def grid(self, sensors: int) -> Tuple[np.ndarray, np.ndarray]:
+        sums = np.zeros((sensors, self.buckets, len(METRICS)))
+        return sums, np.zeros_like(sums)
+
+    def _summary(self, count, mean, pct, maximum, exceed) -> dict:
+        stats = {"count": {metric: int(c) for metric, c in zip(METRICS, count.tolist())},
+                 "mean": _by_metric(mean)}
+        for p, values in zip(PERCENTILES, pct):
+            stats[f"p{p}"] = _by_metric(values)
+        stats["max"] = _by_metric(maximum)
+        stats["exceedance_hours"] = _by_metric(exceed, tuple(THRESHOLDS))
+        return stats
+
+    def add(self, block_ids: List[str], sums: np.ndarray, counts: np.ndarray):
+        hours_per_bucket = self.bucket_seconds / 3600
+        with np.errstate(invalid="ignore", divide="ignore"), warnings.catch_warnings():
+            # All-NaN slices (sensors or metrics without data) are expected
+            warnings.simplefilter("ignore", RuntimeWarning)
+            means = sums / counts
+            totals = counts.sum(axis=1)
+            sensor_mean = sums.sum(axis=1) / totals
+            sensor_pct = _nanpercentiles(means)
+            sensor_max = np.nanmax(means, axis=1)
+            sensor_exceed = (means[:, :, _THRESHOLD_COLUMNS] > list(THRESHOLDS.values())).sum(axis=1) * hours_per_bucket
+            self.fleet.add(sums, counts, means)
+        for row, sensor_id in enumerate(block_ids):
+            if totals[row].sum() > 0:
+                self.sensors[sensor_id] = self._summary(totals[row], sensor_mean[row], sensor_pct[:, row],
+                                                        sensor_max[row], sensor_exceed[row])
+
+    def result(self) -> dict:
+        fleet, bucket_seconds = self.fleet, self.bucket_seconds
+        hours_per_bucket = bucket_seconds / 3600
+        bucket_starts = self.start + bucket_seconds * np.arange(self.buckets)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            fleet_series = fleet.sums / fleet.counts
+            fleet_mean = fleet.sums.sum(axis=0) / fleet.counts.sum(axis=0)
+            fleet_exceed = (fleet_series[:, _THRESHOLD_COLUMNS] > list(THRESHOLDS.values())).sum(axis=0) * hours_per_bucket
+            diurnal = None
+            if bucket_seconds <= 3600:
+                hours = np.array([datetime.fromtimestamp(t).hour for t in bucket_starts.tolist()], dtype=np.intp)
+                hour_sums = np.zeros((24, len(METRICS)))
+                hour_counts = np.zeros((24, len(METRICS)))
+                np.add.at(hour_sums, hours, fleet.sums)
+                np.add.at(hour_counts, hours, fleet.counts)
+                diurnal = hour_sums / hour_counts
+        correlations = fleet.correlations()
+
+        fleet_summary = self._summary(fleet.counts.sum(axis=0), fleet_mean, fleet.percentiles(), fleet.maximum,
+                                      fleet_exceed)
+        fleet_summary["sensors"] = len(self.sensors)
+        with_data = fleet.counts.max(axis=1) > 0
+        return {
+            "range_seconds": self.range_seconds,
+            "bucket_seconds": bucket_seconds,
+            "start": datetime.fromtimestamp(self.start).isoformat(),
+            "end": datetime.fromtimestamp(self.now).isoformat(),
+            "sources": sorted(self.sources),
+            "thresholds": THRESHOLDS,
+            "fleet": fleet_summary,
+            "sensors": self.sensors,
+            "diurnal": [{"hour": hour, **_by_metric(diurnal[hour])} for hour in range(24)] if diurnal is not None else None,
+            "correlations": {metric: _by_metric(correlations[:, column]) for column, metric in enumerate(METRICS)},
+            "series": [{"timestamp": datetime.fromtimestamp(t).isoformat(), **_by_metric(row)}
+                       for t, row in zip(bucket_starts[with_data].tolist(), fleet_series[with_data])]
+        }
+
+class AnalyticsCache:
+    """Serialized analytics results per (range, bucket).
+
+    ``mark_changed()`` (O(1), called for every new reading) invalidates every
+    entry; an invalidated entry is recomputed on its next ``get()``, but at
+    most once per ``refresh_interval`` seconds so that a steady stream of
+    readings doesn't turn every request into a recompute. ``compute`` is a
+    coroutine (see ``AnalyticsEngine.compute_async``); results are serialized
+    in a worker thread, one build per key at a time:
+    requests arriving while a build runs wait for it instead of starting
+    their own. At most ``max_entries`` results are kept, least recently used
+    first out.
+    """
+
+    def __init__(self, compute: Callable[[int, int], Awaitable[dict]], refresh_interval: float = 15.0,
+                 max_entries: int = 32, clock: Callable[[], float] = time.time):
+        self.compute = compute
+        self.refresh_interval = refresh_interval
+        self.max_entries = max_entries
+        self.clock = clock
+        self.version = 0
+        self.changed_at = clock()
+        self._entries: "OrderedDict[Tuple[int, int], Tuple[Snapshot, float]]" = OrderedDict()
+        self._building: Dict[Tuple[int, int], asyncio.Future] = {}
+        self.builds = 0
+        self.hits = 0
+        self.joined = 0
+        self.not_modified = 0
+        self.last_build_ms = 0.0
+
+    def mark_changed(self):
+        self.version += 1
+        self.changed_at = self.clock()
+
+    async def get(self, range_seconds: int, bucket_seconds: int) -> Snapshot:
+        key = (range_seconds, bucket_seconds)
+        entry = self._entries.get(key)
+        if entry is not None:
+            snapshot, built_at = entry
+            if snapshot.version == self.version or self.clock() - built_at < self.refresh_interval:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return snapshot
+        build = self._building.get(key)
+        if build is None:
+            build = self._building[key] = asyncio.ensure_future(self._build(key))
+            build.add_done_callback(lambda _: self._building.pop(key, None))
+        else:
+            self.joined += 1
+        # A request that goes away must not cancel a build others are waiting for
+        return await asyncio.shield(build)
+
+    async def _build(self, key: Tuple[int, int]) -> Snapshot:
+        version, changed_at = self.version, self.changed_at
+        started = time.perf_counter()
+        body = await asyncio.to_thread(dumps, await self.compute(*key))
+        self.last_build_ms = (time.perf_counter() - started) * 1000
+        self.builds += 1
+        snapshot = Snapshot(version, body, changed_at)
+        self._entries[key] = (snapshot, self.clock())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return snapshot
+
+    def get_stats(self) -> dict:
+        """Report cached results, rebuilds and hits"""
+        return {
+            "entries": len(self._entries),
+            "version": self.version,
+            "builds": self.builds,
+            "building": len(self._building),
+            "hits": self.hits,
+            "joined": self.joined,
+            "not_modified": self.not_modified,
+            "last_build_ms": round(self.last_build_ms, 3)
+        }
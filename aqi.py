@@ -0,0 +1,105 @@
+import bisect
+import math
+import numpy as np
+from typing import List, Optional, Sequence, Tuple
+
+# AQI index ranges shared by every pollutant table
+INDEX_LOW = np.array([0, 51, 101, 151, 201, 301, 401], dtype=np.float64)
+INDEX_HIGH = np.array([50, 100, 150, 200, 300, 400, 500], dtype=np.float64)
+
+# EPA concentration breakpoints (24-hour PM, µg/m³)
+PM25_LOW = np.array([0.0, 12.1, 35.5, 55.5, 150.5, 250.5, 350.5])
+PM25_HIGH = np.array([12.0, 35.4, 55.4, 150.4, 250.4, 350.4, 500.4])
+PM10_LOW = np.array([0, 55, 155, 255, 355, 425, 505], dtype=np.float64)
+PM10_HIGH = np.array([54, 154, 254, 354, 424, 504, 604], dtype=np.float64)
+
+# CO2 (ppm) has no EPA AQI; these bands follow common indoor air quality guidance
+CO2_LOW = np.array([0, 601, 1001, 1501, 2001, 5001, 10001], dtype=np.float64)
+CO2_HIGH = np.array([600, 1000, 1500, 2000, 5000, 10000, 40000], dtype=np.float64)
+
+CATEGORIES = (
+    "Good",
+    "Moderate",
+    "Unhealthy for Sensitive Groups",
+    "Unhealthy",
+    "Very Unhealthy",
+    "Hazardous",
+)
+# Upper AQI bound of each category (the last two index ranges are both Hazardous)
+CATEGORY_HIGH = np.array([50, 100, 150, 200, 300, 500], dtype=np.float64)
+
+def _sub_index(concentration, low: np.ndarray, high: np.ndarray, decimals: int) -> np.ndarray:
+    """Piecewise-linear sub-index for one pollutant; NaN in, NaN out"""
+    c = np.asarray(concentration, dtype=np.float64)
+    # EPA truncates before the lookup (PM2.5 to 0.1, PM10 and CO2 to integers)
+    scale = 10.0 ** decimals
+    c = np.floor(np.clip(c, 0, None) * scale + 1e-9) / scale
+    i = np.minimum(np.searchsorted(high, c, side="left"), len(high) - 1)
+    index = (INDEX_HIGH[i] - INDEX_LOW[i]) / (high[i] - low[i]) * (c - low[i]) + INDEX_LOW[i]
+    return np.clip(np.round(index), 0, 500)
+
+def compute_aqi(pm25, pm10=None, co2=None) -> Tuple[np.ndarray, np.ndarray]:
+    """Vectorized AQI: the maximum of the PM2.5, PM10 and CO2 sub-indices.
+
+    Accepts scalars or arrays (missing pollutants may be None or NaN). Returns
+    ``(aqi, category)`` where ``aqi`` is an int array (-1 where no pollutant was
+    available) and ``category`` indexes ``CATEGORIES``.
+    """
+    sub_indices = [_sub_index(pm25, PM25_LOW, PM25_HIGH, 1)]
+    if pm10 is not None:
+        sub_indices.append(_sub_index(pm10, PM10_LOW, PM10_HIGH, 0))
+    if co2 is not None:
+        sub_indices.append(_sub_index(co2, CO2_LOW, CO2_HIGH, 0))
+    stacked = np.stack(np.broadcast_arrays(*sub_indices))
+    aqi = np.where(np.isnan(stacked), -1, stacked).max(axis=0).astype(np.int64)
+    category = np.minimum(np.searchsorted(CATEGORY_HIGH, aqi, side="left"), len(CATEGORIES) - 1)
+    return aqi, category
+
+def category_names(category: np.ndarray) -> List[str]:
+    """Category indices from ``compute_aqi`` as names"""
+    return [CATEGORIES[i] for i in np.asarray(category).ravel().tolist()]
+
+_SCALAR_TABLES = {
+    name: (low.tolist(), high.tolist(), decimals)
+    for name, low, high, decimals in (
+        ("pm25", PM25_LOW, PM25_HIGH, 1),
+        ("pm10", PM10_LOW, PM10_HIGH, 0),
+        ("co2", CO2_LOW, CO2_HIGH, 0),
+    )
+}
+_INDEX_LOW, _INDEX_HIGH = INDEX_LOW.tolist(), INDEX_HIGH.tolist()
+
+def _scalar_sub_index(concentration: Optional[float], pollutant: str) -> float:
+    if concentration is None or concentration != concentration:
+        return -1
+    low, high, decimals = _SCALAR_TABLES[pollutant]
+    scale = 10 ** decimals
+    c = math.floor(max(concentration, 0) * scale + 1e-9) / scale
+    i = min(bisect.bisect_left(high, c), len(high) - 1)
+    index = (_INDEX_HIGH[i] - _INDEX_LOW[i]) / (high[i] - low[i]) * (c - low[i]) + _INDEX_LOW[i]
+    return min(max(round(index), 0), 500)
+
+def aqi_value(pm25: float, pm10: Optional[float] = None, co2: Optional[float] = None) -> int:
+    """Scalar AQI using the same breakpoint tables as ``compute_aqi``, without NumPy overhead"""
+    return int(max(_scalar_sub_index(pm25, "pm25"),
+                   _scalar_sub_index(pm10, "pm10"),
+                   _scalar_sub_index(co2, "co2")))
+
+def aqi_category(aqi: int) -> str:
+    """Category name for a scalar AQI"""
+    return CATEGORIES[min(bisect.bisect_left(CATEGORY_HIGH.tolist(), aqi), len(CATEGORIES) - 1)]
+
+def fill_missing_aqi(readings: Sequence[dict]) -> Sequence[dict]:
+    """Compute ``aqi`` in one vectorized pass for readings that don't carry it"""
+    pending = [r for r in readings if r.get("aqi") is None and r.get("pm25") is not None]
+    if not pending:
+        return readings
+
+    def column(name):
+        return np.array([np.nan if r.get(name) is None else r[name] for r in pending], dtype=np.float64)
+
+    aqi, _ = compute_aqi(column("pm25"), column("pm10"), column("co2"))
+    for reading, value in zip(pending, aqi.tolist()):
+        if value >= 0:
+            reading["aqi"] = value
+    return readings
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, List, Optional
+
+from timeseries import METRICS, to_epoch
+
+# Fields merged from the per-topic payloads (air_quality, temperature, humidity, status)
+FIELDS = METRICS + ("location", "status")
+_FIELD_INDEX = {field: index for index, field in enumerate(FIELDS)}
+# Per-fragment keys that are not part of the merged record
+_FRAGMENT_KEYS = frozenset(("sensor_id", "timestamp", "topic"))
+
+logger = logging.getLogger(__name__)
+
+class SensorRecord:
+    """Latest value of each field for one sensor, with the time each was last updated"""
+
+    __slots__ = ("sensor_id", "values", "updated", "timestamp", "latest", "extra")
+
+    def __init__(self, sensor_id: str):
+        self.sensor_id = sensor_id
+        self.values: List[object] = [None] * len(FIELDS)
+        self.updated: List[float] = [0.0] * len(FIELDS)
+        self.timestamp = None
+        self.latest = 0.0
+        self.extra: Optional[dict] = None
+
+    def merge(self, fragment: dict, at: float):
+        """Take every non-null field of ``fragment`` as of ``at`` (epoch seconds)"""
+        for key, value in fragment.items():
+            if value is None or key in _FRAGMENT_KEYS:
+                continue
+            index = _FIELD_INDEX.get(key)
+            if index is None:
+                if self.extra is None:
+                    self.extra = {}
+                self.extra[key] = value
+            elif at >= self.updated[index]:
+                self.values[index] = value
+                self.updated[index] = at
+        if at >= self.latest:
+            self.latest = at
+            self.timestamp = fragment.get("timestamp", self.timestamp)
+
+    def as_dict(self, now: float, stale_after: Optional[float]) -> dict:
+        """The merged reading; fields not updated for ``stale_after`` seconds are left out"""
+        record = {"sensor_id": self.sensor_id}
+        cutoff = now - stale_after if stale_after is not None else None
+        for field, value, updated in zip(FIELDS, self.values, self.updated):
+            if value is not None and (cutoff is None or updated >= cutoff):
+                record[field] = value
+        if self.extra:
+            record.update(self.extra)
+        record["timestamp"] = self.timestamp
+        return record
+
+class RecordAssembler:
+    """Merges partial per-topic readings into one record per sensor.
+
+    Sensors publish air_quality, temperature, humidity and status on separate
+    topics. ``add`` (on the event loop) merges each fragment into the
+    sensor's ``SensorRecord``; ``window`` seconds after the first pending
+    fragment, ``emit`` is called once per changed sensor with the merged
+    record. Fields older than ``stale_after`` seconds are dropped from emitted
+    records rather than reported as current.
+    """
+
+    def __init__(self, emit: Callable[[dict], None], window: float = 0.25,
+                 stale_after: Optional[float] = 600.0, clock: Callable[[], float] = time.time):
+        self.emit = emit
+        self.window = window
+        self.stale_after = stale_after
+        self.clock = clock
+        self.records: Dict[str, SensorRecord] = {}
+        self._dirty: Dict[str, None] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self.fragments = 0
+        self.emitted = 0
+        self.stale_fields = 0
+        self.errors = 0
+
+    def add(self, fragment: dict):
+        sensor_id = fragment.get("sensor_id")
+        if sensor_id is None:
+            return
+        record = self.records.get(sensor_id)
+        if record is None:
+            record = self.records[sensor_id] = SensorRecord(sensor_id)
+        try:
+            at = to_epoch(fragment.get("timestamp"))
+        except (TypeError, ValueError):
+            at = self.clock()
+        record.merge(fragment, at)
+        self.fragments += 1
+        self._dirty[sensor_id] = None
+        if self.window <= 0:
+            self.flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.window, self.flush)
+
+    def flush(self):
+        """Emit the merged record of every sensor changed since the last flush"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        dirty, self._dirty = self._dirty, {}
+        now = self.clock()
+        for sensor_id in dirty:
+            record = self.records[sensor_id]
+            merged = record.as_dict(now, self.stale_after)
+            self.stale_fields += sum(value is not None for value in record.values) - \
+                sum(field in merged for field in FIELDS)
+            self.emitted += 1
+            try:
+                self.emit(merged)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"❌ Error applying merged reading for {sensor_id}: {e}")
+
+    def get_stats(self) -> dict:
+        """Report fragments merged, records emitted and stale fields dropped"""
+        return {
+            "window": self.window,
+            "sensors": len(self.records),
+            "fragments": self.fragments,
+            "emitted": self.emitted,
+            "fragments_per_update": round(self.fragments / self.emitted, 2) if self.emitted else None,
+            "stale_fields_dropped": self.stale_fields,
+            "errors": self.errors,
+            "pending": len(self._dirty)
+        }
@@ -0,0 +1,337 @@
+import asyncio
+import fcntl
+import os
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from snapshot import dumps, loads
+
+# Channels carried between workers
+READINGS = "readings"
+ALERT_RULES = "alert_rules"
+# Archived readings replayed into a running deployment; applied, but not persisted again
+REPLAYED = "replayed"
+
+Handler = Callable[[dict], None]
+
+class Backplane:
+    """Pub/sub between the workers serving one deployment.
+
+    Every published message is delivered to the local handlers right away
+    (synchronously, on the event loop) and forwarded to the other workers,
+    whose handlers receive it on their own loop. Exactly one worker is the
+    leader at a time; it owns ingestion and anything that must happen once
+    per deployment. ``on_promoted`` is awaited when a worker becomes leader
+    after startup, e.g. because the previous leader exited.
+    """
+
+    def __init__(self, on_promoted: Optional[Callable[[], Awaitable[None]]] = None):
+        self.on_promoted = on_promoted
+        self.is_leader = False
+        self._handlers: Dict[str, List[Handler]] = {}
+        self.published = 0
+        self.received = 0
+        self.dropped = 0
+        self.handler_errors = 0
+
+    def subscribe(self, channel: str, handler: Handler):
+        self._handlers.setdefault(channel, []).append(handler)
+
+    def publish(self, channel: str, message: dict, local: bool = True):
+        """Deliver to local handlers (unless ``local`` is False) and to every other worker"""
+        self.published += 1
+        if local:
+            self._deliver(channel, message)
+        self._send(channel, message)
+
+    def _deliver(self, channel: str, message: dict):
+        for handler in self._handlers.get(channel, ()):
+            try:
+                handler(message)
+            except Exception as e:
+                self.handler_errors += 1
+                print(f"❌ Backplane handler for {channel} failed: {e}")
+
+    def _receive(self, channel: str, message: dict):
+        self.received += 1
+        self._deliver(channel, message)
+
+    def _send(self, channel: str, message: dict):
+        """Forward to the other workers"""
+
+    async def _promote(self):
+        self.is_leader = True
+        print(f"👑 Worker {os.getpid()} is now the backplane leader")
+        if self.on_promoted:
+            await self.on_promoted()
+
+    async def start(self):
+        self.is_leader = True
+
+    async def stop(self):
+        pass
+
+    def get_stats(self) -> dict:
+        """Report role and message counters"""
+        return {
+            "type": type(self).__name__,
+            "leader": self.is_leader,
+            "published": self.published,
+            "received": self.received,
+            "dropped": self.dropped,
+            "handler_errors": self.handler_errors
+        }
+
+class InProcessHub:
+    """Connects InProcessBackplanes living in one process, e.g. simulated workers in tests"""
+
+    def __init__(self):
+        self.members: List["InProcessBackplane"] = []
+
+class InProcessBackplane(Backplane):
+    """Backplane for a single worker, or several sharing an ``InProcessHub``.
+
+    The first member to start leads; when it stops, the next one is promoted.
+    """
+
+    def __init__(self, hub: Optional[InProcessHub] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.hub = hub or InProcessHub()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self.hub.members.append(self)
+        self.is_leader = self.hub.members[0] is self
+
+    async def stop(self):
+        if self not in self.hub.members:
+            return
+        self.hub.members.remove(self)
+        if self.is_leader and self.hub.members:
+            successor = self.hub.members[0]
+            asyncio.run_coroutine_threadsafe(successor._promote(), successor._loop)
+        self.is_leader = False
+
+    def _send(self, channel: str, message: dict):
+        for member in self.hub.members:
+            if member is not self:
+                member._loop.call_soon_threadsafe(member._receive, channel, message)
+
+class SocketBackplane(Backplane):
+    """Backplane over a local Unix socket, for uvicorn workers on one host.
+
+    The worker holding an exclusive lock on ``path + ".lock"`` is the leader:
+    it listens on ``path`` and relays every message it receives to the other
+    workers, which connect to it. The lock is released when the leader's
+    process exits, so if the leader goes away the followers race for the lock
+    and the winner is promoted. Messages are newline-delimited JSON; outgoing lines
+    are batched into one write per loop iteration, and a peer whose socket
+    buffer exceeds ``max_buffer`` bytes misses messages instead of stalling
+    the sender.
+    """
+
+    def __init__(self, path: str, max_buffer: int = 8 * 1024 * 1024,
+                 reconnect_delay: float = 0.5, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.max_buffer = max_buffer
+        self.reconnect_delay = reconnect_delay
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._lock_fd: Optional[int] = None
+        self._peers: Set[asyncio.StreamWriter] = set()
+        self._upstream: Optional[asyncio.StreamWriter] = None
+        self._outbox: List[bytes] = []
+        self._flush_scheduled = False
+        self._tasks: Set[asyncio.Task] = set()
+        self._stopping = False
+
+    async def start(self):
+        while True:
+            if await self._try_lead():
+                return
+            try:
+                await self._follow()
+                return
+            except OSError:
+                # The leader holds the lock but is not listening yet
+                await asyncio.sleep(self.reconnect_delay)
+
+    async def _try_lead(self) -> bool:
+        """Take the leader lock and listen; returns False if another worker leads"""
+        fd = os.open(self.path + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        # Any socket file left at path belongs to a leader that is gone
+        self._server = await asyncio.start_unix_server(self._serve_peer, path=self.path, limit=2 ** 24)
+        self.is_leader = True
+        return True
+
+    async def _follow(self):
+        reader, self._upstream = await asyncio.open_unix_connection(self.path, limit=2 ** 24)
+        self._spawn(self._read_upstream(reader))
+
+    def _spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _serve_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._peers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self._relay(line, exclude=writer)
+                self._receive_line(line)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._peers.discard(writer)
+            writer.close()
+
+    async def _read_upstream(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self._receive_line(line)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        self._upstream = None
+        if not self._stopping:
+            await self._reconnect()
+
+    async def _reconnect(self):
+        """The leader went away: take over, or follow whoever did"""
+        while not self._stopping:
+            await asyncio.sleep(self.reconnect_delay)
+            if await self._try_lead():
+                await self._promote()
+                return
+            try:
+                await self._follow()
+                return
+            except OSError:
+                continue
+
+    def _receive_line(self, line: bytes):
+        try:
+            envelope = loads(line)
+            channel, message = envelope["channel"], envelope["message"]
+        except (ValueError, KeyError, TypeError):
+            # Not JSON, or not a {"channel", "message"} envelope
+            self.dropped += 1
+            return
+        self._receive(channel, message)
+
+    def _write(self, writer: asyncio.StreamWriter, data: bytes):
+        if writer.transport.get_write_buffer_size() > self.max_buffer:
+            self.dropped += 1
+            return
+        writer.write(data)
+
+    def _relay(self, line: bytes, exclude: Optional[asyncio.StreamWriter] = None):
+        for peer in list(self._peers):
+            if peer is not exclude:
+                self._write(peer, line)
+
+    def _send(self, channel: str, message: dict):
+        if not self._peers and self._upstream is None:
+            return
+        self._outbox.append(dumps({"channel": channel, "message": message}) + b"\n")
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self._flush)
+
+    def _flush(self):
+        self._flush_scheduled = False
+        if not self._outbox:
+            return
+        data, self._outbox = b"".join(self._outbox), []
+        if self.is_leader:
+            self._relay(data)
+        elif self._upstream is not None:
+            self._write(self._upstream, data)
+
+    async def stop(self):
+        self._stopping = True
+        self._flush()
+        for task in list(self._tasks):
+            task.cancel()
+        if self._upstream is not None:
+            self._upstream.close()
+        for peer in list(self._peers):
+            peer.close()
+        if self._server is not None:
+            self._server.close()
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+        self.is_leader = False
+
+    def get_stats(self) -> dict:
+        stats = super().get_stats()
+        stats["path"] = self.path
+        stats["peers"] = len(self._peers)
+        return stats
+
+class BackplanePublisher:
+    """Publishes into a running deployment's SocketBackplane from another process.
+
+    Connects to the leader like a follower worker but never leads or handles
+    messages: whatever the leader relays back is read and discarded, so the
+    leader never drops messages for it. ``drain`` waits for the socket buffer
+    to empty, which is how a fast publisher is held to the leader's pace.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.published = 0
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+
+    async def connect(self):
+        reader, self._writer = await asyncio.open_unix_connection(self.path, limit=2 ** 24)
+        self._reader_task = asyncio.create_task(self._discard(reader))
+
+    async def _discard(self, reader: asyncio.StreamReader):
+        try:
+            while await reader.read(2 ** 16):
+                pass
+        except ConnectionError:
+            pass
+
+    def publish(self, channel: str, message: dict):
+        self._writer.write(dumps({"channel": channel, "message": message}) + b"\n")
+        self.published += 1
+
+    async def drain(self):
+        await self._writer.drain()
+
+    async def close(self):
+        if self._writer is not None:
+            await self._writer.drain()
+            self._writer.close()
+            await self._writer.wait_closed()
+            self._writer = None
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            self._reader_task = None
+
+def create_backplane(kind: str, socket_path: str, **kwargs) -> Backplane:
+    """Backplane from configuration: ``inprocess`` or ``socket``"""
+    if kind == "socket":
+        return SocketBackplane(socket_path, **kwargs)
+    if kind == "inprocess":
+        return InProcessBackplane(**kwargs)
+    raise ValueError(f"Unknown backplane: {kind}")
@@ -0,0 +1,56 @@
+"""Compare the vectorized AQI engine with the previous scalar path.
+
+Run from the repository root:
+
+    python benchmarks/aqi_benchmark.py [samples]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aqi import compute_aqi, aqi_value
+
+def legacy_scalar_aqi(pm25: float) -> int:
+    """The PM2.5-only scalar calculation the engine replaced"""
+    if pm25 <= 12.0:
+        return int((pm25 / 12.0) * 50)
+    elif pm25 <= 35.4:
+        return int(50 + ((pm25 - 12.1) / 23.3) * 50)
+    elif pm25 <= 55.4:
+        return int(100 + ((pm25 - 35.5) / 19.9) * 50)
+    elif pm25 <= 150.4:
+        return int(150 + ((pm25 - 55.5) / 94.9) * 100)
+    elif pm25 <= 250.4:
+        return int(200 + ((pm25 - 150.5) / 99.9) * 100)
+    return min(int(300 + ((pm25 - 250.5) / 149.5) * 100), 500)
+
+def timed(label: str, fn, samples: int) -> float:
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<38} {elapsed:8.3f}s  {samples / elapsed / 1e6:8.2f}M samples/s")
+    return elapsed
+
+def main(samples: int = 1_000_000):
+    rng = np.random.default_rng(42)
+    pm25 = np.round(rng.gamma(2.0, 12.0, samples), 1)
+    pm10 = np.round(pm25 * rng.uniform(1.2, 2.2, samples))
+    co2 = np.round(rng.normal(650, 150, samples))
+    pm25_list, pm10_list, co2_list = pm25.tolist(), pm10.tolist(), co2.tolist()
+
+    print(f"AQI benchmark on {samples:,} samples")
+    scalar = timed("legacy scalar (PM2.5 only)",
+                   lambda: [legacy_scalar_aqi(v) for v in pm25_list], samples)
+    if samples <= 100_000:
+        timed("engine, one call per sample",
+              lambda: [aqi_value(a, b, c) for a, b, c in zip(pm25_list, pm10_list, co2_list)], samples)
+    vector_pm25 = timed("vectorized (PM2.5 only)", lambda: compute_aqi(pm25), samples)
+    vector_all = timed("vectorized (PM2.5 + PM10 + CO2)", lambda: compute_aqi(pm25, pm10, co2), samples)
+    print(f"speedup vs legacy scalar: {scalar / vector_pm25:.1f}x (PM2.5), {scalar / vector_all:.1f}x (all pollutants)")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
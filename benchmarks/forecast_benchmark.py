@@ -0,0 +1,75 @@
+"""Forecast request latency against fleet size.
+
+Each fleet is fed ``steps`` five-minute steps of readings per sensor through
+the online models, then forecasts are requested for random sensors: cold
+(every request builds the forecast from the sensor's model state) and warm
+(served from the per-(sensor, horizon) cache). Latency should stay flat as
+the fleet grows, since a request only reads one sensor's state.
+
+Run from the repository root:
+
+    python benchmarks/forecast_benchmark.py [steps]
+"""
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from forecast import ForecastCache, ForecastModel
+
+FLEETS = (100, 1000, 10000)
+STEP = 300
+HORIZON = 3600
+REQUESTS = 2000
+
+def feed(model: ForecastModel, sensors: int, steps: int, rng) -> float:
+    """Two readings per step for every sensor; returns µs per reading"""
+    start = time.time() - steps * STEP
+    base = rng.uniform(5, 40, sensors)
+    readings = 0
+    started = time.perf_counter()
+    for step in range(steps):
+        for half in (0, 0.5):
+            at = start + (step + half) * STEP
+            timestamp = datetime.fromtimestamp(at).isoformat()
+            noise = rng.normal(0, 2, sensors)
+            daily = 8 * np.sin(2 * np.pi * at / 86400)
+            for i in range(sensors):
+                pm25 = base[i] + daily + noise[i]
+                model.add({"sensor_id": f"sensor_{i:05d}", "timestamp": timestamp, "pm25": pm25,
+                           "pm10": pm25 * 1.8, "co2": 420.0, "temperature": 21.0, "humidity": 50.0,
+                           "aqi": pm25 * 3})
+                readings += 1
+    return (time.perf_counter() - started) / readings * 1e6
+
+def latencies(fn, sensor_ids) -> np.ndarray:
+    timings = np.empty(len(sensor_ids))
+    for i, sensor_id in enumerate(sensor_ids):
+        started = time.perf_counter()
+        fn(sensor_id)
+        timings[i] = time.perf_counter() - started
+    return timings * 1e6
+
+def main(steps: int = 12):
+    rng = np.random.default_rng(7)
+    print(f"{steps} steps of {STEP}s per sensor, {HORIZON}s horizon, {REQUESTS} requests")
+    print(f"{'sensors':>8} {'update µs':>10} {'cold p50':>9} {'cold p99':>9} {'warm p50':>9} {'warm p99':>9} {'state':>9}")
+    for sensors in FLEETS:
+        model = ForecastModel(step=STEP)
+        update_us = feed(model, sensors, steps, rng)
+        ids = [f"sensor_{i:05d}" for i in rng.integers(0, sensors, REQUESTS)]
+        cold = latencies(lambda sensor_id: model.forecast(sensor_id, HORIZON), ids)
+        cache = ForecastCache(model)
+        for sensor_id in set(ids):
+            cache.get(sensor_id, HORIZON)
+        warm = latencies(lambda sensor_id: cache.get(sensor_id, HORIZON), ids)
+        state_mb = model.get_stats()["state_bytes"] / 1e6
+        print(f"{sensors:>8,} {update_us:>10.1f} {np.percentile(cold, 50):>8.0f}µs {np.percentile(cold, 99):>8.0f}µs "
+              f"{np.percentile(warm, 50):>8.1f}µs {np.percentile(warm, 99):>8.1f}µs {state_mb:>7.1f}MB")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 12)
@@ -0,0 +1,226 @@
+"""Minimal MQTT 3.1.1 broker stand-in for local ingest benchmarks.
+
+Supports CONNECT, SUBSCRIBE/UNSUBSCRIBE with ``+``/``#`` wildcards, shared
+subscriptions (``$share/<group>/<filter>``, delivered round-robin within a
+group), PUBLISH at QoS 0/1 (always delivered at QoS 0), PINGREQ and
+DISCONNECT. No retained messages, sessions or authentication; use a real
+broker (e.g. Mosquitto) for anything else.
+
+Run from the repository root:
+
+    python benchmarks/local_broker.py [port]
+"""
+import asyncio
+import itertools
+import sys
+from typing import Dict, List, Optional, Tuple
+
+CONNECT, CONNACK, PUBLISH, PUBACK = 1, 2, 3, 4
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK = 8, 9, 10, 11
+PINGREQ, PINGRESP, DISCONNECT = 12, 13, 14
+
+def encode_length(length: int) -> bytes:
+    encoded = bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        encoded.append(byte | 0x80 if length else byte)
+        if not length:
+            return bytes(encoded)
+
+def encode_string(value: str) -> bytes:
+    raw = value.encode()
+    return len(raw).to_bytes(2, "big") + raw
+
+def publish_packet(topic: str, payload: bytes) -> bytes:
+    """QoS 0 PUBLISH packet"""
+    body = encode_string(topic) + payload
+    return bytes((PUBLISH << 4,)) + encode_length(len(body)) + body
+
+def split_packets(buffer: bytearray) -> Tuple[List[Tuple[int, int, bytes]], int]:
+    """Complete ``(type, flags, body)`` packets in ``buffer`` and the bytes they used"""
+    packets = []
+    offset = 0
+    size = len(buffer)
+    while offset + 2 <= size:
+        header = buffer[offset]
+        length = multiplier = 0
+        cursor = offset + 1
+        while True:
+            if cursor >= size:
+                return packets, offset
+            byte = buffer[cursor]
+            length += (byte & 0x7F) << multiplier
+            multiplier += 7
+            cursor += 1
+            if not byte & 0x80:
+                break
+        if cursor + length > size:
+            break
+        packets.append((header >> 4, header & 0x0F, bytes(buffer[cursor:cursor + length])))
+        offset = cursor + length
+    return packets, offset
+
+def topic_matches(pattern: List[str], levels: List[str]) -> bool:
+    for index, part in enumerate(pattern):
+        if part == "#":
+            return True
+        if index >= len(levels) or (part != "+" and part != levels[index]):
+            return False
+    return len(pattern) == len(levels)
+
+class Subscription:
+    __slots__ = ("filter", "levels", "members", "turn")
+
+    def __init__(self, topic_filter: str):
+        self.filter = topic_filter
+        self.levels = topic_filter.split("/")
+        self.members: List["Session"] = []
+        self.turn = itertools.count()
+
+class Session:
+    __slots__ = ("writer", "client_id")
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.client_id = ""
+
+class LocalBroker:
+    """In-memory MQTT broker; ``start()`` listens, ``stop()`` closes every session"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 1883):
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+        # (group name or session id, filter) -> subscription; a plain
+        # subscription has a single member, a shared one every member of the group
+        self._subscriptions: Dict[Tuple[object, str], Subscription] = {}
+        self._routes: Dict[str, List[Subscription]] = {}
+        self.received = 0
+        self.delivered = 0
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def serve_forever(self):
+        await self.start()
+        print(f"MQTT broker stand-in listening on {self.host}:{self.port}")
+        await self._server.serve_forever()
+
+    def _subscribe(self, session: Session, topic_filter: str):
+        group = None
+        if topic_filter.startswith("$share/"):
+            _, group, topic_filter = topic_filter.split("/", 2)
+        key = (group, topic_filter) if group else (id(session), topic_filter)
+        subscription = self._subscriptions.get(key)
+        if subscription is None:
+            subscription = self._subscriptions[key] = Subscription(topic_filter)
+        if session not in subscription.members:
+            subscription.members.append(session)
+        self._routes.clear()
+
+    def _unsubscribe(self, session: Session, topic_filter: Optional[str] = None):
+        for key, subscription in list(self._subscriptions.items()):
+            group = key[0]
+            subscribed_as = f"$share/{group}/{subscription.filter}" if isinstance(group, str) else subscription.filter
+            if topic_filter is not None and topic_filter != subscribed_as:
+                continue
+            if session in subscription.members:
+                subscription.members.remove(session)
+            if not subscription.members:
+                del self._subscriptions[key]
+        self._routes.clear()
+
+    def _route(self, topic: str) -> List[Subscription]:
+        routes = self._routes.get(topic)
+        if routes is None:
+            levels = topic.split("/")
+            routes = self._routes[topic] = [subscription for subscription in self._subscriptions.values()
+                                            if topic_matches(subscription.levels, levels)]
+        return routes
+
+    def _publish(self, flags: int, body: bytes):
+        self.received += 1
+        topic_length = int.from_bytes(body[:2], "big")
+        topic = body[2:2 + topic_length].decode()
+        qos = (flags >> 1) & 0x03
+        payload = body[2 + topic_length + (2 if qos else 0):]
+        packet = None
+        for subscription in self._route(topic):
+            members = subscription.members
+            if not members:
+                continue
+            session = members[next(subscription.turn) % len(members)] if len(members) > 1 else members[0]
+            if packet is None:
+                packet = publish_packet(topic, payload)
+            session.writer.write(packet)
+            self.delivered += 1
+        return body[2 + topic_length:4 + topic_length] if qos else None
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        session = Session(writer)
+        buffer = bytearray()
+        try:
+            while True:
+                chunk = await reader.read(65536)
+                if not chunk:
+                    break
+                buffer += chunk
+                packets, used = split_packets(buffer)
+                del buffer[:used]
+                for packet_type, flags, body in packets:
+                    if packet_type == PUBLISH:
+                        packet_id = self._publish(flags, body)
+                        if packet_id:
+                            writer.write(bytes((PUBACK << 4, 2)) + packet_id)
+                    elif packet_type == CONNECT:
+                        self._connect(session, body)
+                        writer.write(bytes((CONNACK << 4, 2, 0, 0)))
+                    elif packet_type == SUBSCRIBE:
+                        writer.write(self._handle_subscribe(session, body))
+                    elif packet_type == UNSUBSCRIBE:
+                        self._handle_unsubscribe(session, body)
+                        writer.write(bytes((UNSUBACK << 4, 2)) + body[:2])
+                    elif packet_type == PINGREQ:
+                        writer.write(bytes((PINGRESP << 4, 0)))
+                    elif packet_type == DISCONNECT:
+                        return
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._unsubscribe(session)
+            writer.close()
+
+    def _connect(self, session: Session, body: bytes):
+        # Protocol name, level, flags and keep-alive come before the client id
+        offset = 2 + int.from_bytes(body[:2], "big") + 4
+        length = int.from_bytes(body[offset:offset + 2], "big")
+        session.client_id = body[offset + 2:offset + 2 + length].decode()
+
+    def _handle_subscribe(self, session: Session, body: bytes) -> bytes:
+        packet_id, offset, granted = body[:2], 2, bytearray()
+        while offset < len(body):
+            length = int.from_bytes(body[offset:offset + 2], "big")
+            self._subscribe(session, body[offset + 2:offset + 2 + length].decode())
+            offset += 2 + length + 1
+            granted.append(0)
+        return bytes((SUBACK << 4,)) + encode_length(2 + len(granted)) + packet_id + bytes(granted)
+
+    def _handle_unsubscribe(self, session: Session, body: bytes):
+        offset = 2
+        while offset < len(body):
+            length = int.from_bytes(body[offset:offset + 2], "big")
+            self._unsubscribe(session, body[offset + 2:offset + 2 + length].decode())
+            offset += 2 + length
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(LocalBroker(port=int(sys.argv[1]) if len(sys.argv) > 1 else 1883).serve_forever())
+    except KeyboardInterrupt:
+        pass
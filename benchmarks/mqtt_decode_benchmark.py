@@ -0,0 +1,85 @@
+"""Compare per-message MQTT decoding with the batched decoder, on one core.
+
+Both paths run on a single thread from raw MQTT messages to payloads queued
+on the ingest bridge, with INFO logging going to /dev/null.
+
+Run from the repository root:
+
+    python benchmarks/mqtt_decode_benchmark.py [messages]
+"""
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingest import IngestBridge
+from mqtt_client import MQTTClient
+
+logger = logging.getLogger("legacy_mqtt")
+
+def make_messages(count: int) -> list:
+    messages = []
+    for i in range(count):
+        payload = {"pm25": 10 + (i % 400) / 10, "pm10": 20 + i % 60, "co2": 400 + i % 300,
+                   "temperature": 21.5, "humidity": 48.0, "location": "Toronto, ON"}
+        messages.append(SimpleNamespace(topic=f"airsense/sensors/sensor_{i % 500:04d}/air_quality",
+                                        payload=json.dumps(payload).encode()))
+    return messages
+
+def legacy_on_message(msg, callback):
+    """The per-message path the batched decoder replaced"""
+    try:
+        topic = msg.topic
+        payload = json.loads(msg.payload.decode())
+        topic_parts = topic.split('/')
+        if len(topic_parts) >= 3:
+            sensor_id = topic_parts[2]
+            payload['sensor_id'] = sensor_id
+            payload['timestamp'] = datetime.now().isoformat()
+            payload['topic'] = topic
+            logger.info(f"📊 Received data from sensor {sensor_id}: {payload}")
+            callback(payload)
+    except json.JSONDecodeError as e:
+        logger.error(f"❌ Failed to decode MQTT message: {e}")
+
+def bridge(count: int) -> IngestBridge:
+    return IngestBridge(lambda payload: None, max_size=count)
+
+def timed(label: str, fn, count: int) -> float:
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<40} {elapsed:7.3f}s  {count / elapsed:>10,.0f} msgs/s")
+    return elapsed
+
+def main(count: int = 200_000):
+    handler = logging.StreamHandler(open(os.devnull, "w"))
+    logging.basicConfig(level=logging.INFO, handlers=[handler], force=True)
+    messages = make_messages(count)
+    print(f"{count:,} messages, one thread")
+
+    legacy_bridge = bridge(count)
+    def legacy():
+        for msg in messages:
+            legacy_on_message(msg, legacy_bridge.submit)
+    before = timed("json.loads + INFO log per message", legacy, count)
+
+    for batch in (1, 64, 256):
+        batched_bridge = bridge(count)
+        client = MQTTClient(decode_batch=batch)
+        client.set_data_callback(batched_bridge.submit, batch_callback=batched_bridge.submit_many)
+        def batched():
+            for msg in messages:
+                client.on_message(None, None, msg)
+            client.decoder.flush()
+        after = timed(f"batched decoder, batch={batch}", batched, count)
+        assert batched_bridge.enqueued == count
+    print(f"speedup at batch=256: {before / after:.1f}x")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
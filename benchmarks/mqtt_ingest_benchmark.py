@@ -0,0 +1,135 @@
+"""Measure MQTT ingest throughput against the number of shared-subscription shards.
+
+Starts the local broker stand-in, publishes a burst of sensor readings and
+times how long the MQTTIngestPool takes to receive and parse all of them.
+Shards run as threads of one process (as within one API worker) and, with
+``--processes``, as one process per shard (as across API workers).
+
+Run from the repository root:
+
+    python benchmarks/mqtt_ingest_benchmark.py [messages] [--processes]
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from local_broker import CONNECT, LocalBroker, encode_length, encode_string, publish_packet
+from mqtt_client import MQTTIngestPool
+
+GROUP = "bench"
+SHARD_COUNTS = (1, 2, 4)
+SENSORS = 500
+
+def run_broker(port_queue):
+    async def serve():
+        broker = LocalBroker(port=0)
+        await broker.start()
+        port_queue.put(broker.port)
+        await asyncio.Event().wait()
+    asyncio.run(serve())
+
+def make_packets(messages: int) -> bytes:
+    packets = []
+    for i in range(messages):
+        sensor_id = f"sensor_{i % SENSORS:04d}"
+        payload = json.dumps({"pm25": 10 + i % 40, "pm10": 20 + i % 60, "co2": 400 + i % 300,
+                              "temperature": 21.5, "humidity": 48.0, "location": "Toronto, ON"})
+        packets.append(publish_packet(f"airsense/sensors/{sensor_id}/air_quality", payload.encode()))
+    return b"".join(packets)
+
+def publish(port: int, data: bytes):
+    body = encode_string("MQTT") + bytes((4, 0x02)) + (60).to_bytes(2, "big") + encode_string("bench-publisher")
+    with socket.create_connection(("127.0.0.1", port)) as connection:
+        connection.sendall(bytes((CONNECT << 4,)) + encode_length(len(body)) + body)
+        connection.recv(4)
+        connection.sendall(data)
+        time.sleep(0.5)
+
+def wait_for(count, messages: int, timeout: float = 120.0) -> float:
+    started = time.perf_counter()
+    while count() < messages and time.perf_counter() - started < timeout:
+        time.sleep(0.002)
+    return time.perf_counter() - started
+
+def run_threads(port: int, shards: int, data: bytes, messages: int):
+    received = [0]
+    lock = threading.Lock()
+
+    def on_reading(reading):
+        with lock:
+            received[0] += 1
+
+    pool = MQTTIngestPool(shards, "127.0.0.1", port, shared_group=GROUP, client_id_prefix=f"bench-{shards}")
+    pool.set_data_callback(on_reading)
+    asyncio.run(pool.connect())
+    publisher = threading.Thread(target=publish, args=(port, data))
+    publisher.start()
+    elapsed = wait_for(lambda: received[0], messages)
+    publisher.join()
+    per_shard = [client.messages for client in pool.clients]
+    asyncio.run(pool.disconnect())
+    return received[0], elapsed, per_shard
+
+def consume(port: int, shard: int, counter, ready, stop):
+    def on_reading(reading):
+        with counter.get_lock():
+            counter.value += 1
+
+    async def main():
+        pool = MQTTIngestPool(1, "127.0.0.1", port, shared_group=GROUP, client_id_prefix=f"bench-process-{shard}")
+        pool.set_data_callback(on_reading)
+        await pool.connect()
+        ready.release()
+        await asyncio.to_thread(stop.wait)
+        await pool.disconnect()
+    asyncio.run(main())
+
+def run_processes(port: int, shards: int, data: bytes, messages: int):
+    counter = multiprocessing.Value("q", 0)
+    ready = multiprocessing.Semaphore(0)
+    stop = multiprocessing.Event()
+    workers = [multiprocessing.Process(target=consume, args=(port, shard, counter, ready, stop))
+               for shard in range(shards)]
+    for worker in workers:
+        worker.start()
+    for _ in workers:
+        ready.acquire()
+    publisher = threading.Thread(target=publish, args=(port, data))
+    publisher.start()
+    elapsed = wait_for(lambda: counter.value, messages)
+    publisher.join()
+    stop.set()
+    for worker in workers:
+        worker.join()
+    return counter.value, elapsed, None
+
+def main(messages: int = 100_000, processes: bool = False):
+    logging.getLogger("mqtt_client").setLevel(logging.WARNING)
+    port_queue = multiprocessing.Queue()
+    broker = multiprocessing.Process(target=run_broker, args=(port_queue,), daemon=True)
+    broker.start()
+    port = port_queue.get(timeout=10)
+    data = make_packets(messages)
+    mode = "processes" if processes else "threads"
+    print(f"{messages:,} readings through a local broker stand-in, shards as {mode}")
+    run = run_processes if processes else run_threads
+    for shards in SHARD_COUNTS:
+        received, elapsed, per_shard = run(port, shards, data, messages)
+        line = f"{shards} shard(s): {received:>8,} received in {elapsed:6.2f}s  {received / elapsed:>9,.0f} msgs/s"
+        if per_shard:
+            line += f"  per shard {per_shard}"
+        print(line)
+    broker.terminate()
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    main(int(args[0]) if args else 100_000, processes="--processes" in sys.argv)
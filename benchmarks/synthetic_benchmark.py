@@ -0,0 +1,47 @@
+"""How many synthetic readings per second one core can generate and queue.
+
+Each fleet is advanced round-robin in batches of ``batch`` sensors, the way
+``SyntheticLoadGenerator`` does every tick, and the readings are queued on an
+ingest bridge. The last column is the per-sensor interval that rate sustains.
+
+Run from the repository root:
+
+    python benchmarks/synthetic_benchmark.py [seconds]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingest import IngestBridge
+from synthetic import SyntheticFleet
+
+FLEETS = (10_000, 100_000)
+BATCHES = (1_000, 10_000)
+
+def main(seconds: float = 3.0):
+    print(f"{'sensors':>8} {'batch':>7} {'readings/s':>11} {'ms/batch':>9} {'min interval':>13}")
+    for sensors in FLEETS:
+        started = time.perf_counter()
+        fleet = SyntheticFleet(sensors, interval=10, seed=1)
+        setup = time.perf_counter() - started
+        for batch in BATCHES:
+            bridge = IngestBridge(lambda payload: None, max_size=10 ** 7)
+            cursor = readings = batches = 0
+            started = time.perf_counter()
+            while time.perf_counter() - started < seconds:
+                index = (cursor + np.arange(batch)) % sensors
+                cursor = (cursor + batch) % sensors
+                bridge.submit_many(fleet.readings(index, time.time()))
+                readings += batch
+                batches += 1
+            elapsed = time.perf_counter() - started
+            rate = readings / elapsed
+            print(f"{sensors:>8,} {batch:>7,} {rate:>11,.0f} {elapsed / batches * 1000:>9.2f} {sensors / rate:>12.3f}s")
+        print(f"{'':>8} fleet setup {setup * 1000:.0f} ms")
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 3.0)
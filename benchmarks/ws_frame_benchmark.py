@@ -0,0 +1,64 @@
+"""Compare WebSocket frame encodings for a large sensor snapshot.
+
+Run from the repository root:
+
+    python benchmarks/ws_frame_benchmark.py [sensors]
+"""
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from frames import COLUMNAR, JSON, MSGPACK, SensorDictionary, available_encodings, encode_sensor_frame
+
+def make_snapshot(sensors: int) -> dict:
+    rng = np.random.default_rng(7)
+    now = datetime.now()
+    data = {}
+    for i in range(sensors):
+        sensor_id = f"sensor_{i:05d}"
+        data[sensor_id] = {
+            "sensor_id": sensor_id,
+            "pm25": round(float(rng.gamma(2.0, 8.0)), 1),
+            "pm10": round(float(rng.gamma(2.0, 14.0)), 1),
+            "co2": round(float(rng.normal(650, 120))),
+            "temperature": round(float(rng.normal(21, 4)), 1),
+            "humidity": round(float(rng.uniform(30, 80)), 1),
+            "aqi": int(rng.integers(0, 200)),
+            "timestamp": (now - timedelta(seconds=float(rng.uniform(0, 10)))).isoformat(),
+            "location": f"Station {i}"
+        }
+    return data
+
+def main(sensors: int = 5000, rounds: int = 20):
+    data = make_snapshot(sensors)
+    message = {"type": "sensor_data", "seq": 1}
+    dictionary = SensorDictionary()
+    dictionary.extend(data)
+
+    print(f"Frame encodings for {sensors:,} sensors ({rounds} rounds)")
+    started = time.perf_counter()
+    for _ in range(rounds):
+        legacy = json.dumps({**message, "data": data}, default=str)
+    legacy_ms = (time.perf_counter() - started) * 1000 / rounds
+    print(f"{'json.dumps (previous)':<24} {len(legacy.encode()):>10,} bytes  {legacy_ms:8.2f} ms/frame")
+
+    for encoding in (JSON, MSGPACK, COLUMNAR):
+        if encoding not in available_encodings():
+            print(f"{encoding:<24} not available")
+            continue
+        started = time.perf_counter()
+        for _ in range(rounds):
+            frame = encode_sensor_frame(message, data, encoding, dictionary)
+        elapsed_ms = (time.perf_counter() - started) * 1000 / rounds
+        size = len(frame.encode()) if isinstance(frame, str) else len(frame)
+        print(f"{encoding:<24} {size:>10,} bytes  {elapsed_ms:8.2f} ms/frame  "
+              f"{len(legacy.encode()) / size:5.1f}x smaller")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
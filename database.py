@@ -1,4 +1,5 @@
 import os
+from datetime import datetime, timedelta
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
@@ -21,6 +22,42 @@ def get_supabase_client() -> Client:
     """Get Supabase client instance"""
     return supabase
 
+class LocalTableClient:
+    """In-memory stand-in for the Supabase client's table().insert().execute() chain.
+
+    Useful for running the persistence path offline; rows end up in ``tables``.
+    """
+
+    def __init__(self):
+        self.tables = {}
+
+    def table(self, name: str):
+        return _LocalTable(self.tables.setdefault(name, []))
+
+class _LocalTable:
+    def __init__(self, rows: list):
+        self.rows = rows
+        self._pending = []
+        self._on_conflict = None
+
+    def insert(self, data):
+        self._pending = data if isinstance(data, list) else [data]
+        self._on_conflict = None
+        return self
+
+    def upsert(self, data, on_conflict: str = None):
+        self.insert(data)
+        self._on_conflict = on_conflict
+        return self
+
+    def execute(self):
+        if self._on_conflict:
+            # Replace rows with the same key, like Postgres' ON CONFLICT DO UPDATE
+            keys = {row.get(self._on_conflict) for row in self._pending}
+            self.rows[:] = [row for row in self.rows if row.get(self._on_conflict) not in keys]
+        self.rows.extend(self._pending)
+        return type("LocalResult", (), {"data": self._pending})()
+
 # Database schema for AirSense
 AIR_QUALITY_TABLE = """
 CREATE TABLE IF NOT EXISTS air_quality_data (
@@ -37,6 +74,19 @@ CREATE TABLE IF NOT EXISTS air_quality_data (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+CREATE TABLE IF NOT EXISTS air_quality_rollups (
+    sensor_id VARCHAR(50) NOT NULL,
+    tier VARCHAR(4) NOT NULL,
+    bucket_start TIMESTAMP WITH TIME ZONE NOT NULL,
+    metric VARCHAR(20) NOT NULL,
+    count INTEGER NOT NULL,
+    sum DOUBLE PRECISION NOT NULL,
+    min DOUBLE PRECISION NOT NULL,
+    max DOUBLE PRECISION NOT NULL,
+    sum_sq DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (sensor_id, tier, bucket_start, metric)
+);
+
 CREATE TABLE IF NOT EXISTS sensors (
     id VARCHAR(50) PRIMARY KEY,
     name VARCHAR(100) NOT NULL,
@@ -50,6 +100,7 @@ CREATE TABLE IF NOT EXISTS sensors (
 
 CREATE TABLE IF NOT EXISTS alerts (
     id SERIAL PRIMARY KEY,
+    alert_id VARCHAR(150) UNIQUE,
     sensor_id VARCHAR(50) NOT NULL,
     alert_type VARCHAR(50) NOT NULL,
     message TEXT NOT NULL,
@@ -60,6 +111,9 @@ CREATE TABLE IF NOT EXISTS alerts (
     resolved_at TIMESTAMP WITH TIME ZONE
 );
 
+-- Existing deployments: resolutions are upserted on alert_id
+ALTER TABLE alerts ADD COLUMN IF NOT EXISTS alert_id VARCHAR(150) UNIQUE;
+
 CREATE TABLE IF NOT EXISTS users (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
     email VARCHAR(255) UNIQUE NOT NULL,
@@ -107,6 +161,43 @@ def insert_air_quality_data(sensor_id: str, pm25: float, pm10: float, co2: float
         print(f"❌ Failed to insert air quality data: {e}")
         return None
 
+AIR_QUALITY_COLUMNS = ("sensor_id", "pm25", "pm10", "co2", "temperature", "humidity", "aqi", "location")
+
+def air_quality_row(data: dict):
+    """Build an air_quality_data row from a sensor reading, or None if fields are missing"""
+    if any(data.get(column) is None for column in AIR_QUALITY_COLUMNS):
+        return None
+    row = {column: data[column] for column in AIR_QUALITY_COLUMNS}
+    row["aqi"] = int(row["aqi"])
+    if data.get("timestamp"):
+        row["timestamp"] = data["timestamp"]
+    return row
+
+def get_rollups(sensor_id: str, tier: str, start: float, before: float = None, page_size: int = 1000):
+    """Get persisted rollup rows for a sensor and tier from ``start`` (epoch seconds),
+    up to but excluding ``before``; fetched in pages, since a range can exceed the
+    API's row limit"""
+    if not supabase:
+        return []
+    try:
+        rows = []
+        while True:
+            query = supabase.table("air_quality_rollups")\
+                .select("*")\
+                .eq("sensor_id", sensor_id)\
+                .eq("tier", tier)\
+                .gte("bucket_start", datetime.fromtimestamp(start).isoformat())
+            if before is not None:
+                query = query.lt("bucket_start", datetime.fromtimestamp(before).isoformat())
+            page = query.order("bucket_start", desc=False).order("metric", desc=False)\
+                .range(len(rows), len(rows) + page_size - 1).execute().data
+            rows.extend(page)
+            if len(page) < page_size:
+                return rows
+    except Exception as e:
+        print(f"❌ Failed to get rollups: {e}")
+        return []
+
 def get_latest_air_quality(sensor_id: str = None):
     """Get latest air quality data"""
     if not supabase:
@@ -123,23 +214,62 @@ def get_latest_air_quality(sensor_id: str = None):
         print(f"❌ Failed to get air quality data: {e}")
         return []
 
-def get_historical_air_quality(sensor_id: str, hours: int = 24):
-    """Get historical air quality data"""
+def get_sensor_metadata():
+    """Get every row of the sensors table"""
     if not supabase:
         return []
     try:
-        from datetime import datetime, timedelta
-        
-        start_time = datetime.now() - timedelta(hours=hours)
-        
-        result = supabase.table("air_quality_data")\
-            .select("*")\
-            .eq("sensor_id", sensor_id)\
-            .gte("timestamp", start_time.isoformat())\
-            .order("timestamp", desc=False)\
-            .execute()
-            
+        result = supabase.table("sensors").select("*").execute()
         return result.data
+    except Exception as e:
+        print(f"❌ Failed to get sensors: {e}")
+        return []
+
+def get_historical_air_quality(sensor_id: str, hours: int = 24, before: float = None, page_size: int = 1000):
+    """Get historical air quality data for the last ``hours``, up to but excluding
+    ``before`` (epoch seconds); fetched in pages, since a range can exceed the
+    API's row limit"""
+    if not supabase:
+        return []
+    try:
+        start_time = datetime.now() - timedelta(hours=hours)
+        rows = []
+        while True:
+            query = supabase.table("air_quality_data")\
+                .select("*")\
+                .eq("sensor_id", sensor_id)\
+                .gte("timestamp", start_time.isoformat())
+            if before is not None:
+                query = query.lt("timestamp", datetime.fromtimestamp(before).isoformat())
+            page = query.order("timestamp", desc=False).order("id", desc=False)\
+                .range(len(rows), len(rows) + page_size - 1).execute().data
+            rows.extend(page)
+            if len(page) < page_size:
+                return rows
     except Exception as e:
         print(f"❌ Failed to get historical data: {e}")
         return []
+
+def get_air_quality_page(start: str, end: str, after=None, sensor_ids=None, limit: int = 5000):
+    """One page of air_quality_data in (timestamp, id) order, for exports.
+
+    Keyset pagination: ``after`` is the (timestamp, id) of the last row of the
+    previous page, so every page is an index range scan however deep the
+    export goes. Errors are raised, not swallowed, so a truncated export is
+    never mistaken for a complete one.
+    """
+    if not supabase:
+        return []
+    query = supabase.table("air_quality_data").select("*")
+    if after:
+        # Both parts are re-serialized from parsed values before going into the filter string
+        timestamp = datetime.fromisoformat(str(after[0]).replace("Z", "+00:00")).isoformat()
+        row_id = int(after[1])
+        query = query.or_(f'timestamp.gt."{timestamp}",and(timestamp.eq."{timestamp}",id.gt.{row_id})')
+    else:
+        query = query.gte("timestamp", start)
+    query = query.lte("timestamp", end)
+    if sensor_ids:
+        query = query.in_("sensor_id", list(sensor_ids))
+    result = query.order("timestamp", desc=False).order("id", desc=False).limit(limit).execute()
+    return result.data
@@ -0,0 +1,155 @@
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+from snapshot import loads
+
+logger = logging.getLogger(__name__)
+
+# AirQualityData fields a sensor payload may carry, by type
+FLOAT_FIELDS = ("pm25", "pm10", "co2", "temperature", "humidity")
+INT_FIELDS = ("aqi",)
+STR_FIELDS = ("location",)
+
+def _number(value, kind):
+    # bool is an int subclass but never a valid reading
+    if isinstance(value, bool):
+        raise ValueError("boolean is not a number")
+    if isinstance(value, str):
+        value = float(value)
+    elif not isinstance(value, (int, float)):
+        raise ValueError(f"{type(value).__name__} is not a number")
+    return kind(value) if kind is int else value
+
+def validate_reading(payload) -> dict:
+    """Check a decoded payload against the AirQualityData field types.
+
+    Payloads may be partial (one topic per metric) and extra fields pass
+    through. Fields that already have the right type are left alone, which is
+    the common case; numeric strings are converted and anything else raises
+    ValueError. ``None`` means the metric is missing.
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("payload is not an object")
+    for field in FLOAT_FIELDS:
+        value = payload.get(field)
+        if value is not None and type(value) is not float and type(value) is not int:
+            payload[field] = _number(value, float)
+    for field in INT_FIELDS:
+        value = payload.get(field)
+        if value is not None and type(value) is not int:
+            payload[field] = _number(value, int)
+    for field in STR_FIELDS:
+        value = payload.get(field)
+        if value is not None and type(value) is not str:
+            raise ValueError(f"{field} is not a string")
+    return payload
+
+class MessageDecoder:
+    """Decodes raw MQTT messages in micro-batches.
+
+    ``add`` queues a (topic, payload bytes) pair; once ``batch_size`` messages
+    are queued, or ``flush_stale`` finds the oldest one older than
+    ``max_delay`` seconds, the batch is parsed straight from bytes (orjson
+    when installed), checked with ``validate_reading``, stamped with the
+    sensor id, topic and one receive time per batch, and handed to ``emit`` as
+    a list. Instead of logging every message, counts are logged once per
+    ``log_interval`` seconds, with one sample reading at DEBUG.
+    """
+
+    def __init__(self, emit: Callable[[List[dict]], None], batch_size: int = 256,
+                 max_delay: float = 0.02, log_interval: float = 10.0, name: str = "mqtt"):
+        self.emit = emit
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.log_interval = log_interval
+        self.name = name
+        # Held while a batch is decoded and emitted, so batches stay in order
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[str, bytes]] = []
+        self._oldest = 0.0
+
+        self.decoded = 0
+        self.invalid = 0
+        self.batches = 0
+        self.last_error: Optional[str] = None
+        self._logged_at = time.monotonic()
+        self._logged_decoded = 0
+        self._logged_invalid = 0
+
+    def add(self, topic: str, payload: bytes):
+        with self._lock:
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self._pending.append((topic, payload))
+            if len(self._pending) >= self.batch_size:
+                self._flush()
+
+    def flush_stale(self):
+        """Decode a partial batch whose oldest message has waited ``max_delay``"""
+        with self._lock:
+            if self._pending and time.monotonic() - self._oldest >= self.max_delay:
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            if self._pending:
+                self._flush()
+
+    def _flush(self):
+        messages, self._pending = self._pending, []
+        readings = self.decode(messages)
+        self.batches += 1
+        if readings:
+            self.emit(readings)
+        self._log(readings)
+
+    def decode(self, messages: List[Tuple[str, bytes]]) -> List[dict]:
+        received_at = datetime.now().isoformat()
+        readings = []
+        for topic, payload in messages:
+            # Topic format: airsense/sensors/{sensor_id}/{data_type}
+            parts = topic.split("/", 3)
+            try:
+                if len(parts) < 3:
+                    raise ValueError(f"unexpected topic {topic}")
+                reading = validate_reading(loads(payload))
+            except (ValueError, OverflowError) as e:
+                self.invalid += 1
+                self.last_error = f"{topic}: {e}"
+                continue
+            reading["sensor_id"] = parts[2]
+            reading["timestamp"] = received_at
+            reading["topic"] = topic
+            readings.append(reading)
+        self.decoded += len(readings)
+        return readings
+
+    def _log(self, readings: List[dict]):
+        now = time.monotonic()
+        elapsed = now - self._logged_at
+        if elapsed < self.log_interval:
+            return
+        decoded = self.decoded - self._logged_decoded
+        invalid = self.invalid - self._logged_invalid
+        logger.info(f"📊 {self.name}: {decoded} readings ({decoded / elapsed:.0f}/s), "
+                    f"{invalid} invalid in the last {elapsed:.0f}s")
+        if invalid:
+            logger.warning(f"⚠️ {self.name}: last invalid message: {self.last_error}")
+        if readings and logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"📊 {self.name}: sample reading {readings[-1]}")
+        self._logged_at = now
+        self._logged_decoded = self.decoded
+        self._logged_invalid = self.invalid
+
+    def get_stats(self) -> dict:
+        """Report decode counters"""
+        return {
+            "decoded": self.decoded,
+            "invalid": self.invalid,
+            "batches": self.batches,
+            "avg_batch": round((self.decoded + self.invalid) / self.batches, 1) if self.batches else None,
+            "last_error": self.last_error
+        }
@@ -0,0 +1,285 @@
+import asyncio
+import bisect
+import csv
+import heapq
+import io
+import itertools
+import logging
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Callable, Iterator, List, Optional, Sequence, Tuple
+
+from snapshot import dumps
+from timeseries import METRICS, TimeSeriesStore, to_epoch
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional format
+    pa = pq = None
+
+CSV = "csv"
+NDJSON = "ndjson"
+PARQUET = "parquet"
+
+MEDIA_TYPES = {
+    CSV: "text/csv; charset=utf-8",
+    NDJSON: "application/x-ndjson",
+    PARQUET: "application/vnd.apache.parquet"
+}
+
+Key = Tuple[str, str]
+
+logger = logging.getLogger(__name__)
+
+def available_formats() -> List[str]:
+    return [CSV, NDJSON, PARQUET] if pa is not None else [CSV, NDJSON]
+
+def parse_cursor(value: str, numeric_id: bool = False) -> Key:
+    """Parse a resume cursor: the ``timestamp,id`` of the last row received.
+
+    The timestamp is returned re-serialized from the parsed value, never as
+    given, since sources build queries from it; ``numeric_id`` requires an
+    integer id (database rows).
+    """
+    timestamp, sep, row_id = value.rpartition(",")
+    if not sep or not timestamp or not row_id:
+        raise ValueError("cursor must be '<timestamp>,<id>' of the last row received")
+    try:
+        timestamp = datetime.fromisoformat(timestamp.replace("Z", "+00:00")).isoformat()
+    except ValueError:
+        raise ValueError(f"cursor timestamp is not an ISO 8601 timestamp: {timestamp!r}")
+    if numeric_id:
+        try:
+            row_id = str(int(row_id))
+        except ValueError:
+            raise ValueError(f"cursor id must be an integer: {row_id!r}")
+    return timestamp, row_id
+
+class HistorySource:
+    """Rows from the in-process history store, ordered by (timestamp, sensor_id).
+
+    The ``id`` of a row is its sensor id. Timestamps are compared at
+    microsecond resolution, the precision of the exported ISO strings.
+    Pages come from a k-way merge over per-sensor cursors that fetch about
+    ``page_size / sensors`` readings at a time, so a page costs
+    O(page_size · log sensors) rather than a query of every sensor; the merge
+    carries over from one page to the next and is rebuilt only when a page
+    starts somewhere else (e.g. a resumed export). Ingest appends to the same
+    rings on the event loop, so pages are read there too, ``step`` rows at a
+    time with a yield in between, rather than in a worker thread.
+    """
+
+    columns = ("sensor_id", "timestamp") + METRICS
+    step = 1000
+
+    def __init__(self, store: TimeSeriesStore, start: float, end: float,
+                 sensor_ids: Optional[Sequence[str]] = None):
+        self.store = store
+        self.start = start
+        self.end = end
+        # Sensors are fixed when the export starts; ingest may add more on the event loop
+        self.sensor_ids = sorted(sensor_ids) if sensor_ids else sorted(self.store.buffers.copy())
+        self._merge: Optional[Iterator[tuple]] = None
+        self._last: Optional[Key] = None
+
+    def key(self, row: dict) -> Key:
+        return row["timestamp"], row["sensor_id"]
+
+    def _cursor(self, sensor_id: str, start: float, chunk: int) -> Iterator[tuple]:
+        """(timestamp_us, sensor_id, values) for one sensor from ``start``, ``chunk`` readings per query"""
+        seen = 0  # readings at ``start`` already yielded by the previous chunk
+        while True:
+            ts, values = self.store.query(sensor_id, start, self.end, chunk + seen)
+            stamps = [round(timestamp * 1e6) for timestamp in ts.tolist()]
+            for stamp, row in itertools.islice(zip(stamps, values.tolist()), seen, None):
+                yield stamp, sensor_id, row
+            if len(ts) < chunk + seen:
+                return
+            # Resume at the last timestamp, which may have more readings than fit in this chunk
+            seen = len(stamps) - bisect.bisect_left(stamps, stamps[-1])
+            start = (stamps[-1] - 0.5) / 1e6
+
+    def _open(self, after: Optional[Key], limit: int) -> Iterator[tuple]:
+        chunk = max(16, limit // max(1, len(self.sensor_ids)) + 1)
+        if after is not None:
+            after_us = round(to_epoch(after[0]) * 1e6)
+        cursors = []
+        for sensor_id in self.sensor_ids:
+            start = self.start
+            if after is not None:
+                # Same timestamp as the cursor only for sensors that sort after it
+                start = max(self.start, (after_us + (-0.5 if sensor_id > after[1] else 0.5)) / 1e6)
+            cursors.append(self._cursor(sensor_id, start, chunk))
+        # Sensor ids differ between cursors, so ties never compare the values
+        return heapq.merge(*cursors)
+
+    def _take(self, limit: int) -> List[dict]:
+        rows = []
+        for stamp, sensor_id, values in itertools.islice(self._merge, limit):
+            # From the whole microseconds, so a cursor made from this row finds it again
+            timestamp = datetime.fromtimestamp(stamp // 1_000_000) + timedelta(microseconds=stamp % 1_000_000)
+            row = {"sensor_id": sensor_id, "timestamp": timestamp.isoformat()}
+            for metric, value in zip(METRICS, values):
+                row[metric] = None if value != value else value
+            rows.append(row)
+        return rows
+
+    async def page(self, after: Optional[Key], limit: int) -> List[dict]:
+        if self._merge is None or after != self._last:
+            self._merge = self._open(after, limit)
+        rows = []
+        while len(rows) < limit:
+            chunk = self._take(min(self.step, limit - len(rows)))
+            rows.extend(chunk)
+            if len(chunk) < self.step:
+                break
+            await asyncio.sleep(0)
+        self._last = self.key(rows[-1]) if rows else None
+        return rows
+
+class DatabaseSource:
+    """Rows from air_quality_data via ``fetch_page`` (see database.get_air_quality_page)"""
+
+    columns = ("id", "sensor_id", "timestamp") + METRICS + ("location",)
+
+    def __init__(self, fetch_page: Callable[..., List[dict]], start: float, end: float,
+                 sensor_ids: Optional[Sequence[str]] = None):
+        self.fetch_page = fetch_page
+        self.start = datetime.fromtimestamp(start).isoformat()
+        self.end = datetime.fromtimestamp(end).isoformat()
+        self.sensor_ids = sensor_ids
+
+    def key(self, row: dict) -> Key:
+        return row["timestamp"], str(row["id"])
+
+    async def page(self, after: Optional[Key], limit: int) -> List[dict]:
+        return await asyncio.to_thread(self.fetch_page, self.start, self.end, after, self.sensor_ids, limit)
+
+class CsvWriter:
+    def __init__(self, columns: Sequence[str]):
+        self.columns = columns
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+        self._writer.writerow(columns)
+
+    def write(self, rows: List[dict]) -> bytes:
+        self._writer.writerows([[row.get(column) for column in self.columns] for row in rows])
+        return self._drain()
+
+    def close(self) -> bytes:
+        return self._drain()
+
+    def _drain(self) -> bytes:
+        data = self._buffer.getvalue().encode()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+class NdjsonWriter:
+    def __init__(self, columns: Sequence[str]):
+        self.columns = columns
+
+    def write(self, rows: List[dict]) -> bytes:
+        return b"".join(dumps({column: row.get(column) for column in self.columns}) + b"\n" for row in rows)
+
+    def close(self) -> bytes:
+        return b""
+
+class _Sink(io.RawIOBase):
+    """Write-only file that hands back whatever was written since the last ``drain``"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+class ParquetWriter:
+    """One Parquet row group per page; the footer is written by ``close``"""
+
+    def __init__(self, columns: Sequence[str]):
+        if pa is None:
+            raise ValueError("Parquet export needs pyarrow")
+        self.columns = columns
+        self.schema = pa.schema([(column, self._type(column)) for column in columns])
+        self._sink = _Sink()
+        self._writer = pq.ParquetWriter(self._sink, self.schema, compression="zstd")
+
+    @staticmethod
+    def _type(column: str):
+        if column == "id":
+            return pa.int64()
+        if column in METRICS:
+            return pa.float64()
+        return pa.string()
+
+    def write(self, rows: List[dict]) -> bytes:
+        table = pa.Table.from_pylist([{column: row.get(column) for column in self.columns} for row in rows],
+                                     schema=self.schema)
+        self._writer.write_table(table)
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        self._writer.close()
+        return self._sink.drain()
+
+WRITERS = {CSV: CsvWriter, NDJSON: NdjsonWriter, PARQUET: ParquetWriter}
+
+class Export:
+    """A keyset-paginated export: ``open()`` fetches the first page, ``stream()`` yields encoded chunks.
+
+    Only one page (``page_size`` rows) is held at a time, whatever the range.
+    Each page resumes after the (timestamp, id) key of the previous page's last row,
+    which is also what a client passes as ``cursor`` to resume an interrupted export.
+    """
+
+    def __init__(self, source, fmt: str, after: Optional[Key] = None,
+                 page_size: int = 5000, limit: Optional[int] = None):
+        if fmt not in available_formats():
+            raise ValueError(f"Unknown or unavailable format: {fmt}")
+        self.source = source
+        self.writer = WRITERS[fmt](source.columns)
+        self.after = after
+        self.page_size = page_size
+        self.limit = limit
+        self.rows = 0
+        self._first: Optional[List[dict]] = None
+
+    def _page_limit(self) -> int:
+        return self.page_size if self.limit is None else min(self.page_size, self.limit - self.rows)
+
+    async def open(self):
+        """Fetch the first page, so that errors surface before the response starts"""
+        self._first = await self.source.page(self.after, self._page_limit())
+
+    async def stream(self) -> AsyncIterator[bytes]:
+        page = self._first if self._first is not None else await self.source.page(self.after, self._page_limit())
+        while True:
+            if page:
+                self.rows += len(page)
+                self.after = self.source.key(page[-1])
+                yield self.writer.write(page)
+            if len(page) < self.page_size or (self.limit is not None and self.rows >= self.limit):
+                break
+            try:
+                page = await self.source.page(self.after, self._page_limit())
+            except Exception as e:
+                # Abort the response so the client sees an incomplete transfer and resumes
+                logger.error(f"❌ Export failed after {self.rows} rows (cursor {','.join(self.after)}): {e}")
+                raise
+        tail = self.writer.close()
+        if tail:
+            yield tail
@@ -0,0 +1,149 @@
+from fastapi import WebSocket
+from collections import deque
+from typing import Callable, Dict, Iterable, Optional, Union
+import asyncio
+
+# Slow-consumer policies
+CONFLATE = "conflate"
+EVICT = "evict"
+SLOW_CONSUMER_POLICIES = (CONFLATE, EVICT)
+
+# Frame kinds where only the most recent pending frame matters: full snapshots.
+# Deltas ("sensor_delta") are not conflated, since each carries only the sensors
+# that changed; a client that misses one sees a gap in seq and resyncs
+DEFAULT_CONFLATE_KINDS = ("sensor_data",)
+
+Frame = Union[str, bytes]
+
+class OutboundChannel:
+    """Bounded outbound queue plus a writer task for one WebSocket connection.
+
+    ``offer`` never awaits, so a stalled client cannot hold up the broadcaster.
+    Frames whose kind is conflatable (``sensor_data`` snapshots by default)
+    replace any pending frame of the same kind in place, so a slow client only
+    ever sees the latest snapshot; ``sensor_delta`` frames are always queued.
+    When the queue is full the policy decides: ``conflate`` drops the oldest
+    pending frame, ``evict`` closes the connection once more than
+    ``lag_threshold`` frames are waiting. ``gap`` is set whenever a frame is
+    dropped, so the owner can send fresh state in its place.
+    """
+
+    def __init__(self, websocket: WebSocket, max_queue: int = 256,
+                 policy: str = CONFLATE, lag_threshold: Optional[int] = None,
+                 conflate_kinds: Iterable[str] = DEFAULT_CONFLATE_KINDS,
+                 on_close: Optional[Callable[["OutboundChannel"], None]] = None):
+        if policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"Unknown slow consumer policy: {policy}")
+
+        self.websocket = websocket
+        self.max_queue = max_queue
+        self.policy = policy
+        self.lag_threshold = lag_threshold if lag_threshold is not None else max_queue
+        self.conflate_kinds = frozenset(conflate_kinds)
+        self.on_close = on_close
+
+        # Entries are [kind, frame] lists so conflation can swap the frame in place
+        self._queue: deque = deque()
+        self._pending: Dict[str, list] = {}
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.closed = False
+        self.close_reason: Optional[str] = None
+        self.gap = False
+
+        self.sent = 0
+        self.conflated = 0
+        self.dropped = 0
+
+    @property
+    def lag(self) -> int:
+        """Number of frames waiting to be written"""
+        return len(self._queue)
+
+    def start(self):
+        """Start the writer task"""
+        self._task = asyncio.create_task(self._writer())
+
+    def offer(self, frame: Frame, kind: Optional[str] = None) -> bool:
+        """Queue a frame without blocking. Returns False if the frame was not queued."""
+        if self.closed:
+            return False
+
+        if kind in self.conflate_kinds:
+            entry = self._pending.get(kind)
+            if entry is not None:
+                entry[1] = frame
+                self.conflated += 1
+                return True
+
+        if self.policy == EVICT and len(self._queue) >= self.lag_threshold:
+            self.close("lagging")
+            return False
+
+        if len(self._queue) >= self.max_queue:
+            oldest = self._queue.popleft()
+            if self._pending.get(oldest[0]) is oldest:
+                del self._pending[oldest[0]]
+            self.dropped += 1
+            self.gap = True
+
+        entry = [kind, frame]
+        self._queue.append(entry)
+        if kind in self.conflate_kinds:
+            self._pending[kind] = entry
+        self._ready.set()
+        return True
+
+    async def _writer(self):
+        """Write queued frames to the socket in order"""
+        try:
+            while not self.closed:
+                if not self._queue:
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+                entry = self._queue.popleft()
+                if self._pending.get(entry[0]) is entry:
+                    del self._pending[entry[0]]
+                frame = entry[1]
+                if isinstance(frame, bytes):
+                    await self.websocket.send_bytes(frame)
+                else:
+                    await self.websocket.send_text(frame)
+                self.sent += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"❌ Failed to send to connection: {e}")
+            self.close("send_failed")
+
+    def close(self, reason: str = "closed"):
+        """Stop the writer and drop anything still queued"""
+        if self.closed:
+            return
+        self.closed = True
+        self.close_reason = reason
+        self._queue.clear()
+        self._pending.clear()
+        if self._task and self._task is not asyncio.current_task():
+            self._task.cancel()
+        if reason == "lagging":
+            # Closing may itself stall on a dead peer, so don't wait for it
+            asyncio.ensure_future(self._close_socket(1013))
+        if self.on_close:
+            self.on_close(self)
+
+    async def _close_socket(self, code: int):
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code), timeout=5)
+        except Exception:
+            pass
+
+    def get_stats(self) -> dict:
+        """Get per-connection delivery counters"""
+        return {
+            "sent": self.sent,
+            "conflated": self.conflated,
+            "dropped": self.dropped,
+            "lag": self.lag
+        }
@@ -0,0 +1,232 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from timeseries import METRICS, to_epoch
+
+SEASONS = 24  # hour-of-day seasonal slots
+Z_95 = 1.96
+
+def _hour(epoch: float) -> int:
+    return datetime.fromtimestamp(epoch).hour
+
+class ForecastModel:
+    """Online damped Holt-Winters state for every sensor and metric.
+
+    Readings are averaged into ``step``-second steps; ``add`` is O(1) and only
+    touches the sensor's accumulator, plus one update of its level, trend,
+    hour-of-day seasonal term and error variance when a step closes. State
+    lives in fleet-wide arrays (one row per sensor, one column per metric)
+    that grow by doubling, so a forecast reads a single row instead of
+    refitting on history.
+    """
+
+    def __init__(self, step: int = 300, alpha: float = 0.3, beta: float = 0.05,
+                 gamma: float = 0.1, phi: float = 0.98, capacity: int = 64):
+        self.step = step
+        self.alpha = alpha
+        self.beta = beta
+        self.gamma = gamma
+        self.phi = phi
+        self.index: Dict[str, int] = {}
+        width = len(METRICS)
+        self.level = np.full((capacity, width), np.nan)
+        self.trend = np.zeros((capacity, width))
+        self.season = np.zeros((capacity, SEASONS, width))
+        self.variance = np.zeros((capacity, width))
+        self.fitted = np.zeros((capacity, width), dtype=np.int64)
+        self.acc_sum = np.zeros((capacity, width))
+        self.acc_count = np.zeros((capacity, width))
+        self.open_step = np.full(capacity, np.nan)
+        self.last_step = np.full(capacity, np.nan)
+        # Bumped whenever a sensor's state changes; forecasts are cached per version
+        self.versions = np.zeros(capacity, dtype=np.int64)
+        self.readings = 0
+        self.steps_closed = 0
+
+    def __contains__(self, sensor_id: str) -> bool:
+        return sensor_id in self.index
+
+    def _row(self, sensor_id: str) -> int:
+        row = self.index.get(sensor_id)
+        if row is None:
+            row = self.index[sensor_id] = len(self.index)
+            if row == len(self.level):
+                self._grow()
+        return row
+
+    def _grow(self):
+        for name in ("level", "trend", "season", "variance", "fitted", "acc_sum", "acc_count",
+                     "open_step", "last_step", "versions"):
+            array = getattr(self, name)
+            extra = np.zeros_like(array)
+            if name in ("level", "open_step", "last_step"):
+                extra.fill(np.nan)
+            setattr(self, name, np.concatenate([array, extra]))
+
+    def add(self, data: dict):
+        """Fold a reading into its sensor's open step"""
+        sensor_id = data.get("sensor_id")
+        if sensor_id is None:
+            return
+        try:
+            timestamp = to_epoch(data.get("timestamp"))
+        except (TypeError, ValueError):
+            return
+        values = [(column, value) for column, value in enumerate(data.get(m) for m in METRICS) if value is not None]
+        if not values:
+            return
+        row = self._row(sensor_id)
+        step_start = (timestamp // self.step) * self.step
+        open_step = self.open_step[row]
+        if open_step != open_step:
+            self.open_step[row] = step_start
+        elif step_start > open_step:
+            self._close(row)
+            self.open_step[row] = step_start
+        elif step_start < open_step:
+            # Late reading for a step that is already folded in
+            return
+        sums, counts = self.acc_sum[row], self.acc_count[row]
+        for column, value in values:
+            sums[column] += value
+            counts[column] += 1
+        self.readings += 1
+
+    def _close(self, row: int):
+        counts = self.acc_count[row]
+        observed = counts > 0
+        if not observed.any():
+            return
+        x = self.acc_sum[row] / np.where(observed, counts, 1.0)
+        start = self.open_step[row]
+        slot = _hour(start)
+        last = self.last_step[row]
+        gap = max((start - last) / self.step, 1.0) if last == last else 1.0
+
+        level, trend = self.level[row], self.trend[row]
+        season = self.season[row, slot]
+        new = observed & np.isnan(level)
+        update = observed & ~new
+        if new.any():
+            level[new] = x[new]
+            trend[new] = 0.0
+        if update.any():
+            damped = self.phi * trend[update]
+            predicted = level[update] + gap * damped + season[update]
+            error = x[update] - predicted
+            previous = level[update]
+            level[update] = self.alpha * (x[update] - season[update]) + (1 - self.alpha) * (previous + gap * damped)
+            trend[update] = self.beta * (level[update] - previous) / gap + (1 - self.beta) * damped
+            season[update] = self.gamma * (x[update] - level[update]) + (1 - self.gamma) * season[update]
+            self.season[row, slot] = season
+            self.variance[row, update] = 0.9 * self.variance[row, update] + 0.1 * error * error
+        self.fitted[row] += observed
+        self.last_step[row] = start
+        self.acc_sum[row] = 0.0
+        self.acc_count[row] = 0.0
+        self.versions[row] += 1
+        self.steps_closed += 1
+
+    def version(self, sensor_id: str) -> Optional[int]:
+        row = self.index.get(sensor_id)
+        return None if row is None else int(self.versions[row])
+
+    def forecast(self, sensor_id: str, horizon: int) -> Optional[dict]:
+        """Point forecast and 95% interval per metric at every step up to ``horizon`` seconds"""
+        row = self.index.get(sensor_id)
+        if row is None:
+            return None
+        last = self.last_step[row]
+        if last != last:
+            return None
+        steps = max(1, int(horizon // self.step))
+        ahead = np.arange(1, steps + 1)
+        # Sum of phi^1..phi^h: how far the damped trend carries after h steps
+        damping = np.cumsum(self.phi ** ahead)
+        times = last + self.step * ahead
+        slots = np.array([_hour(t) for t in times.tolist()])
+        mean = self.level[row] + damping[:, None] * self.trend[row] + self.season[row, slots]
+        spread = Z_95 * np.sqrt(self.variance[row] * (1 + (ahead[:, None] - 1) * self.alpha ** 2))
+        low, high = mean - spread, mean + spread
+
+        points = []
+        fitted = self.fitted[row] > 1
+        for i, timestamp in enumerate(times.tolist()):
+            point = {"timestamp": datetime.fromtimestamp(timestamp).isoformat()}
+            for column, metric in enumerate(METRICS):
+                if not fitted[column]:
+                    continue
+                point[metric] = {
+                    "value": round(float(mean[i, column]), 3),
+                    "low": round(float(low[i, column]), 3),
+                    "high": round(float(high[i, column]), 3)
+                }
+            points.append(point)
+        return {
+            "sensor_id": sensor_id,
+            "step_seconds": self.step,
+            "horizon_seconds": steps * self.step,
+            "based_on": datetime.fromtimestamp(last).isoformat(),
+            "model": {"kind": "holt_winters_damped", "alpha": self.alpha, "beta": self.beta,
+                      "gamma": self.gamma, "phi": self.phi, "season": "hour_of_day"},
+            "forecast": points
+        }
+
+    def get_stats(self) -> dict:
+        """Report model coverage and update counts"""
+        return {
+            "sensors": len(self.index),
+            "step_seconds": self.step,
+            "readings": self.readings,
+            "steps_closed": self.steps_closed,
+            "state_bytes": sum(getattr(self, name).nbytes for name in
+                               ("level", "trend", "season", "variance", "fitted", "acc_sum",
+                                "acc_count", "open_step", "last_step", "versions"))
+        }
+
+class ForecastCache:
+    """Forecasts per (sensor, horizon), valid until the sensor's model state next changes.
+
+    State changes once per closed step, so every request in between is a
+    dictionary lookup. At most ``max_entries`` forecasts are kept, least
+    recently used first out.
+    """
+
+    def __init__(self, model: ForecastModel, max_entries: int = 10000):
+        self.model = model
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, int], Tuple[int, dict]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, sensor_id: str, horizon: int) -> Optional[dict]:
+        version = self.model.version(sensor_id)
+        if version is None:
+            return None
+        key = (sensor_id, horizon)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        result = self.model.forecast(sensor_id, horizon)
+        if result is not None:
+            self._entries[key] = (version, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
+
+    def get_stats(self) -> dict:
+        """Report cached forecasts and hit rate"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None
+        }
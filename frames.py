@@ -0,0 +1,199 @@
+import struct
+import time
+import zlib
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from snapshot import dumps
+from timeseries import METRICS, to_epoch
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional encoding
+    msgpack = None
+
+# WebSocket encodings a client can ask for with /ws?encoding=...
+JSON = "json"
+MSGPACK = "msgpack"
+COLUMNAR = "columnar"
+
+Frame = Union[str, bytes]
+
+# Columnar sensor frame, little-endian:
+#   magic b"ASC1", uint8 frame type, uint8 metric count, uint16 reserved,
+#   uint32 seq, uint32 dictionary size, float64 frame time (epoch seconds),
+#   uint32 sensor count n, then uint32[n] sensor dictionary indices,
+#   int32[n] reading time minus frame time in milliseconds (NO_TIMESTAMP if
+#   missing), and float32[n] per metric in METRICS order (NaN if missing).
+#   Every section is 4-byte aligned.
+COLUMNAR_MAGIC = b"ASC1"
+COLUMNAR_HEADER = struct.Struct("<4sBBHIIdI")
+COLUMNAR_TYPES = {"sensor_data": 0, "sensor_update": 1}
+_COLUMNAR_TYPE_NAMES = {code: name for name, code in COLUMNAR_TYPES.items()}
+NO_TIMESTAMP = -2 ** 31
+
+# Shared compression a client can ask for with /ws?compression=deflate
+DEFLATE = "deflate"
+
+def available_encodings() -> List[str]:
+    encodings = [JSON, COLUMNAR]
+    if msgpack is not None:
+        encodings.append(MSGPACK)
+    return encodings
+
+def negotiate(requested: Optional[str]) -> str:
+    """Encoding to use for a client; unknown or unavailable requests get JSON"""
+    requested = (requested or JSON).lower()
+    return requested if requested in available_encodings() else JSON
+
+class SensorDictionary:
+    """Append-only sensor id <-> index mapping shared by every columnar client.
+
+    Indices never change, so frames can be encoded once for all clients; ids
+    added since a client last synced are sent as ``sensor_dictionary`` deltas.
+    """
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self._index: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def extend(self, sensor_ids: Iterable[str]) -> List[str]:
+        """Assign indices to unseen ids; returns the ids that were added"""
+        added = []
+        for sensor_id in sensor_ids:
+            if sensor_id not in self._index:
+                self._index[sensor_id] = len(self.ids)
+                self.ids.append(sensor_id)
+                added.append(sensor_id)
+        return added
+
+    def indices(self, sensor_ids: Iterable[str]) -> np.ndarray:
+        index = self._index
+        return np.fromiter((index[sensor_id] for sensor_id in sensor_ids), dtype="<u4")
+
+    def message(self, offset: int = 0) -> dict:
+        """``sensor_dictionary`` message carrying ids from ``offset`` on"""
+        return {"type": "sensor_dictionary", "offset": offset, "ids": self.ids[offset:]}
+
+def encode_message(message: dict, encoding: str) -> Frame:
+    """Encode a control/alert message: MessagePack for msgpack clients, JSON text otherwise"""
+    if encoding == MSGPACK:
+        return msgpack.packb(message, default=str, use_bin_type=True)
+    return dumps(message).decode()
+
+@lru_cache(maxsize=65536)
+def _epoch(timestamp) -> float:
+    # Snapshots re-send unchanged readings every tick, so most lookups are hits
+    return to_epoch(timestamp)
+
+def _offsets_ms(readings: List[dict], frame_time: float) -> np.ndarray:
+    epochs = np.array([_epoch(reading["timestamp"]) if reading.get("timestamp") else np.nan
+                       for reading in readings], dtype=np.float64)
+    offsets = np.clip(np.rint((epochs - frame_time) * 1000), NO_TIMESTAMP + 1, 2 ** 31 - 1)
+    return np.where(np.isnan(offsets), NO_TIMESTAMP, offsets).astype("<i4")
+
+def encode_columnar(message: dict, data: Dict[str, dict], dictionary: SensorDictionary) -> bytes:
+    """Pack a sensor_data/sensor_update message as a columnar frame.
+
+    Every id in ``data`` must already be in ``dictionary``. Only ids,
+    timestamps and METRICS travel; other reading fields (e.g. ``location``) are
+    sensor metadata available from /api/sensors.
+    """
+    sensor_ids = list(data)
+    frame_time = to_epoch(message.get("timestamp"))
+    readings = list(data.values())
+    times = _offsets_ms(readings, frame_time)
+    # None becomes NaN in the float conversion
+    values = np.array([tuple(map(reading.get, METRICS)) for reading in readings],
+                      dtype=np.float64).reshape(len(readings), len(METRICS))
+    header = COLUMNAR_HEADER.pack(COLUMNAR_MAGIC, COLUMNAR_TYPES[message["type"]], len(METRICS), 0,
+                                  message.get("seq", 0), len(dictionary), frame_time, len(sensor_ids))
+    return b"".join((header, dictionary.indices(sensor_ids).tobytes(), times.tobytes(),
+                     np.ascontiguousarray(values.T, dtype="<f4").tobytes()))
+
+def decode_columnar(frame: bytes, dictionary: SensorDictionary) -> dict:
+    """Inverse of ``encode_columnar``, for tooling and benchmarks"""
+    magic, frame_type, n_metrics, _, seq, _, frame_time, count = COLUMNAR_HEADER.unpack_from(frame)
+    if magic != COLUMNAR_MAGIC:
+        raise ValueError("Not a columnar frame")
+    offset = COLUMNAR_HEADER.size
+    indices = np.frombuffer(frame, dtype="<u4", count=count, offset=offset)
+    offset += 4 * count
+    times = np.frombuffer(frame, dtype="<i4", count=count, offset=offset)
+    offset += 4 * count
+    values = np.frombuffer(frame, dtype="<f4", count=count * n_metrics, offset=offset).reshape(n_metrics, count)
+    data = {}
+    for column, index in enumerate(indices.tolist()):
+        reading = {metric: float(values[row, column]) for row, metric in enumerate(METRICS[:n_metrics])
+                   if values[row, column] == values[row, column]}
+        if times[column] != NO_TIMESTAMP:
+            reading["timestamp"] = frame_time + int(times[column]) / 1000
+        data[dictionary.ids[index]] = reading
+    return {"type": _COLUMNAR_TYPE_NAMES[frame_type], "seq": seq, "timestamp": frame_time, "data": data}
+
+def encode_sensor_frame(message: dict, data: Dict[str, dict], encoding: str,
+                        dictionary: SensorDictionary) -> Frame:
+    """Encode a message whose ``data`` maps sensor ids to readings"""
+    if encoding == COLUMNAR:
+        return encode_columnar(message, data, dictionary)
+    return encode_message({**message, "data": data}, encoding)
+
+class FrameCompressor:
+    """zlib-compresses outgoing frames once so every subscriber can share the bytes.
+
+    WebSocket permessage-deflate keeps a compression context per connection, so
+    the same broadcast is compressed once per socket. Frames compressed here
+    are sent as binary messages (zlib stream, first byte 0x78) and reused for
+    every client with the same encoding. Frames under ``min_size`` bytes are
+    sent unchanged.
+    """
+
+    def __init__(self, level: int = 6, min_size: int = 512):
+        self.level = level
+        self.min_size = min_size
+        self.frames = 0
+        self.skipped = 0
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+        self.seconds = 0.0
+        self.sends = 0
+        self.bytes_saved = 0
+
+    def compress(self, frame: Frame) -> Tuple[Frame, int]:
+        """Returns the frame to send and the bytes each send of it saves"""
+        raw = frame.encode() if isinstance(frame, str) else frame
+        if len(raw) < self.min_size:
+            self.skipped += 1
+            return frame, 0
+        started = time.perf_counter()
+        compressed = zlib.compress(raw, self.level)
+        self.seconds += time.perf_counter() - started
+        if len(compressed) >= len(raw):
+            self.skipped += 1
+            return frame, 0
+        self.frames += 1
+        self.raw_bytes += len(raw)
+        self.compressed_bytes += len(compressed)
+        return compressed, len(raw) - len(compressed)
+
+    def record_send(self, saved: int):
+        self.sends += 1
+        self.bytes_saved += saved
+
+    def get_stats(self) -> dict:
+        """Report compression ratio, time and bytes saved across all sends"""
+        return {
+            "level": self.level,
+            "min_size": self.min_size,
+            "frames_compressed": self.frames,
+            "frames_skipped": self.skipped,
+            "ratio": round(self.compressed_bytes / self.raw_bytes, 3) if self.raw_bytes else None,
+            "compress_ms_total": round(self.seconds * 1000, 3),
+            "compressed_sends": self.sends,
+            "bytes_saved": self.bytes_saved
+        }
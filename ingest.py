@@ -0,0 +1,215 @@
+import asyncio
+import threading
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Overflow policies for the ingest queue
+DROP_OLDEST = "drop_oldest"
+COALESCE = "coalesce"
+BLOCK = "block"
+OVERFLOW_POLICIES = (DROP_OLDEST, COALESCE, BLOCK)
+
+class IngestBridge:
+    """Hands sensor payloads from the paho network thread to the asyncio event loop.
+
+    ``submit`` is safe to call from any thread. Payloads are held in a bounded
+    queue and drained on the event loop by ``run``, which calls the handler for
+    each payload. An optional ``batch_transform`` sees each drained batch first,
+    so per-batch work (e.g. AQI computation) can run vectorized. When the queue is full the overflow policy decides what happens:
+
+    - ``drop_oldest``: discard the oldest queued payload to make room
+    - ``coalesce``: keep at most one pending payload per sensor and topic
+      (newest wins), dropping the oldest one when the queue is full; payloads
+      from a sensor's other topics carry other fields, so they are kept
+    - ``block``: block the producer thread until there is room (or ``block_timeout``)
+    """
+
+    def __init__(self, handler: Callable, max_size: int = 10000,
+                 policy: str = DROP_OLDEST, batch_size: int = 500,
+                 block_timeout: Optional[float] = 5.0,
+                 batch_transform: Optional[Callable[[list], list]] = None):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {policy}")
+        if max_size <= 0:
+            raise ValueError("max_size must be positive")
+
+        self.handler = handler
+        self.max_size = max_size
+        self.policy = policy
+        self.batch_size = batch_size
+        self.block_timeout = block_timeout
+        self.batch_transform = batch_transform
+
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self._queue: deque = deque()
+        self._pending: "OrderedDict[Tuple[Optional[str], Optional[str]], dict]" = OrderedDict()
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._wakeup_scheduled = False
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.processed = 0
+        self.errors = 0
+
+    def _depth(self) -> int:
+        return len(self._pending) if self.policy == COALESCE else len(self._queue)
+
+    @property
+    def depth(self) -> int:
+        """Current number of payloads waiting to be processed"""
+        with self._lock:
+            return self._depth()
+
+    def submit(self, payload: dict) -> bool:
+        """Queue a payload for the event loop. Returns False if it was dropped."""
+        with self._lock:
+            queued = self._enqueue(payload)
+            if queued:
+                self._schedule_wakeup()
+            return queued
+
+    def submit_many(self, payloads: List[dict]) -> int:
+        """Queue a batch of payloads under one lock acquisition. Returns how many were queued."""
+        with self._lock:
+            queued = 0
+            for payload in payloads:
+                queued += self._enqueue(payload)
+            if queued:
+                self._schedule_wakeup()
+            return queued
+
+    def _enqueue(self, payload: dict) -> bool:
+        """Apply the overflow policy and queue one payload; called with the lock held"""
+        if self.policy == COALESCE:
+            key = (payload.get("sensor_id"), payload.get("topic"))
+            if key in self._pending:
+                self._pending[key] = payload
+                self.coalesced += 1
+                self.enqueued += 1
+                return True
+            if len(self._pending) >= self.max_size:
+                self._pending.popitem(last=False)
+                self.dropped += 1
+            self._pending[key] = payload
+        else:
+            if len(self._queue) >= self.max_size:
+                if self.policy == BLOCK:
+                    # Earlier payloads of a batch may not have woken the consumer yet
+                    self._schedule_wakeup()
+                    if not self._not_full.wait_for(
+                        lambda: len(self._queue) < self.max_size or not self._running,
+                        timeout=self.block_timeout
+                    ) or len(self._queue) >= self.max_size:
+                        self.dropped += 1
+                        return False
+                else:
+                    self._queue.popleft()
+                    self.dropped += 1
+            self._queue.append(payload)
+
+        self.enqueued += 1
+        return True
+
+    def _schedule_wakeup(self):
+        """Wake the consumer; called with the lock held"""
+        if self._loop is None or self._wakeup_scheduled:
+            return
+        self._wakeup_scheduled = True
+        try:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:
+            # Event loop already closed
+            self._wakeup_scheduled = False
+
+    def _take_batch(self) -> list:
+        with self._lock:
+            self._wakeup_scheduled = False
+            if self.policy == COALESCE:
+                batch = []
+                while self._pending and len(batch) < self.batch_size:
+                    batch.append(self._pending.popitem(last=False)[1])
+            else:
+                count = min(self.batch_size, len(self._queue))
+                batch = [self._queue.popleft() for _ in range(count)]
+            if batch:
+                self._not_full.notify_all()
+            return batch
+
+    async def run(self):
+        """Drain the queue on the event loop until stopped"""
+        while self._running:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            await self.drain()
+
+    async def drain(self):
+        """Process everything currently queued"""
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            if self.batch_transform:
+                try:
+                    batch = self.batch_transform(batch)
+                except Exception as e:
+                    self.errors += 1
+                    logger.error(f"❌ Error transforming ingest batch: {e}")
+            for payload in batch:
+                try:
+                    result = self.handler(payload)
+                    if asyncio.iscoroutine(result):
+                        await result
+                    self.processed += 1
+                except Exception as e:
+                    self.errors += 1
+                    logger.error(f"❌ Error handling ingested payload: {e}")
+            # Let other tasks run between batches
+            await asyncio.sleep(0)
+
+    def start(self):
+        """Bind to the running event loop and start the consumer task"""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._running = True
+        with self._lock:
+            if self._depth():
+                self._wakeup.set()
+        self._task = asyncio.create_task(self.run())
+        logger.info(f"📥 Ingest bridge started (max_size={self.max_size}, policy={self.policy})")
+
+    async def stop(self):
+        """Stop the consumer after processing anything already queued"""
+        self._running = False
+        with self._lock:
+            self._not_full.notify_all()
+        if self._task:
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.drain()
+        self._loop = None
+        logger.info("🛑 Ingest bridge stopped")
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get ingest counters and current queue depth"""
+        with self._lock:
+            depth = self._depth()
+        return {
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "processed": self.processed,
+            "errors": self.errors,
+            "queue_depth": depth,
+            "max_size": self.max_size,
+            "policy": self.policy
+        }
@@ -0,0 +1,124 @@
+import asyncio
+import heapq
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from models import SensorStatus
+
+class LivenessTracker:
+    """Tracks last-seen times and flags sensors that stop reporting.
+
+    ``touch`` is O(1): it only records the arrival time. A min-heap holds at
+    most one deadline per online sensor; when the earliest deadline passes the
+    entry is re-checked against the sensor's real last-seen time and either
+    pushed back (the sensor reported since) or turned into an offline
+    transition. Nothing ever scans all sensors, and the background task sleeps
+    until the next deadline.
+
+    ``on_transition(sensor_id, status, last_seen)`` is called on every
+    offline/online change, including a sensor's first report.
+    """
+
+    def __init__(self, offline_after: float = 60.0,
+                 on_transition: Optional[Callable[[str, SensorStatus, datetime], None]] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.offline_after = offline_after
+        self.on_transition = on_transition
+        self.clock = clock
+
+        self._last_seen: Dict[str, float] = {}
+        self._last_seen_at: Dict[str, datetime] = {}
+        self._offline: set = set()
+        self._scheduled: set = set()
+        self._heap: List[Tuple[float, str]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.transitions = 0
+
+    def touch(self, sensor_id: str):
+        """Record that a sensor just reported"""
+        now = self.clock()
+        first_report = sensor_id not in self._last_seen
+        self._last_seen[sensor_id] = now
+        self._last_seen_at[sensor_id] = datetime.now()
+        if sensor_id not in self._scheduled:
+            self._schedule(sensor_id, now + self.offline_after)
+        if sensor_id in self._offline:
+            self._offline.discard(sensor_id)
+            self._notify(sensor_id, SensorStatus.ONLINE)
+        elif first_report:
+            self._notify(sensor_id, SensorStatus.ONLINE)
+
+    def _schedule(self, sensor_id: str, deadline: float):
+        earliest = self._heap[0][0] if self._heap else None
+        heapq.heappush(self._heap, (deadline, sensor_id))
+        self._scheduled.add(sensor_id)
+        if self._wakeup is not None and (earliest is None or deadline < earliest):
+            self._wakeup.set()
+
+    def _notify(self, sensor_id: str, status: SensorStatus):
+        self.transitions += 1
+        if self.on_transition:
+            self.on_transition(sensor_id, status, self._last_seen_at.get(sensor_id))
+
+    def expire(self, now: Optional[float] = None) -> Optional[float]:
+        """Process due deadlines; returns the next deadline, if any"""
+        now = self.clock() if now is None else now
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            _, sensor_id = heapq.heappop(heap)
+            deadline = self._last_seen[sensor_id] + self.offline_after
+            if deadline > now:
+                # Reported since this entry was pushed; check again later
+                heapq.heappush(heap, (deadline, sensor_id))
+                continue
+            self._scheduled.discard(sensor_id)
+            self._offline.add(sensor_id)
+            self._notify(sensor_id, SensorStatus.OFFLINE)
+        return heap[0][0] if heap else None
+
+    async def run(self):
+        """Sleep until the next deadline, fire transitions, repeat"""
+        while True:
+            next_deadline = self.expire()
+            self._wakeup.clear()
+            timeout = None if next_deadline is None else max(0.0, next_deadline - self.clock())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def status(self, sensor_id: str) -> SensorStatus:
+        """Current status; sensors never seen count as offline"""
+        if sensor_id not in self._last_seen or sensor_id in self._offline:
+            return SensorStatus.OFFLINE
+        return SensorStatus.ONLINE
+
+    def last_seen(self, sensor_id: str) -> Optional[datetime]:
+        return self._last_seen_at.get(sensor_id)
+
+    def get_stats(self) -> dict:
+        """Report tracked, online and offline sensor counts"""
+        return {
+            "tracked": len(self._last_seen),
+            "online": len(self._last_seen) - len(self._offline),
+            "offline": len(self._offline),
+            "offline_after_seconds": self.offline_after,
+            "pending_deadlines": len(self._heap),
+            "transitions": self.transitions
+        }
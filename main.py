@@ -1,42 +1,269 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Depends
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Depends, Request, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from contextlib import asynccontextmanager
+from collections import OrderedDict
 import json
 import asyncio
 from datetime import datetime, timedelta
 import os
+import socket
+import uuid
 from typing import List, Dict, Optional
 from pydantic import BaseModel
 import uvicorn
+import numpy as np
 
 # Import our modules
-from database import get_supabase_client
-from models import AirQualityData, SensorData, User, Alert
-from mqtt_client import MQTTClient
+from database import get_supabase_client, air_quality_row, get_historical_air_quality, get_sensor_metadata, get_air_quality_page, get_rollups
+from models import AirQualityData, SensorData, User, Alert, AlertType, AlertSeverity, SensorStatus
+from mqtt_client import MQTTIngestPool
 from websocket_manager import ConnectionManager
+from ingest import IngestBridge
+from persistence import WriteBehindBuffer
+from timeseries import TimeSeriesStore, to_records, to_epoch
+from aggregation import parse_resolution, arrays_from_records, aggregate_records, lttb, AGGREGATES
+from aqi import fill_missing_aqi
+from alerts import AlertEngine, alert_row
+from liveness import LivenessTracker
+from registry import SensorRegistry, parse_near
+from snapshot import SnapshotCache, dumps, negotiate_encoding
+from rollups import RollupStore, aggregate_rollups, rollup_arrays, ROLLUP_AGGREGATES
+from backplane import create_backplane, READINGS, ALERT_RULES, REPLAYED
+from assembler import RecordAssembler
+from analytics import AnalyticsEngine, AnalyticsCache, default_bucket
+from export import Export, HistorySource, DatabaseSource, MEDIA_TYPES, parse_cursor
+from forecast import ForecastModel, ForecastCache
+from synthetic import SyntheticFleet, SyntheticLoadGenerator
 
-# Helper function to update sensor data
-def update_sensor_data(data):
-    """Update sensor data and broadcast to WebSocket clients"""
+# Helper functions to ingest and apply sensor data
+def ingest_reading(data):
+    """Publish a reading this worker ingested to every worker (runs on the event loop)"""
+    backplane.publish(READINGS, data)
+
+def update_sensor_data(data, persist: bool = True):
+    """Update sensor data and broadcast to this worker's WebSocket clients.
+
+    Every worker runs this for every merged reading, whichever worker
+    ingested its fragments; the leader persists it. Readings replayed from
+    an archive (``persist=False``) are already in the database; they skip
+    persistence and the rollups, whose closed buckets are persisted too.
+    """
     sensor_data[data['sensor_id']] = data
-    asyncio.create_task(websocket_manager.broadcast_sensor_data(sensor_data))
+    analytics_cache.mark_changed()
+    if persist and persistence_buffer and backplane.is_leader:
+        persistence_buffer.add(data)
+    latest_snapshot.mark_changed()
+    liveness_tracker.touch(data['sensor_id'])
+    history_store.add(data)
+    if persist:
+        rollup_store.add(data)
+    forecast_model.add(data)
+    websocket_manager.queue_sensor_update(data['sensor_id'], data)
+    for alert in alert_engine.evaluate(data):
+        publish_alert(alert)
+
+def apply_replayed_reading(data):
+    """A whole reading published by replay.py, persisted only if marked ``persist``.
+
+    Replayed readings skip the assembler, which would merge readings
+    arriving faster than its window.
+    """
+    persist = bool(data.get("persist"))
+    update_sensor_data({key: value for key, value in data.items() if key != "persist"}, persist=persist)
+
+def latest_payload():
+    """Body of /api/data/latest"""
+    if not sensor_data:
+        # Return mock data if no real data
+        return {
+            "sensors": {
+                "sensor_001": {
+                    "pm25": 15.2,
+                    "pm10": 28.5,
+                    "co2": 420,
+                    "temperature": 22.5,
+                    "humidity": 65.0,
+                    "aqi": 45,
+                    "timestamp": datetime.now().isoformat(),
+                    "location": "Downtown Station"
+                },
+                "sensor_002": {
+                    "pm25": 12.8,
+                    "pm10": 24.1,
+                    "co2": 410,
+                    "temperature": 21.8,
+                    "humidity": 68.0,
+                    "aqi": 38,
+                    "timestamp": datetime.now().isoformat(),
+                    "location": "Suburban Station"
+                }
+            }
+        }
+    return {"sensors": sensor_data}
+
+def publish_alert(alert):
+    """Broadcast a fired or resolved alert and persist it.
+
+    Every worker raises the same alerts from the same readings; only the
+    leader persists them. A resolution is upserted over the row written
+    when the alert fired.
+    """
+    asyncio.create_task(websocket_manager.broadcast_alert(alert))
+    if alert_buffer and backplane.is_leader:
+        alert_buffer.add(alert)
+
+def persist_rollup(row):
+    """Closed rollup buckets are identical on every worker; the leader persists them"""
+    if backplane.is_leader:
+        rollup_buffer.add(row)
+
+def rule_added(rule) -> dict:
+    """Backplane message that recreates a rule on another worker"""
+    return {"op": "add", "rule_id": rule.id, **rule.to_dict()}
+
+def add_mirrored_rule(change):
+    options = {key: change[key] for key in ("direction", "hysteresis", "debounce_seconds")}
+    if change.get("severity"):
+        options["severity"] = AlertSeverity(change["severity"])
+    alert_engine.add_rule(change["sensor_id"], AlertType(change["alert_type"]), change["threshold"],
+                          rule_id=change["rule_id"], **options)
+
+def remove_alert_rule(rule_id: str):
+    """Remove a rule, resolving the alerts it had active; returns the rule or None"""
+    rule, resolved = alert_engine.remove_rule(rule_id)
+    for alert in resolved:
+        publish_alert(alert)
+    return rule
+
+def apply_alert_rule_change(change):
+    """Mirror alert rules across workers.
+
+    Rules travel as ``add``/``remove`` deltas, which only reach workers that
+    are already running, so a worker that joins later sends ``sync`` and the
+    leader answers it with a ``snapshot`` of every rule.
+    """
+    op = change["op"]
+    if op == "add":
+        add_mirrored_rule(change)
+    elif op == "remove":
+        remove_alert_rule(change["rule_id"])
+    elif op == "sync":
+        if backplane.is_leader:
+            rules = [rule_added(rule) for rule in alert_engine.rules.values()]
+            backplane.publish(ALERT_RULES, {"op": "snapshot", "to": change["from"], "rules": rules}, local=False)
+    elif op == "snapshot" and change["to"] == WORKER_ID:
+        # Deltas the leader relayed before answering are part of the snapshot
+        current = {rule["rule_id"] for rule in change["rules"]}
+        for rule_id in [rule_id for rule_id in alert_engine.rules if rule_id not in current]:
+            remove_alert_rule(rule_id)
+        for rule in change["rules"]:
+            if rule["rule_id"] not in alert_engine.rules:
+                add_mirrored_rule(rule)
+        alert_rules_synced.set()
+
+async def sync_alert_rules(timeout: float = 5.0):
+    """Fetch every alert rule from the leader before a joining worker serves requests"""
+    alert_rules_synced.clear()
+    backplane.publish(ALERT_RULES, {"op": "sync", "from": WORKER_ID}, local=False)
+    try:
+        await asyncio.wait_for(alert_rules_synced.wait(), timeout)
+        print(f"🔔 Synced {len(alert_engine.rules)} alert rules from the backplane leader")
+    except asyncio.TimeoutError:
+        print(f"⚠️ No alert rule snapshot from the backplane leader within {timeout:g}s")
+
+async def start_ingest():
+    """Start ingestion; runs on the backplane leader, or on every worker with a shared MQTT group"""
+    global ingest_source
+    if ingest_source is not None:
+        return
+    if INGEST_SOURCE != "synthetic":
+        await mqtt_client.connect()
+        if mqtt_client.connected:
+            ingest_source = "mqtt"
+            print("AirSense API started")
+            return
+        # connect() reports failures rather than raising
+        await mqtt_client.disconnect()
+        if not backplane.is_leader:
+            print(f"⚠️ MQTT broker unavailable; worker {os.getpid()} leaves simulation to the leader")
+            return
+        print("⚠️ MQTT broker unavailable, using simulated sensors")
+    ingest_source = "synthetic"
+    register_simulated_sensors()
+    load_generator.start()
+    print(f"AirSense API started with {synthetic_fleet.count:,} simulated sensors")
+
+async def stop_ingest():
+    if ingest_source == "mqtt":
+        try:
+            await mqtt_client.disconnect()
+        except:
+            pass
+    elif ingest_source == "synthetic":
+        await load_generator.stop()
+
+def register_simulated_sensors():
+    """Add simulated sensors the registry doesn't know, so they show up in queries and subscriptions"""
+    for row in synthetic_fleet.metadata():
+        if row["id"] not in sensor_registry:
+            sensor_registry.upsert(row)
+
+def on_liveness_transition(sensor_id, status, last_seen):
+    """Turn liveness transitions into registry status changes and SENSOR_OFFLINE alerts"""
+    sensor_registry.set_status(sensor_id, status, last_seen)
+    if status == SensorStatus.OFFLINE:
+        print(f"📴 Sensor {sensor_id} went offline")
+        publish_alert(alert_engine.sensor_offline(sensor_id, last_seen))
+    else:
+        alert = alert_engine.sensor_online(sensor_id)
+        if alert:
+            print(f"📶 Sensor {sensor_id} is back online")
+            publish_alert(alert)
 
 # Lifespan context manager
 @asynccontextmanager
 async def lifespan(app: FastAPI):
         # Startup
-        try:
-            await mqtt_client.connect()
-            print("AirSense API started")
-        except:
-            print("Using mock data generator")
-            await mock_generator.start()
+        rows = await asyncio.to_thread(get_sensor_metadata)
+        if rows:
+            sensor_registry.load(rows, source="database")
+        for sensor_id in sensor_registry.ids():
+            sensor_registry.set_status(sensor_id, liveness_tracker.status(sensor_id),
+                                       liveness_tracker.last_seen(sensor_id))
+        await backplane.start()
+        if not backplane.is_leader:
+            await sync_alert_rules()
+        ingest_bridge.start()
+        liveness_tracker.start()
+        if persistence_buffer:
+            await persistence_buffer.start()
+        if rollup_buffer:
+            await rollup_buffer.start()
+        if alert_buffer:
+            await alert_buffer.start()
+        websocket_manager.start_broadcast_ticker(lambda: sensor_data)
+        if INGEST_SOURCE == "synthetic":
+            register_simulated_sensors()
+        if backplane.is_leader or MQTT_SHARED_GROUP:
+            await start_ingest()
+        else:
+            print(f"AirSense API worker {os.getpid()} started (following the backplane leader)")
         yield
         # Shutdown
-        try:
-            await mqtt_client.disconnect()
-        except:
-            mock_generator.stop()
+        await stop_ingest()
+        await ingest_bridge.stop()
+        sensor_assembler.flush()
+        await websocket_manager.stop_broadcast_ticker()
+        await liveness_tracker.stop()
+        if persistence_buffer:
+            await persistence_buffer.stop()
+        rollup_store.flush_open()
+        if rollup_buffer:
+            await rollup_buffer.stop()
+        if alert_buffer:
+            await alert_buffer.stop()
+        await backplane.stop()
         print("AirSense API shutdown")
 
 # Initialize FastAPI app
@@ -56,13 +283,159 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Known sensor stations, used when the sensors table is empty or unreachable
+SENSORS = [
+    {
+        "id": "sensor_001",
+        "name": "Downtown Station",
+        "location": "Toronto, ON",
+        "coordinates": [43.6532, -79.3832],
+        "status": "online"
+    },
+    {
+        "id": "sensor_002", 
+        "name": "Suburban Station",
+        "location": "Mississauga, ON",
+        "coordinates": [43.5890, -79.6441],
+        "status": "online"
+    },
+    {
+        "id": "sensor_003",
+        "name": "Industrial Zone",
+        "location": "Hamilton, ON", 
+        "coordinates": [43.2557, -79.8711],
+        "status": "online"
+    }
+]
+
+# Sensor metadata with a spatial index; replaced from the sensors table at startup
+sensor_registry = SensorRegistry()
+sensor_registry.load(SENSORS, source="catalog")
+# Serialized /api/sensors responses by ETag, most recently used last
+sensor_page_bodies: "OrderedDict[str, bytes]" = OrderedDict()
+SENSOR_PAGE_CACHE_SIZE = 64
+
 # Initialize components
-websocket_manager = ConnectionManager()
-mqtt_client = MQTTClient()
 
-# Mock data generator for development
-from mqtt_client import MockMQTTDataGenerator
-mock_generator = MockMQTTDataGenerator(lambda data: update_sensor_data(data))
+# Workers share readings and alert rules over a pub/sub backplane; with more
+# than one worker it runs over a local Unix socket and the leader ingests
+WORKERS = int(os.getenv("WORKERS", "1"))
+backplane = create_backplane(
+    os.getenv("BACKPLANE", "socket" if WORKERS > 1 else "inprocess"),
+    os.getenv("BACKPLANE_SOCKET", "/tmp/airsense-backplane.sock"),
+    on_promoted=lambda: start_ingest()
+)
+# Per-topic fragments (air_quality, temperature, humidity, status) are merged
+# per sensor and applied once per ASSEMBLY_WINDOW
+sensor_assembler = RecordAssembler(
+    update_sensor_data,
+    window=float(os.getenv("ASSEMBLY_WINDOW", "0.25")),
+    stale_after=float(os.getenv("FIELD_STALE_AFTER", "600"))
+)
+backplane.subscribe(READINGS, sensor_assembler.add)
+backplane.subscribe(REPLAYED, apply_replayed_reading)
+backplane.subscribe(ALERT_RULES, apply_alert_rule_change)
+# Addresses this worker's alert rule snapshot on the backplane
+WORKER_ID = uuid.uuid4().hex
+alert_rules_synced = asyncio.Event()
+ingest_source = None
+
+websocket_manager = ConnectionManager(
+    broadcast_interval=float(os.getenv("BROADCAST_INTERVAL", "5")),
+    max_queue=int(os.getenv("WS_MAX_QUEUE", "256")),
+    slow_consumer_policy=os.getenv("WS_SLOW_CONSUMER_POLICY", "conflate"),
+    lag_threshold=int(os.getenv("WS_LAG_THRESHOLD")) if os.getenv("WS_LAG_THRESHOLD") else None,
+    delta_window=float(os.getenv("DELTA_WINDOW", "0.25")),
+    coordinates_for=sensor_registry.coordinates_for,
+    compression_level=int(os.getenv("WS_COMPRESSION_LEVEL", "6")),
+    compression_min_size=int(os.getenv("WS_COMPRESSION_MIN_SIZE", "512"))
+)
+sensor_registry.on_change = websocket_manager.subscriptions.invalidate
+# MQTT_SHARDS clients per worker share the sensor topics through an MQTT
+# shared subscription; with a group every worker ingests its share directly
+MQTT_SHARDS = int(os.getenv("MQTT_SHARDS", "1"))
+MQTT_SHARED_GROUP = os.getenv("MQTT_SHARED_GROUP") or ("airsense" if MQTT_SHARDS > 1 else None)
+mqtt_client = MQTTIngestPool(
+    shards=MQTT_SHARDS,
+    broker_host=os.getenv("MQTT_BROKER_HOST", "localhost"),
+    broker_port=int(os.getenv("MQTT_BROKER_PORT", "1883")),
+    shared_group=MQTT_SHARED_GROUP,
+    client_id_prefix=f"airsense-{socket.gethostname()}-{os.getpid()}" if MQTT_SHARED_GROUP else "",
+    decode_batch=int(os.getenv("MQTT_DECODE_BATCH", "256")),
+    decode_max_delay=float(os.getenv("MQTT_DECODE_MAX_DELAY", "0.02"))
+)
+
+# MQTT messages arrive on paho's network thread; the ingest bridge hands them
+# to the event loop through a bounded queue
+ingest_bridge = IngestBridge(
+    ingest_reading,
+    max_size=int(os.getenv("INGEST_QUEUE_SIZE", "10000")),
+    policy=os.getenv("INGEST_OVERFLOW_POLICY", "drop_oldest"),
+    batch_transform=fill_missing_aqi
+)
+mqtt_client.set_data_callback(ingest_bridge.submit, batch_callback=ingest_bridge.submit_many)
+
+# Recent readings per sensor for historical queries
+history_store = TimeSeriesStore(capacity=int(os.getenv("HISTORY_CAPACITY", "8640")))
+
+# Readings are persisted in bulk off the event loop
+persistence_buffer = None
+if os.getenv("PERSIST_READINGS", "true").lower() == "true":
+    persistence_buffer = WriteBehindBuffer(
+        get_supabase_client,
+        table="air_quality_data",
+        batch_size=int(os.getenv("PERSIST_BATCH_SIZE", "500")),
+        flush_interval=float(os.getenv("PERSIST_FLUSH_INTERVAL", "2")),
+        spool_path=os.getenv("PERSIST_SPOOL_PATH", "spool/air_quality_data.ndjson"),
+        row_builder=air_quality_row
+    )
+
+# 1m/1h/1d rollups maintained at ingest; closed buckets are persisted next to
+# air_quality_data (upserted, since buckets still open at shutdown are flushed early)
+rollup_buffer = None
+if persistence_buffer:
+    rollup_buffer = WriteBehindBuffer(
+        get_supabase_client,
+        table="air_quality_rollups",
+        batch_size=int(os.getenv("PERSIST_BATCH_SIZE", "500")),
+        flush_interval=float(os.getenv("PERSIST_FLUSH_INTERVAL", "2")),
+        spool_path=os.getenv("ROLLUP_SPOOL_PATH", "spool/air_quality_rollups.ndjson"),
+        upsert=True
+    )
+rollup_store = RollupStore(on_close=persist_rollup if rollup_buffer else None)
+
+# Threshold alert rules, evaluated on every reading; alerts are persisted in batches and
+# updated in place when they resolve
+alert_engine = AlertEngine(id_prefix=f"rule_{os.getpid()}_" if WORKERS > 1 else "rule_")
+alert_buffer = None
+if persistence_buffer:
+    alert_buffer = WriteBehindBuffer(
+        get_supabase_client,
+        table="alerts",
+        batch_size=100,
+        flush_interval=float(os.getenv("PERSIST_FLUSH_INTERVAL", "2")),
+        spool_path=os.getenv("ALERT_SPOOL_PATH", "spool/alerts.ndjson"),
+        row_builder=alert_row,
+        upsert=True,
+        key="alert_id"
+    )
+
+# Sensors that stop reporting go offline after SENSOR_OFFLINE_AFTER seconds
+liveness_tracker = LivenessTracker(
+    offline_after=float(os.getenv("SENSOR_OFFLINE_AFTER", "60")),
+    on_transition=on_liveness_transition
+)
+
+# Simulated sensors stand in for MQTT with INGEST_SOURCE=synthetic, or when the
+# broker is unreachable; their readings go through the ingest bridge like MQTT's
+INGEST_SOURCE = os.getenv("INGEST_SOURCE", "mqtt")
+synthetic_fleet = SyntheticFleet(
+    int(os.getenv("SIMULATED_SENSORS", "3")),
+    interval=float(os.getenv("SIMULATED_INTERVAL", "10")),
+    seed=int(os.getenv("SIMULATED_SEED")) if os.getenv("SIMULATED_SEED") else None,
+    incident_rate=float(os.getenv("SIMULATED_INCIDENT_RATE", "0.01"))
+)
+load_generator = SyntheticLoadGenerator(synthetic_fleet, ingest_bridge.submit_many)
 
 # Data models
 class AirQualityResponse(BaseModel):
@@ -76,13 +449,31 @@ class AirQualityResponse(BaseModel):
     aqi: int
 
 class AlertRequest(BaseModel):
-    sensor_id: str
+    sensor_id: str  # "*" applies the rule to every sensor
     threshold: float
     alert_type: str
+    direction: str = "above"
+    hysteresis: float = 0.0
+    debounce_seconds: float = 0.0
+    severity: Optional[AlertSeverity] = None
 
 # Store active connections and sensor data
 active_connections: List[WebSocket] = []
 sensor_data: Dict[str, AirQualityResponse] = {}
+# Serialized /api/data/latest, rebuilt on the first request after a reading arrives
+latest_snapshot = SnapshotCache(latest_payload)
+
+# Fleet analytics over history and rollups, cached per (range, bucket)
+analytics_engine = AnalyticsEngine(history_store, rollup_store)
+analytics_cache = AnalyticsCache(
+    analytics_engine.compute_async,
+    refresh_interval=float(os.getenv("ANALYTICS_REFRESH_INTERVAL", "15"))
+)
+
+# Online per-sensor forecasting models, updated with every merged reading
+forecast_model = ForecastModel(step=int(os.getenv("FORECAST_STEP", "300")))
+forecast_cache = ForecastCache(forecast_model)
+FORECAST_MAX_HORIZON = parse_resolution(os.getenv("FORECAST_MAX_HORIZON", "24h"))
 
 # Event handlers moved to lifespan context manager above
 
@@ -103,141 +494,342 @@ async def health_check():
         "version": "1.0.0",
         "uptime": "running",
         "sensors_connected": len(sensor_data),
-        "active_connections": len(active_connections)
+        "active_connections": websocket_manager.get_connection_count(),
+        "ingest": ingest_bridge.get_stats(),
+        "mqtt": mqtt_client.get_stats(),
+        "generator": load_generator.get_stats() if ingest_source == "synthetic" else None,
+        "assembler": sensor_assembler.get_stats(),
+        "broadcast": websocket_manager.get_broadcast_stats(),
+        "fanout": websocket_manager.get_fanout_stats(),
+        "persistence": persistence_buffer.get_stats() if persistence_buffer else None,
+        "history": history_store.get_stats(),
+        "rollups": rollup_store.get_stats(),
+        "alerts": alert_engine.get_stats(),
+        "liveness": liveness_tracker.get_stats(),
+        "registry": sensor_registry.get_stats(),
+        "latest_snapshot": latest_snapshot.get_stats(),
+        "analytics": analytics_cache.get_stats(),
+        "forecast": {**forecast_model.get_stats(), "cache": forecast_cache.get_stats()},
+        "backplane": backplane.get_stats()
     }
 
 @app.get("/api/sensors")
-async def get_sensors():
-    """Get all available sensors"""
-    return {
-        "sensors": [
-            {
-                "id": "sensor_001",
-                "name": "Downtown Station",
-                "location": "Toronto, ON",
-                "coordinates": [43.6532, -79.3832],
-                "status": "online"
-            },
-            {
-                "id": "sensor_002", 
-                "name": "Suburban Station",
-                "location": "Mississauga, ON",
-                "coordinates": [43.5890, -79.6441],
-                "status": "online"
-            },
-            {
-                "id": "sensor_003",
-                "name": "Industrial Zone",
-                "location": "Hamilton, ON", 
-                "coordinates": [43.2557, -79.8711],
-                "status": "offline"
-            }
-        ]
-    }
+async def get_sensors(request: Request, bbox: Optional[str] = None,
+                      near: Optional[str] = None, radius_km: float = 25.0,
+                      offset: int = 0, limit: Optional[int] = None):
+    """Get sensors, optionally within a bbox ('min_lat,min_lon,max_lat,max_lon') or
+    radius_km of a 'lat,lon' point, paged with offset/limit.
+
+    Responses carry an ETag; a matching If-None-Match gets 304 Not Modified.
+    """
+    try:
+        box = [float(v) for v in bbox.split(",")] if bbox else None
+        point = parse_near(near) if near else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if offset < 0 or (limit is not None and limit < 1) or radius_km <= 0:
+        raise HTTPException(status_code=400, detail="offset must be >= 0, limit and radius_km > 0")
+    try:
+        sensors, total, etag = sensor_registry.query(bbox=box, near=point, radius_km=radius_km,
+                                                     offset=offset, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # no-cache: browsers keep the body but revalidate it with If-None-Match
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")) or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    # The ETag hashes the query and the returned sensors' content, so it identifies the body
+    body = sensor_page_bodies.get(etag)
+    if body is None:
+        next_offset = offset + len(sensors)
+        body = dumps({
+            "sensors": sensors,
+            "total": total,
+            "offset": offset,
+            "next_offset": next_offset if next_offset < total else None
+        })
+        sensor_page_bodies[etag] = body
+        while len(sensor_page_bodies) > SENSOR_PAGE_CACHE_SIZE:
+            sensor_page_bodies.popitem(last=False)
+    else:
+        sensor_page_bodies.move_to_end(etag)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @app.get("/api/data/latest")
-async def get_latest_data():
-    """Get latest air quality data from all sensors"""
-    if not sensor_data:
-        # Return mock data if no real data
-        return {
-            "sensors": {
-                "sensor_001": {
-                    "pm25": 15.2,
-                    "pm10": 28.5,
-                    "co2": 420,
-                    "temperature": 22.5,
-                    "humidity": 65.0,
-                    "aqi": 45,
-                    "timestamp": datetime.now().isoformat(),
-                    "location": "Downtown Station"
-                },
-                "sensor_002": {
-                    "pm25": 12.8,
-                    "pm10": 24.1,
-                    "co2": 410,
-                    "temperature": 21.8,
-                    "humidity": 68.0,
-                    "aqi": 38,
-                    "timestamp": datetime.now().isoformat(),
-                    "location": "Suburban Station"
-                }
-            }
-        }
-    return {"sensors": sensor_data}
+async def get_latest_data(request: Request):
+    """Get latest air quality data from all sensors.
+
+    Served from a pre-serialized snapshot (rebuilt only after new readings) with
+    ETag/Last-Modified; unchanged polls get 304 and gzip/br variants are cached.
+    """
+    snapshot = latest_snapshot.get()
+    headers = {
+        "ETag": snapshot.etag,
+        "Last-Modified": snapshot.last_modified,
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding"
+    }
+    if snapshot.not_modified(request.headers.get("if-none-match"), request.headers.get("if-modified-since")):
+        latest_snapshot.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=snapshot.encoded(encoding), media_type="application/json", headers=headers)
 
 @app.get("/api/data/historical")
-async def get_historical_data(sensor_id: str, hours: int = 24):
-    """Get historical air quality data"""
-    # Mock historical data
-    now = datetime.now()
-    historical_data = []
-    
-    for i in range(hours):
-        timestamp = now - timedelta(hours=i)
-        historical_data.append({
-            "timestamp": timestamp.isoformat(),
-            "pm25": 10 + (i % 10),
-            "pm10": 20 + (i % 15),
-            "co2": 400 + (i % 50),
-            "temperature": 20 + (i % 8),
-            "humidity": 60 + (i % 20),
-            "aqi": 30 + (i % 30)
-        })
-    
-    return {
-        "sensor_id": sensor_id,
-        "data": list(reversed(historical_data))
+async def get_historical_data(sensor_id: str, hours: int = 24, resolution: Optional[str] = None,
+                              agg: Optional[str] = None, points: int = 500, metric: str = "pm25"):
+    """Get historical air quality data.
+
+    Without ``resolution``/``agg`` every raw reading is returned. ``resolution``
+    (e.g. ``5m``, ``1h``) buckets readings and ``agg`` picks mean, min, max, p95,
+    count or all of them. ``agg=lttb`` instead downsamples raw readings to
+    ``points`` using LTTB on ``metric``. Readings older than the in-memory
+    history holds come from the database.
+    """
+    if agg is not None and agg not in AGGREGATES + ("all", "lttb"):
+        raise HTTPException(status_code=400, detail=f"Unknown aggregate: {agg}")
+    try:
+        bucket_seconds = parse_resolution(resolution) if resolution else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    start = (datetime.now() - timedelta(hours=hours)).timestamp()
+    response = {"sensor_id": sensor_id}
+
+    # Bucketed mean/min/max/count can be answered from precomputed rollups: in
+    # memory since this process started, and persisted ones before that
+    tier = rollup_store.tier_for(bucket_seconds) if bucket_seconds and (agg or "mean") in ROLLUP_AGGREGATES else None
+    if tier:
+        starts, stats = rollup_store.query(sensor_id, tier, start, datetime.now().timestamp())
+        covered = rollup_store.coverage_start(sensor_id, tier)
+        sources = [f"rollup_{tier}"] if covered is not None and rollup_store.retention_seconds(tier) >= hours * 3600 else []
+        if covered is None or covered > start:
+            rows = await asyncio.to_thread(get_rollups, sensor_id, tier, start, covered)
+            if rows:
+                persisted_starts, persisted_stats = rollup_arrays(rows)
+                starts = np.concatenate([persisted_starts, starts])
+                stats = np.concatenate([persisted_stats, stats])
+                sources = [f"rollup_{tier}_persisted"] + ([f"rollup_{tier}"] if covered is not None else [])
+        if sources:
+            response.update(resolution_seconds=bucket_seconds, agg=agg or "mean", source="+".join(sources))
+            response["data"] = aggregate_rollups(starts, stats, bucket_seconds, agg or "mean")
+            return response
+
+    covered = history_store.coverage_start(sensor_id)
+    timestamps, values = history_store.query(sensor_id, start)
+    if covered is None or covered > start:
+        # Older than the ring buffer holds (or not seen since startup): the database has it
+        rows = await asyncio.to_thread(get_historical_air_quality, sensor_id, hours, covered)
+        if rows:
+            persisted_timestamps, persisted_values = arrays_from_records(rows)
+            timestamps = np.concatenate([persisted_timestamps, timestamps])
+            values = np.concatenate([persisted_values, values])
+
+    if agg == "lttb":
+        try:
+            timestamps, values = lttb(timestamps, values, points, metric)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        response.update(agg="lttb", metric=metric)
+        response["data"] = to_records(timestamps, values)
+    elif bucket_seconds or agg:
+        bucket_seconds = bucket_seconds or 3600
+        response.update(resolution_seconds=bucket_seconds, agg=agg or "mean")
+        response["data"] = aggregate_records(timestamps, values, bucket_seconds, agg or "mean")
+    else:
+        response["data"] = to_records(timestamps, values)
+    return response
+
+@app.get("/api/analytics")
+async def get_analytics(request: Request, range_: str = Query("24h", alias="range"),
+                        bucket: Optional[str] = None):
+    """Per-sensor and fleet statistics over ``range`` (e.g. ``1h``, ``24h``, ``7d``).
+
+    Readings are bucketed by ``bucket`` (default: 1m up to 6h, 5m up to 2d,
+    1h beyond) for percentiles, exceedance hours, the diurnal profile, metric
+    correlations and the fleet series. Results are cached per (range, bucket)
+    and carry an ETag like /api/data/latest.
+    """
+    try:
+        range_seconds = parse_resolution(range_)
+        bucket_seconds = parse_resolution(bucket) if bucket else default_bucket(range_seconds)
+        if range_seconds > 366 * 86400:
+            raise ValueError("range must be at most 366d")
+        snapshot = await analytics_cache.get(range_seconds, bucket_seconds)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {
+        "ETag": snapshot.etag,
+        "Last-Modified": snapshot.last_modified,
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding"
     }
+    if snapshot.not_modified(request.headers.get("if-none-match"), request.headers.get("if-modified-since")):
+        analytics_cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=snapshot.encoded(encoding), media_type="application/json", headers=headers)
+
+def forecast_sensor(location: str) -> Optional[str]:
+    """Sensor with a forecast for ``location``: a sensor id, a location name or a 'lat,lon' point"""
+    if location in forecast_model:
+        return location
+    for sensor_id in sensor_registry.at_location(location):
+        if sensor_id in forecast_model:
+            return sensor_id
+    try:
+        lat, lon = parse_near(location)
+    except ValueError:
+        return None
+    for record in sensor_registry.near(lat, lon, 25.0):
+        if record["id"] in forecast_model:
+            return record["id"]
+    return None
+
+@app.get("/api/forecast")
+async def get_forecast(location: str, horizon: str = "1h"):
+    """Short-horizon forecast for a sensor (``location`` is a sensor id, a location
+    name or a 'lat,lon' point, resolved to the nearest sensor within 25 km).
+
+    Forecasts come from each sensor's online model, updated as readings arrive,
+    and are cached per (sensor, horizon) until the sensor's next step closes, so
+    a request never touches history.
+    """
+    try:
+        horizon_seconds = parse_resolution(horizon)
+        if horizon_seconds > FORECAST_MAX_HORIZON:
+            raise ValueError(f"horizon must be at most {FORECAST_MAX_HORIZON}s")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    sensor_id = forecast_sensor(location)
+    result = forecast_cache.get(sensor_id, horizon_seconds) if sensor_id else None
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"No forecast available for {location}")
+    return {"location": location, **result}
+
+@app.get("/api/export")
+async def export_data(format: str = "csv", source: Optional[str] = None, sensor_id: Optional[str] = None,
+                      hours: int = 24, start: Optional[str] = None, end: Optional[str] = None,
+                      cursor: Optional[str] = None, limit: Optional[int] = None, page_size: int = 5000):
+    """Stream historical readings as CSV, NDJSON or Parquet.
+
+    Rows come from air_quality_data (``source=database``, the default when
+    the database is configured) or the in-process history (``source=history``)
+    in (timestamp, id) order, one keyset-paginated page at a time, so memory
+    stays flat whatever the range. ``sensor_id`` takes a comma-separated
+    list; the range is ``start``/``end`` (ISO) or the last ``hours``. To
+    resume an interrupted export, pass the last row received as
+    ``cursor=<timestamp>,<id>`` (``id`` is the sensor id for history exports).
+    """
+    source = source or ("database" if get_supabase_client() else "history")
+    if source not in ("database", "history"):
+        raise HTTPException(status_code=400, detail=f"Unknown source: {source}")
+    try:
+        end_ts = to_epoch(end) if end else datetime.now().timestamp()
+        start_ts = to_epoch(start) if start else end_ts - hours * 3600
+        after = parse_cursor(cursor, numeric_id=source == "database") if cursor else None
+        if not 1 <= page_size <= 50000:
+            raise ValueError("page_size must be between 1 and 50000")
+        if limit is not None and limit < 1:
+            raise ValueError("limit must be at least 1")
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    sensor_ids = [s.strip() for s in sensor_id.split(",") if s.strip()] if sensor_id else None
+    if source == "database":
+        rows = DatabaseSource(get_air_quality_page, start_ts, end_ts, sensor_ids)
+    else:
+        rows = HistorySource(history_store, start_ts, end_ts, sensor_ids)
+
+    try:
+        export = Export(rows, format, after=after, page_size=page_size, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        await export.open()
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Export failed: {e}")
+
+    filename = f"airsense-{source}-{datetime.fromtimestamp(start_ts):%Y%m%d%H%M}.{format}"
+    return StreamingResponse(export.stream(), media_type=MEDIA_TYPES[format],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
 
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    """WebSocket endpoint for real-time data"""
-    await websocket_manager.connect(websocket)
+async def websocket_endpoint(websocket: WebSocket, encoding: Optional[str] = None,
+                             compression: Optional[str] = None):
+    """WebSocket endpoint for real-time data; ?encoding=msgpack|columnar selects a binary
+    format and ?compression=deflate shares compressed broadcast frames"""
+    await websocket_manager.connect(websocket, encoding, compression)
     try:
+        # Periodic snapshots come from the shared ticker in ConnectionManager;
+        # this coroutine only reads client frames and detects disconnects
         while True:
-            # Send latest sensor data every 5 seconds
-            await asyncio.sleep(5)
-            if sensor_data:
-                await websocket_manager.broadcast(json.dumps({
-                    "type": "sensor_data",
-                    "data": sensor_data
-                }))
+            text = await websocket.receive_text()
+            await websocket_manager.handle_client_message(websocket, text)
     except WebSocketDisconnect:
         websocket_manager.disconnect(websocket)
 
 @app.post("/api/alerts")
 async def create_alert(alert: AlertRequest):
     """Create a new air quality alert"""
-    # Store alert in database
+    try:
+        rule = alert_engine.add_rule(
+            alert.sensor_id,
+            AlertType(alert.alert_type),
+            alert.threshold,
+            direction=alert.direction,
+            hysteresis=alert.hysteresis,
+            debounce_seconds=alert.debounce_seconds,
+            severity=alert.severity
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    backplane.publish(ALERT_RULES, rule_added(rule), local=False)
     return {
         "message": "Alert created successfully",
-        "alert_id": f"alert_{datetime.now().timestamp()}"
+        "alert_id": rule.id,
+        "rule": rule.to_dict()
     }
 
 @app.get("/api/alerts")
 async def get_alerts():
     """Get all active alerts"""
     return {
-        "alerts": [
-            {
-                "id": "alert_001",
-                "sensor_id": "sensor_001",
-                "type": "high_pm25",
-                "message": "PM2.5 levels above 25 μg/m³",
-                "severity": "moderate",
-                "timestamp": datetime.now().isoformat(),
-                "active": True
-            }
-        ]
+        "alerts": alert_engine.get_active_alerts()
     }
 
+@app.get("/api/alerts/rules")
+async def get_alert_rules():
+    """Get all alert rules"""
+    return {
+        "rules": [rule.to_dict() for rule in alert_engine.rules.values()]
+    }
+
+@app.delete("/api/alerts/{alert_id}")
+async def delete_alert(alert_id: str):
+    """Delete an alert rule"""
+    if remove_alert_rule(alert_id) is None:
+        raise HTTPException(status_code=404, detail="Alert not found")
+    backplane.publish(ALERT_RULES, {"op": "remove", "rule_id": alert_id}, local=False)
+    return {"message": "Alert deleted successfully"}
+
 
 if __name__ == "__main__":
+    # Auto-reload is for development and only works with a single worker
+    reload = os.getenv("RELOAD", "false").lower() == "true" and WORKERS == 1
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
-        port=8000,
-        reload=True,
-        log_level="info"
+        port=int(os.getenv("PORT", "8000")),
+        workers=WORKERS,
+        reload=reload,
+        log_level="info",
+        # Per-socket permessage-deflate; clients using ?compression=deflate
+        # already get shared compressed frames and gain nothing from it
+        ws_per_message_deflate=os.getenv("WS_PER_MESSAGE_DEFLATE", "true").lower() == "true"
     )
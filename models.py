@@ -3,6 +3,8 @@ from datetime import datetime
 from typing import Optional, List
 from enum import Enum
 
+from aqi import aqi_value, aqi_category
+
 class AlertSeverity(str, Enum):
     LOW = "low"
     MODERATE = "moderate"
@@ -59,6 +61,7 @@ class User(BaseModel):
 
 class Alert(BaseModel):
     id: Optional[int] = None
+    alert_id: Optional[str] = None
     sensor_id: str
     alert_type: AlertType
     message: str
@@ -68,6 +71,34 @@ class Alert(BaseModel):
     created_at: Optional[datetime] = None
     resolved_at: Optional[datetime] = None
 
+# Health impact and recommendations for each AQI category
+AQI_GUIDANCE = {
+    "Good": (
+        "Air quality is considered satisfactory",
+        ["Enjoy outdoor activities", "Open windows for ventilation"]
+    ),
+    "Moderate": (
+        "Sensitive groups may experience minor breathing discomfort",
+        ["Consider reducing outdoor activities if you have respiratory issues"]
+    ),
+    "Unhealthy for Sensitive Groups": (
+        "Children, elderly, and those with respiratory issues should limit outdoor activities",
+        ["Reduce outdoor activities", "Close windows", "Use air purifiers"]
+    ),
+    "Unhealthy": (
+        "Everyone may experience health effects",
+        ["Avoid outdoor activities", "Stay indoors", "Use N95 masks if going outside"]
+    ),
+    "Very Unhealthy": (
+        "Health warnings of emergency conditions",
+        ["Stay indoors", "Use air purifiers", "Avoid all outdoor activities"]
+    ),
+    "Hazardous": (
+        "Health alert: everyone may experience more serious health effects",
+        ["Stay indoors", "Use high-efficiency air purifiers", "Consider evacuating if possible"]
+    ),
+}
+
 class AirQualityIndex(BaseModel):
     """Calculate Air Quality Index based on PM2.5"""
     pm25: float
@@ -79,43 +110,16 @@ class AirQualityIndex(BaseModel):
     @classmethod
     def calculate_aqi(cls, pm25: float) -> 'AirQualityIndex':
         """Calculate AQI from PM2.5 value"""
-        if pm25 <= 12.0:
-            aqi = int((pm25 / 12.0) * 50)
-            category = "Good"
-            health_impact = "Air quality is considered satisfactory"
-            recommendations = ["Enjoy outdoor activities", "Open windows for ventilation"]
-        elif pm25 <= 35.4:
-            aqi = int(50 + ((pm25 - 12.1) / 23.3) * 50)
-            category = "Moderate"
-            health_impact = "Sensitive groups may experience minor breathing discomfort"
-            recommendations = ["Consider reducing outdoor activities if you have respiratory issues"]
-        elif pm25 <= 55.4:
-            aqi = int(100 + ((pm25 - 35.5) / 19.9) * 50)
-            category = "Unhealthy for Sensitive Groups"
-            health_impact = "Children, elderly, and those with respiratory issues should limit outdoor activities"
-            recommendations = ["Reduce outdoor activities", "Close windows", "Use air purifiers"]
-        elif pm25 <= 150.4:
-            aqi = int(150 + ((pm25 - 55.5) / 94.9) * 100)
-            category = "Unhealthy"
-            health_impact = "Everyone may experience health effects"
-            recommendations = ["Avoid outdoor activities", "Stay indoors", "Use N95 masks if going outside"]
-        elif pm25 <= 250.4:
-            aqi = int(200 + ((pm25 - 150.5) / 99.9) * 100)
-            category = "Very Unhealthy"
-            health_impact = "Health warnings of emergency conditions"
-            recommendations = ["Stay indoors", "Use air purifiers", "Avoid all outdoor activities"]
-        else:
-            aqi = int(300 + ((pm25 - 250.5) / 149.5) * 100)
-            category = "Hazardous"
-            health_impact = "Health alert: everyone may experience more serious health effects"
-            recommendations = ["Stay indoors", "Use high-efficiency air purifiers", "Consider evacuating if possible"]
+        aqi = aqi_value(pm25)
+        category = aqi_category(aqi)
+        health_impact, recommendations = AQI_GUIDANCE[category]
 
         return cls(
             pm25=pm25,
-            aqi=min(aqi, 500),  # Cap at 500
+            aqi=aqi,
             category=category,
             health_impact=health_impact,
-            recommendations=recommendations
+            recommendations=list(recommendations)
         )
 
 class WeatherData(BaseModel):
@@ -1,23 +1,45 @@
 import paho.mqtt.client as mqtt
 import json
 import asyncio
+import threading
+import time
 from datetime import datetime
-from typing import Callable, Optional
+from typing import Callable, List, Optional
 import logging
 
+from decoding import MessageDecoder
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class MQTTClient:
-    """MQTT client for receiving sensor data from IoT devices"""
+    """MQTT client for receiving sensor data from IoT devices.
+
+    With a ``shared_group`` the sensor topics are subscribed as MQTT shared
+    subscriptions (``$share/<group>/<topic>``), so the broker spreads messages
+    across every client in the group instead of sending each one to all.
+    Messages are decoded on this client's own network thread, in micro-batches
+    of up to ``decode_batch`` messages held for at most ``decode_max_delay``
+    seconds (see ``MessageDecoder``).
+    """
     
-    def __init__(self, broker_host: str = "localhost", broker_port: int = 1883):
+    def __init__(self, broker_host: str = "localhost", broker_port: int = 1883,
+                 shared_group: Optional[str] = None, client_id: str = "", shard: int = 0,
+                 decode_batch: int = 256, decode_max_delay: float = 0.02):
         self.broker_host = broker_host
         self.broker_port = broker_port
+        self.shared_group = shared_group
+        self.client_id = client_id
+        self.shard = shard
         self.client = None
         self.connected = False
         self.data_callback: Optional[Callable] = None
+        self.batch_callback: Optional[Callable[[List[dict]], None]] = None
+        self.decoder = MessageDecoder(self._emit, batch_size=decode_batch,
+                                      max_delay=decode_max_delay, name=f"MQTT shard {shard}")
+        self._flusher: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
         
         # MQTT topics for different sensor types
         self.topics = {
@@ -26,10 +48,25 @@ class MQTTClient:
             "humidity": "airsense/sensors/+/humidity",
             "status": "airsense/sensors/+/status"
         }
+
+        # Throughput counters, updated on the network thread
+        self.messages = 0
+        self.bytes = 0
+        self.errors = 0
+        self.messages_per_second = 0.0
+        self._window_started = time.monotonic()
+        self._window_messages = 0
+
+    def subscription_topics(self) -> List[str]:
+        if self.shared_group:
+            return [f"$share/{self.shared_group}/{pattern}" for pattern in self.topics.values()]
+        return list(self.topics.values())
     
-    def set_data_callback(self, callback: Callable):
-        """Set callback function for received data"""
+    def set_data_callback(self, callback: Callable, batch_callback: Optional[Callable[[List[dict]], None]] = None):
+        """Set callback function for received data; ``batch_callback``, if given,
+        receives each decoded batch as a list instead"""
         self.data_callback = callback
+        self.batch_callback = batch_callback
     
     def on_connect(self, client, userdata, flags, rc):
         """Callback for when MQTT client connects"""
@@ -38,7 +75,7 @@ class MQTTClient:
             logger.info("🔗 MQTT client connected successfully")
             
             # Subscribe to all sensor topics
-            for topic_name, topic_pattern in self.topics.items():
+            for topic_pattern in self.subscription_topics():
                 client.subscribe(topic_pattern)
                 logger.info(f"📡 Subscribed to topic: {topic_pattern}")
         else:
@@ -49,37 +86,42 @@ class MQTTClient:
         self.connected = False
         logger.info("🔌 MQTT client disconnected")
     
+    def _count(self, size: int):
+        self.messages += 1
+        self.bytes += size
+        self._window_messages += 1
+        now = time.monotonic()
+        elapsed = now - self._window_started
+        if elapsed >= 1.0:
+            self.messages_per_second = self._window_messages / elapsed
+            self._window_started = now
+            self._window_messages = 0
+
     def on_message(self, client, userdata, msg):
         """Callback for when MQTT message is received"""
+        self._count(len(msg.payload))
+        self.decoder.add(msg.topic, msg.payload)
+
+    def _emit(self, readings: List[dict]):
         try:
-            topic = msg.topic
-            payload = json.loads(msg.payload.decode())
-            
-            # Extract sensor ID from topic (format: airsense/sensors/{sensor_id}/data_type)
-            topic_parts = topic.split('/')
-            if len(topic_parts) >= 3:
-                sensor_id = topic_parts[2]
-                
-                # Add sensor ID and timestamp to payload
-                payload['sensor_id'] = sensor_id
-                payload['timestamp'] = datetime.now().isoformat()
-                payload['topic'] = topic
-                
-                logger.info(f"📊 Received data from sensor {sensor_id}: {payload}")
-                
-                # Call the data callback if set
-                if self.data_callback:
-                    self.data_callback(payload)
-                    
-        except json.JSONDecodeError as e:
-            logger.error(f"❌ Failed to decode MQTT message: {e}")
+            if self.batch_callback:
+                self.batch_callback(readings)
+            elif self.data_callback:
+                for reading in readings:
+                    self.data_callback(reading)
         except Exception as e:
-            logger.error(f"❌ Error processing MQTT message: {e}")
+            self.errors += 1
+            logger.error(f"❌ Error processing MQTT messages: {e}")
+
+    def _flush_stale(self):
+        """Decode partial batches once they have waited long enough"""
+        while not self._stopped.wait(self.decoder.max_delay):
+            self.decoder.flush_stale()
     
     async def connect(self):
         """Connect to MQTT broker"""
         try:
-            self.client = mqtt.Client()
+            self.client = mqtt.Client(client_id=self.client_id)
             self.client.on_connect = self.on_connect
             self.client.on_disconnect = self.on_disconnect
             self.client.on_message = self.on_message
@@ -87,6 +129,10 @@ class MQTTClient:
             # Connect to broker
             self.client.connect(self.broker_host, self.broker_port, 60)
             self.client.loop_start()
+            self._stopped.clear()
+            self._flusher = threading.Thread(target=self._flush_stale, daemon=True,
+                                             name=f"mqtt-decode-{self.shard}")
+            self._flusher.start()
             
             # Wait a moment for connection to establish
             await asyncio.sleep(1)
@@ -104,6 +150,11 @@ class MQTTClient:
         if self.client:
             self.client.loop_stop()
             self.client.disconnect()
+            self._stopped.set()
+            if self._flusher:
+                await asyncio.to_thread(self._flusher.join)
+                self._flusher = None
+            self.decoder.flush()
             logger.info("🔌 MQTT client disconnected")
     
     def publish_sensor_command(self, sensor_id: str, command: str, payload: dict = None):
@@ -133,88 +184,84 @@ class MQTTClient:
             "connected": self.connected,
             "broker_host": self.broker_host,
             "broker_port": self.broker_port,
-            "subscribed_topics": list(self.topics.values())
+            "subscribed_topics": self.subscription_topics()
         }
 
-# Mock MQTT data generator for testing
-class MockMQTTDataGenerator:
-    """Generate mock sensor data for testing when real MQTT broker is not available"""
-    
-    def __init__(self, callback: Callable):
-        self.callback = callback
-        self.running = False
-        self.sensors = [
-            {"id": "sensor_001", "location": "Downtown Station", "lat": 43.6532, "lon": -79.3832},
-            {"id": "sensor_002", "location": "Suburban Station", "lat": 43.5890, "lon": -79.6441},
-            {"id": "sensor_003", "location": "Industrial Zone", "lat": 43.2557, "lon": -79.8711}
+    def get_stats(self) -> dict:
+        """Report this client's throughput"""
+        if time.monotonic() - self._window_started > 2.0:
+            # No message has closed the window for a while
+            self.messages_per_second = 0.0
+        return {
+            "shard": self.shard,
+            "client_id": self.client_id,
+            "connected": self.connected,
+            "messages": self.messages,
+            "bytes": self.bytes,
+            "errors": self.errors,
+            "messages_per_second": round(self.messages_per_second, 1),
+            "decode": self.decoder.get_stats()
+        }
+
+class MQTTIngestPool:
+    """``shards`` MQTTClients sharing the sensor topics through one shared subscription group.
+
+    Each shard has its own connection and paho network thread, and the broker
+    delivers every message to exactly one member of the group, so reading,
+    parsing and logging are spread over the shards. Workers that use the
+    same ``shared_group`` split the stream between them as well, so client ids
+    (``<client_id_prefix>-<shard>``) must be unique per worker; an empty
+    prefix lets paho pick random ids. With one shard and no group this is a
+    plain MQTTClient.
+    """
+
+    def __init__(self, shards: int = 1, broker_host: str = "localhost", broker_port: int = 1883,
+                 shared_group: Optional[str] = None, client_id_prefix: str = "", **client_options):
+        if shards < 1:
+            raise ValueError("shards must be at least 1")
+        if shards > 1 and not shared_group:
+            raise ValueError("Several shards need a shared subscription group")
+        self.shared_group = shared_group
+        self.clients = [
+            MQTTClient(broker_host, broker_port, shared_group=shared_group,
+                       client_id=f"{client_id_prefix}-{shard}" if client_id_prefix else "",
+                       shard=shard, **client_options)
+            for shard in range(shards)
         ]
-    
-    async def start(self):
-        """Start generating mock data"""
-        self.running = True
-        logger.info("🎭 Starting mock MQTT data generator")
-        
-        while self.running:
-            for sensor in self.sensors:
-                # Generate realistic air quality data with more variation
-                base_time = datetime.now().timestamp()
-                sensor_offset = hash(sensor["id"]) % 100
-                
-                # More realistic PM2.5 values (5-35 µg/m³ range)
-                pm25 = round(8 + (base_time + sensor_offset) % 25 + (base_time % 10) * 0.5, 1)
-                
-                # PM10 is typically 1.5-2x PM2.5
-                pm10 = round(pm25 * 1.7 + (base_time % 5), 1)
-                
-                # CO2 levels (400-600 ppm normal range)
-                co2 = round(420 + (base_time + sensor_offset) % 150 + (base_time % 20), 0)
-                
-                # Temperature varies by location and time
-                if "Downtown" in sensor["location"]:
-                    temp = round(22 + (base_time % 8) - 4 + (base_time % 3), 1)  # 18-26°C
-                else:
-                    temp = round(20 + (base_time % 6) - 3 + (base_time % 2), 1)  # 17-23°C
-                
-                # Humidity (40-80% range)
-                humidity = round(55 + (base_time + sensor_offset) % 25 + (base_time % 7), 1)
-                
-                mock_data = {
-                    "sensor_id": sensor["id"],
-                    "location": sensor["location"],
-                    "pm25": pm25,
-                    "pm10": pm10,
-                    "co2": co2,
-                    "temperature": temp,
-                    "humidity": humidity,
-                    "pressure": round(1013 + (base_time % 20) - 10, 1),  # 1003-1033 hPa
-                    "timestamp": datetime.now().isoformat()
-                }
-                
-                # Calculate AQI
-                aqi = self.calculate_aqi(mock_data["pm25"])
-                mock_data["aqi"] = aqi
-                
-                # Send to callback
-                self.callback(mock_data)
-                
-                # Small delay between sensors
-                await asyncio.sleep(0.5)
-            
-            # Wait before next round
-            await asyncio.sleep(10)  # Generate new data every 10 seconds
-    
-    def stop(self):
-        """Stop generating mock data"""
-        self.running = False
-        logger.info("🛑 Mock MQTT data generator stopped")
-    
-    def calculate_aqi(self, pm25: float) -> int:
-        """Calculate AQI from PM2.5"""
-        if pm25 <= 12.0:
-            return int((pm25 / 12.0) * 50)
-        elif pm25 <= 35.4:
-            return int(50 + ((pm25 - 12.1) / 23.3) * 50)
-        elif pm25 <= 55.4:
-            return int(100 + ((pm25 - 35.5) / 19.9) * 50)
-        else:
-            return int(150 + ((pm25 - 55.5) / 94.9) * 100)
+
+    @property
+    def connected(self) -> bool:
+        return any(client.connected for client in self.clients)
+
+    def set_data_callback(self, callback: Callable, batch_callback: Optional[Callable[[List[dict]], None]] = None):
+        """Set callback functions for received data; they are called from every shard's thread"""
+        for client in self.clients:
+            client.set_data_callback(callback, batch_callback)
+
+    async def connect(self):
+        await asyncio.gather(*(client.connect() for client in self.clients))
+
+    async def disconnect(self):
+        await asyncio.gather(*(client.disconnect() for client in self.clients))
+
+    def publish_sensor_command(self, sensor_id: str, command: str, payload: dict = None):
+        client = next((client for client in self.clients if client.connected), self.clients[0])
+        client.publish_sensor_command(sensor_id, command, payload)
+
+    def get_connection_status(self) -> dict:
+        status = self.clients[0].get_connection_status()
+        status["connected"] = self.connected
+        status["shards"] = len(self.clients)
+        return status
+
+    def get_stats(self) -> dict:
+        """Report per-shard and total throughput"""
+        shards = [client.get_stats() for client in self.clients]
+        return {
+            "shared_group": self.shared_group,
+            "shards": shards,
+            "messages": sum(shard["messages"] for shard in shards),
+            "errors": sum(shard["errors"] for shard in shards),
+            "invalid": sum(shard["decode"]["invalid"] for shard in shards),
+            "messages_per_second": round(sum(shard["messages_per_second"] for shard in shards), 1)
+        }
@@ -0,0 +1,226 @@
+import asyncio
+import json
+import os
+import random
+import time
+from typing import Callable, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+class WriteBehindBuffer:
+    """Collects rows in memory and bulk-inserts them into a Supabase table.
+
+    Rows are flushed when ``batch_size`` rows are buffered or every
+    ``flush_interval`` seconds, whichever comes first. The blocking Supabase
+    call runs in a worker thread so the event loop never waits on HTTP.
+    Failed batches are retried with exponential backoff; if they still fail
+    (or the buffer is stopped with rows pending) the rows are appended to an
+    NDJSON spool file, which is replayed on the next ``start``. With
+    ``upsert``, rows replace existing rows with the same primary key, or the
+    same ``key`` column if one is given.
+    """
+
+    def __init__(self, client_factory: Callable, table: str = "air_quality_data",
+                 batch_size: int = 500, flush_interval: float = 2.0,
+                 max_retries: int = 5, retry_base_delay: float = 0.5,
+                 retry_max_delay: float = 30.0, spool_path: Optional[str] = None,
+                 row_builder: Optional[Callable[[dict], Optional[dict]]] = None,
+                 upsert: bool = False, key: Optional[str] = None):
+        self.client_factory = client_factory
+        self.table = table
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.spool_path = spool_path
+        self.row_builder = row_builder
+        self.upsert = upsert
+        self.key = key
+
+        self._buffer: List[dict] = []
+        self._in_flight = 0
+        self._flush_needed: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._running = False
+        self._replay_path: Optional[str] = None
+
+        self.rows_added = 0
+        self.rows_skipped = 0
+        self.rows_flushed = 0
+        self.rows_spooled = 0
+        self.flush_count = 0
+        self.failed_attempts = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    @property
+    def backlog(self) -> int:
+        """Rows buffered or currently being written"""
+        return len(self._buffer) + self._in_flight
+
+    def add(self, data: dict) -> bool:
+        """Buffer a reading for the next bulk insert"""
+        row = self.row_builder(data) if self.row_builder else data
+        if row is None:
+            self.rows_skipped += 1
+            return False
+        self._buffer.append(row)
+        self.rows_added += 1
+        if len(self._buffer) >= self.batch_size and self._flush_needed is not None:
+            self._flush_needed.set()
+        return True
+
+    async def start(self):
+        """Replay any spooled rows and start the periodic flusher"""
+        self._flush_needed = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._running = True
+        spooled = await asyncio.to_thread(self._read_spool)
+        if spooled:
+            logger.info(f"📂 Replaying {len(spooled)} spooled rows into {self.table}")
+            self._buffer[:0] = spooled
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush what we can and spool the rest"""
+        self._running = False
+        if self._task:
+            self._flush_needed.set()
+            await self._task
+            self._task = None
+        await self.flush(retry=False)
+        if self._buffer:
+            rows, self._buffer = self._buffer, []
+            await asyncio.to_thread(self._write_spool, rows)
+
+    async def _run(self):
+        while self._running:
+            try:
+                await asyncio.wait_for(self._flush_needed.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_needed.clear()
+            await self.flush()
+
+    async def flush(self, retry: bool = True):
+        """Write buffered rows in batches of ``batch_size``"""
+        async with self._flush_lock:
+            while self._buffer:
+                batch = self._buffer[:self.batch_size]
+                del self._buffer[:self.batch_size]
+                self._in_flight = len(batch)
+                try:
+                    if not await self._write_batch(batch, retry):
+                        await asyncio.to_thread(self._write_spool, batch)
+                finally:
+                    self._in_flight = 0
+            # Replayed rows are now either written or re-spooled
+            if self._replay_path:
+                await asyncio.to_thread(os.remove, self._replay_path)
+                self._replay_path = None
+
+    async def _write_batch(self, rows: List[dict], retry: bool) -> bool:
+        attempts = self.max_retries + 1 if retry else 1
+        for attempt in range(attempts):
+            started = time.perf_counter()
+            try:
+                await asyncio.to_thread(self._insert, rows)
+            except Exception as e:
+                self.failed_attempts += 1
+                if attempt + 1 >= attempts:
+                    logger.error(f"❌ Bulk insert of {len(rows)} rows into {self.table} failed: {e}")
+                    return False
+                delay = min(self.retry_max_delay, self.retry_base_delay * (2 ** attempt))
+                delay *= 0.5 + random.random() / 2
+                logger.warning(f"⚠️ Bulk insert failed ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.flush_count += 1
+            self.rows_flushed += len(rows)
+            self.last_flush_ms = elapsed_ms
+            self.total_flush_ms += elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+            return True
+        return False
+
+    def _insert(self, rows: List[dict]):
+        client = self.client_factory()
+        if client is None:
+            raise RuntimeError("Database not available")
+        table = client.table(self.table)
+        if not self.upsert:
+            table.insert(rows).execute()
+        elif self.key:
+            # Postgres rejects an upsert that touches the same row twice; the latest version wins.
+            # Rows without a key (e.g. spooled by an older version) are all kept
+            latest = {}
+            for index, row in enumerate(rows):
+                key = row.get(self.key)
+                latest[(None, index) if key is None else key] = row
+            table.upsert(list(latest.values()), on_conflict=self.key).execute()
+        else:
+            table.upsert(rows).execute()
+
+    def _write_spool(self, rows: List[dict]):
+        if not self.spool_path:
+            logger.error(f"❌ Dropping {len(rows)} unflushed rows (no spool configured)")
+            return
+        directory = os.path.dirname(self.spool_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.spool_path, "a", encoding="utf-8") as spool:
+            for row in rows:
+                spool.write(json.dumps(row, default=str) + "\n")
+        self.rows_spooled += len(rows)
+        logger.warning(f"💾 Spooled {len(rows)} rows to {self.spool_path}")
+
+    def _read_spool(self) -> List[dict]:
+        if not self.spool_path:
+            return []
+        # Move the spool aside so rows spooled during replay land in a fresh
+        # file. The .replay file is removed only after its rows are flushed, so
+        # a crash mid-replay replays it again (at-least-once).
+        replay_path = f"{self.spool_path}.replay"
+        if os.path.exists(self.spool_path):
+            if os.path.exists(replay_path):
+                with open(replay_path, "a", encoding="utf-8") as replay, \
+                        open(self.spool_path, encoding="utf-8") as spool:
+                    replay.writelines(spool)
+                os.remove(self.spool_path)
+            else:
+                os.replace(self.spool_path, replay_path)
+        if not os.path.exists(replay_path):
+            return []
+
+        rows = []
+        with open(replay_path, encoding="utf-8") as replay:
+            for line in replay:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError:
+                    logger.error("❌ Skipping corrupt spool line")
+        self._replay_path = replay_path
+        return rows
+
+    def get_stats(self) -> Dict[str, float]:
+        """Get flush latency and backlog metrics"""
+        return {
+            "backlog": self.backlog,
+            "rows_added": self.rows_added,
+            "rows_skipped": self.rows_skipped,
+            "rows_flushed": self.rows_flushed,
+            "rows_spooled": self.rows_spooled,
+            "flushes": self.flush_count,
+            "failed_attempts": self.failed_attempts,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "max_flush_ms": round(self.max_flush_ms, 3),
+            "avg_flush_ms": round(self.total_flush_ms / self.flush_count, 3) if self.flush_count else 0.0
+        }
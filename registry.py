@@ -0,0 +1,256 @@
+import hashlib
+import math
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from models import SensorStatus
+from snapshot import dumps
+from subscriptions import BBox, parse_bbox
+
+EARTH_RADIUS_KM = 6371.0
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in kilometres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def parse_near(value: str) -> Tuple[float, float]:
+    """Parse a 'lat,lon' point"""
+    try:
+        lat, lon = (float(v) for v in value.split(","))
+    except ValueError:
+        raise ValueError("near must be 'lat,lon'")
+    if not -90 <= lat <= 90 or not -180 <= lon <= 180:
+        raise ValueError("near is out of range")
+    return lat, lon
+
+def sensor_record(row: dict) -> dict:
+    """Normalize a catalog entry or ``sensors`` table row to the API shape"""
+    if "coordinates" in row:
+        lat, lon = row["coordinates"]
+    else:
+        lat, lon = row["latitude"], row["longitude"]
+    return {
+        "id": row["id"],
+        "name": row["name"],
+        "location": row["location"],
+        "coordinates": [float(lat), float(lon)],
+        "status": row.get("status") or SensorStatus.ONLINE.value
+    }
+
+class SensorRegistry:
+    """Sensor metadata with a lat/lon grid index.
+
+    The ETag of a query hashes the query and the content of the sensors it
+    returns, like snapshot.Snapshot, so it changes only when one of those
+    sensors changed and means the same body in every worker and after a
+    restart. ``on_change(sensor_id)`` is called after
+    each change, e.g. to drop cached subscription matches. The sorted id list
+    and unfiltered query results are cached until the next change, so polling
+    the whole registry doesn't re-sort and re-hash every sensor.
+    """
+
+    def __init__(self, cell_size: float = 0.5, on_change: Optional[Callable[[str], None]] = None):
+        self.cell_size = cell_size
+        self.on_change = on_change
+        self._sensors: Dict[str, dict] = {}
+        self._grid: Dict[Tuple[int, int], Set[str]] = {}
+        self._by_location: Dict[str, Set[str]] = {}
+        self._revision = 0
+        self._sorted_ids: Optional[List[str]] = None
+        # (offset, limit) -> (page, total, etag) of unfiltered queries since the last change
+        self._unfiltered: Dict[Tuple[int, Optional[int]], Tuple[List[dict], int, str]] = {}
+        self.loaded_from: Optional[str] = None
+
+    def __contains__(self, sensor_id: str) -> bool:
+        return sensor_id in self._sensors
+
+    def __len__(self) -> int:
+        return len(self._sensors)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.cell_size), math.floor(lon / self.cell_size))
+
+    def load(self, rows: Iterable[dict], source: str):
+        """Replace the registry contents, e.g. from the ``sensors`` table at startup"""
+        self._sensors.clear()
+        self._grid.clear()
+        self._by_location.clear()
+        self._sorted_ids = None
+        self._unfiltered.clear()
+        for row in rows:
+            self.upsert(row)
+        self.loaded_from = source
+
+    def upsert(self, row: dict) -> dict:
+        """Add or update a sensor, re-indexing it only if it moved"""
+        record = sensor_record(row)
+        sensor_id = record["id"]
+        previous = self._sensors.get(sensor_id)
+        if previous is not None:
+            if previous["coordinates"] != record["coordinates"] or previous["location"] != record["location"]:
+                self._unindex(previous)
+                self._index(record)
+            # Keep the live status and last-seen time unless the update sets them
+            if "status" not in row:
+                record["status"] = previous["status"]
+            record["last_seen"] = previous.get("last_seen")
+        else:
+            self._index(record)
+            record.setdefault("last_seen", None)
+            self._sorted_ids = None
+        self._sensors[sensor_id] = record
+        self._touch(sensor_id)
+        return record
+
+    def remove(self, sensor_id: str) -> Optional[dict]:
+        record = self._sensors.pop(sensor_id, None)
+        if record is not None:
+            self._unindex(record)
+            self._revision += 1
+            self._sorted_ids = None
+            self._unfiltered.clear()
+            if self.on_change:
+                self.on_change(sensor_id)
+        return record
+
+    def set_status(self, sensor_id: str, status: SensorStatus, last_seen: Optional[datetime] = None):
+        """Record a liveness transition; sensors under maintenance keep that status"""
+        record = self._sensors.get(sensor_id)
+        if record is None or record["status"] == SensorStatus.MAINTENANCE.value:
+            return
+        record["status"] = status.value
+        # last_seen changes on every reading; it is only published while offline
+        # so that an online sensor's metadata (and ETag) stays stable
+        offline = status == SensorStatus.OFFLINE
+        record["last_seen"] = last_seen.isoformat() if offline and last_seen else None
+        self._touch(sensor_id)
+
+    def _touch(self, sensor_id: str):
+        self._revision += 1
+        self._unfiltered.clear()
+        if self.on_change:
+            self.on_change(sensor_id)
+
+    def _index(self, record: dict):
+        self._grid.setdefault(self._cell(*record["coordinates"]), set()).add(record["id"])
+        self._by_location.setdefault(record["location"].casefold(), set()).add(record["id"])
+
+    def _unindex(self, record: dict):
+        cell = self._cell(*record["coordinates"])
+        members = self._grid.get(cell)
+        if members is not None:
+            members.discard(record["id"])
+            if not members:
+                del self._grid[cell]
+        location = record["location"].casefold()
+        members = self._by_location.get(location)
+        if members is not None:
+            members.discard(record["id"])
+            if not members:
+                del self._by_location[location]
+
+    def ids(self) -> List[str]:
+        return list(self._sensors)
+
+    def sorted_ids(self) -> List[str]:
+        """Every sensor id, sorted; cached until a sensor is added or removed"""
+        if self._sorted_ids is None:
+            self._sorted_ids = sorted(self._sensors)
+        return self._sorted_ids
+
+    def get(self, sensor_id: str) -> Optional[dict]:
+        return self._sensors.get(sensor_id)
+
+    def at_location(self, location: str) -> List[str]:
+        """Ids of the sensors whose location is ``location`` (case-insensitive), ordered by id"""
+        return sorted(self._by_location.get(location.casefold(), ()))
+
+    def coordinates_for(self, sensor_id: str) -> Optional[Tuple[float, float]]:
+        record = self._sensors.get(sensor_id)
+        return tuple(record["coordinates"]) if record else None
+
+    def _cells_in(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> Iterable[str]:
+        min_row, min_col = self._cell(min_lat, min_lon)
+        max_row, max_col = self._cell(max_lat, max_lon)
+        if (max_row - min_row + 1) * (max_col - min_col + 1) > len(self._grid):
+            # Cheaper to walk the occupied cells than every cell in the box
+            for (row, col), members in self._grid.items():
+                if min_row <= row <= max_row and min_col <= col <= max_col:
+                    yield from members
+            return
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                yield from self._grid.get((row, col), ())
+
+    def within(self, bbox: BBox) -> List[dict]:
+        """Sensors inside a [min_lat, min_lon, max_lat, max_lon] box, ordered by id"""
+        min_lat, min_lon, max_lat, max_lon = parse_bbox(bbox)
+        found = []
+        for sensor_id in self._cells_in(min_lat, min_lon, max_lat, max_lon):
+            record = self._sensors[sensor_id]
+            lat, lon = record["coordinates"]
+            if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon:
+                found.append(record)
+        return sorted(found, key=lambda record: record["id"])
+
+    def near(self, lat: float, lon: float, radius_km: float) -> List[dict]:
+        """Sensors within ``radius_km`` of a point, nearest first, with ``distance_km``"""
+        dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+        cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+        dlon = min(180.0, dlat / cos_lat)
+        found = []
+        for sensor_id in self._cells_in(lat - dlat, lon - dlon, lat + dlat, lon + dlon):
+            record = self._sensors[sensor_id]
+            distance = haversine_km(lat, lon, *record["coordinates"])
+            if distance <= radius_km:
+                found.append({**record, "distance_km": round(distance, 3)})
+        return sorted(found, key=lambda record: (record["distance_km"], record["id"]))
+
+    def query(self, bbox: Optional[BBox] = None, near: Optional[Tuple[float, float]] = None,
+              radius_km: float = 25.0, offset: int = 0, limit: Optional[int] = None) -> Tuple[List[dict], int, str]:
+        """Filtered, paged sensors; returns ``(page, total, etag)``"""
+        if near is None and bbox is None:
+            return self._query_all(offset, limit)
+        if near is not None:
+            matches = self.near(near[0], near[1], radius_km)
+            if bbox is not None:
+                min_lat, min_lon, max_lat, max_lon = parse_bbox(bbox)
+                matches = [record for record in matches
+                           if min_lat <= record["coordinates"][0] <= max_lat
+                           and min_lon <= record["coordinates"][1] <= max_lon]
+        else:
+            matches = self.within(bbox)
+
+        page = matches[offset:offset + limit if limit is not None else None]
+        return page, len(matches), self.etag(page, (bbox, near, radius_km, offset, limit, len(matches)))
+
+    def _query_all(self, offset: int, limit: Optional[int]) -> Tuple[List[dict], int, str]:
+        key = (offset, limit)
+        result = self._unfiltered.get(key)
+        if result is None:
+            ids = self.sorted_ids()
+            page = [self._sensors[sensor_id] for sensor_id in ids[offset:offset + limit if limit is not None else None]]
+            result = (page, len(ids), self.etag(page, (None, None, offset, limit, len(ids))))
+            if len(self._unfiltered) >= 64:
+                self._unfiltered.clear()
+            self._unfiltered[key] = result
+        return result
+
+    def etag(self, records: List[dict], query) -> str:
+        """Strong ETag over the query and the content of the returned sensors"""
+        digest = hashlib.blake2b(repr(query).encode(), digest_size=10)
+        digest.update(dumps(records))
+        return f'"{digest.hexdigest()}"'
+
+    def get_stats(self) -> dict:
+        """Report registry size and index occupancy"""
+        return {
+            "sensors": len(self._sensors),
+            "grid_cells": len(self._grid),
+            "revision": self._revision,
+            "loaded_from": self.loaded_from
+        }
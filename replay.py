@@ -0,0 +1,356 @@
+"""Replay or bulk-load archived readings (NDJSON, CSV or Parquet, e.g. from /api/export).
+
+Targets:
+
+- ``backplane``: publish onto a running deployment's socket backplane
+  (BACKPLANE=socket), so every worker stores, alerts on and broadcasts the
+  readings as if they had just been ingested. Archived readings are already
+  in the database, so the leader doesn't persist them again unless
+  ``--persist`` marks them. Archive timestamps are kept unless ``--retime``.
+- ``mqtt``: publish to the broker on the sensors' own topics, exercising the
+  whole ingest path from MQTT decoding on; readings are stamped on receipt.
+- ``database``: bulk-insert into air_quality_data, e.g. for migrations.
+
+``--speed 1`` replays in real time, ``--speed 60`` a minute per second and
+``--speed max`` (the default) as fast as the target accepts rows.
+
+    python replay.py incident.ndjson --to backplane --speed 10 --retime
+    python replay.py archive.parquet --to database
+    python replay.py archive.csv.gz --to mqtt --speed max
+"""
+import argparse
+import asyncio
+import csv
+import gzip
+import mmap
+import os
+import time
+from datetime import datetime
+from typing import Iterator, List, Optional
+
+import paho.mqtt.client as mqtt
+
+from aqi import fill_missing_aqi
+from backplane import BackplanePublisher, REPLAYED
+from database import air_quality_row, get_supabase_client
+from decoding import validate_reading
+from persistence import WriteBehindBuffer
+from snapshot import dumps, loads
+from timeseries import to_epoch
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional format
+    pq = None
+
+FORMATS = ("ndjson", "csv", "parquet")
+# Columns of an export that are not part of a reading
+_DROPPED = frozenset(("id", "topic", "created_at"))
+_BLOCK = 4 * 1024 * 1024
+
+def detect_format(path: str) -> str:
+    name = path[:-3] if path.endswith(".gz") else path
+    extension = os.path.splitext(name)[1].lstrip(".").lower()
+    if extension in ("ndjson", "jsonl", "json"):
+        return "ndjson"
+    if extension in FORMATS:
+        return extension
+    raise ValueError(f"Can't tell the format of {path}; pass --format")
+
+class ArchiveReader:
+    """Readings from an archive, ``chunk_rows`` at a time.
+
+    Plain NDJSON is memory-mapped and split in large blocks; gzipped NDJSON
+    and CSV are streamed; Parquet is read one record batch at a time. Rows
+    without a sensor id or timestamp, or that fail ``validate_reading``,
+    are counted in ``invalid`` and skipped. Each reading carries its epoch
+    time under ``_at``.
+    """
+
+    def __init__(self, path: str, fmt: Optional[str] = None, chunk_rows: int = 5000):
+        self.path = path
+        self.format = fmt or detect_format(path)
+        if self.format == "parquet" and pq is None:
+            raise ValueError("Reading Parquet archives needs pyarrow")
+        self.chunk_rows = chunk_rows
+        self.rows = 0
+        self.invalid = 0
+
+    def chunks(self) -> Iterator[List[dict]]:
+        chunk = []
+        for row in getattr(self, f"_{self.format}_rows")():
+            reading = self._reading(row)
+            if reading is None:
+                continue
+            chunk.append(reading)
+            if len(chunk) >= self.chunk_rows:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _reading(self, row) -> Optional[dict]:
+        self.rows += 1
+        try:
+            if not isinstance(row, dict):
+                raise ValueError("row is not an object")
+            reading = {key: value for key, value in row.items()
+                       if value is not None and value != "" and key not in _DROPPED}
+            if "sensor_id" not in reading or "timestamp" not in reading:
+                raise ValueError("missing sensor_id or timestamp")
+            validate_reading(reading)
+            reading["_at"] = to_epoch(reading["timestamp"])
+            return reading
+        except (TypeError, ValueError, OverflowError):
+            self.invalid += 1
+            return None
+
+    def _ndjson_rows(self):
+        if self.path.endswith(".gz"):
+            with gzip.open(self.path, "rb") as lines:
+                yield from self._parse(lines)
+            return
+        with open(self.path, "rb") as archive:
+            if os.fstat(archive.fileno()).st_size == 0:
+                return
+            with mmap.mmap(archive.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                start, size = 0, len(view)
+                while start < size:
+                    end = view.rfind(b"\n", start, min(start + _BLOCK, size))
+                    end = size if end < 0 or start + _BLOCK >= size else end + 1
+                    yield from self._parse(view[start:end].splitlines())
+                    start = end
+
+    def _parse(self, lines):
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield loads(line)
+            except ValueError:
+                yield None
+
+    def _csv_rows(self):
+        opener = gzip.open if self.path.endswith(".gz") else open
+        with opener(self.path, "rt", newline="", encoding="utf-8") as archive:
+            yield from csv.DictReader(archive)
+
+    def _parquet_rows(self):
+        for batch in pq.ParquetFile(self.path).iter_batches(batch_size=self.chunk_rows):
+            yield from batch.to_pylist()
+
+class Pacer:
+    """Holds rows back until their archive time, scaled by ``speed``, has elapsed (None: no pacing)"""
+
+    def __init__(self, speed: Optional[float]):
+        self.speed = speed
+        self._origin: Optional[float] = None
+        self._started = 0.0
+        self._wall = 0.0
+
+    def due(self, at: float) -> float:
+        """Wall-clock time at which a row from ``at`` should be replayed"""
+        if self._origin is None:
+            self._origin, self._started, self._wall = at, time.monotonic(), time.time()
+        if self.speed is None:
+            return time.time()
+        return self._wall + (at - self._origin) / self.speed
+
+    def delay(self, due: float) -> float:
+        if self.speed is None:
+            return 0.0
+        return self._started + (due - self._wall) - time.monotonic()
+
+def _reading(row: dict, retime: Optional[float]) -> dict:
+    reading = {key: value for key, value in row.items() if key != "_at"}
+    if retime is not None:
+        reading["timestamp"] = datetime.fromtimestamp(retime).isoformat()
+    return reading
+
+class BackplaneTarget:
+    name = "backplane"
+
+    def __init__(self, path: str, persist: bool = False):
+        self.publisher = BackplanePublisher(path)
+        self.persist = persist
+
+    async def start(self):
+        try:
+            await self.publisher.connect()
+        except OSError as e:
+            raise RuntimeError(f"No backplane at {self.publisher.path} ({e}); "
+                               "is the server running with BACKPLANE=socket?")
+
+    async def send(self, readings: List[dict]):
+        for reading in readings:
+            self.publisher.publish(REPLAYED, {**reading, "persist": True} if self.persist else reading)
+        await self.publisher.drain()
+
+    async def stop(self):
+        await self.publisher.close()
+
+    def get_stats(self) -> dict:
+        return {"published": self.publisher.published}
+
+class MqttTarget:
+    name = "mqtt"
+
+    def __init__(self, host: str, port: int, max_queued: int = 10000):
+        self.host = host
+        self.port = port
+        self.client = mqtt.Client(client_id=f"airsense-replay-{os.getpid()}")
+        self.client.max_queued_messages_set(max_queued)
+        self._last: Optional[mqtt.MQTTMessageInfo] = None
+        self.published = 0
+
+    async def start(self):
+        self.client.connect(self.host, self.port, 60)
+        self.client.loop_start()
+
+    async def send(self, readings: List[dict]):
+        for reading in readings:
+            payload = {key: value for key, value in reading.items() if key not in ("sensor_id", "timestamp")}
+            topic = f"airsense/sensors/{reading['sensor_id']}/air_quality"
+            # Wait for the network thread when its queue is full
+            while True:
+                info = self.client.publish(topic, dumps(payload))
+                if info.rc != mqtt.MQTT_ERR_QUEUE_SIZE:
+                    break
+                await asyncio.sleep(0.005)
+            self._last = info
+            self.published += 1
+
+    async def stop(self):
+        if self._last is not None:
+            # Messages are sent in order, so the last one out means all are
+            await asyncio.to_thread(self._last.wait_for_publish, 30)
+        self.client.loop_stop()
+        self.client.disconnect()
+
+    def get_stats(self) -> dict:
+        return {"published": self.published}
+
+class DatabaseTarget:
+    name = "database"
+
+    def __init__(self, batch_size: int, spool_path: Optional[str]):
+        self.buffer = WriteBehindBuffer(get_supabase_client, table="air_quality_data", batch_size=batch_size,
+                                        spool_path=spool_path, row_builder=air_quality_row)
+
+    async def start(self):
+        if get_supabase_client() is None:
+            raise RuntimeError("Database not available")
+        await self.buffer.start()
+
+    async def send(self, readings: List[dict]):
+        for reading in fill_missing_aqi(readings):
+            self.buffer.add(reading)
+        if self.buffer.backlog >= 4 * self.buffer.batch_size:
+            await self.buffer.flush()
+
+    async def stop(self):
+        await self.buffer.stop()
+
+    def get_stats(self) -> dict:
+        stats = self.buffer.get_stats()
+        return {key: stats[key] for key in ("rows_flushed", "rows_skipped", "rows_spooled") if key in stats}
+
+async def replay(paths: List[str], target, fmt: Optional[str] = None, speed: Optional[float] = None,
+                 retime: bool = False, chunk_rows: int = 5000, limit: Optional[int] = None,
+                 report_interval: float = 5.0) -> dict:
+    """Stream every archive in ``paths`` into ``target``; returns the final counts"""
+    pacer = Pacer(speed)
+    sent = invalid = 0
+    started = reported_at = time.perf_counter()
+    reported_rows = 0
+    await target.start()
+    try:
+        for path in paths:
+            reader = ArchiveReader(path, fmt, chunk_rows)
+            print(f"📂 Replaying {path} ({reader.format}) into {target.name}")
+            for chunk in reader.chunks():
+                if limit is not None:
+                    chunk = chunk[:limit - sent]
+                batch = []
+                for row in chunk:
+                    due = pacer.due(row["_at"])
+                    delay = pacer.delay(due)
+                    if delay > 0.001:
+                        if batch:
+                            await target.send(batch)
+                            sent += len(batch)
+                            batch = []
+                        await asyncio.sleep(delay)
+                    batch.append(_reading(row, due if retime else None))
+                if batch:
+                    await target.send(batch)
+                    sent += len(batch)
+                now = time.perf_counter()
+                if now - reported_at >= report_interval:
+                    print(f"📊 {sent:,} rows, {(sent - reported_rows) / (now - reported_at):,.0f} rows/s")
+                    reported_at, reported_rows = now, sent
+                if limit is not None and sent >= limit:
+                    break
+            invalid += reader.invalid
+            if reader.invalid:
+                print(f"⚠️ Skipped {reader.invalid:,} invalid rows in {path}")
+            if limit is not None and sent >= limit:
+                break
+    finally:
+        await target.stop()
+    elapsed = time.perf_counter() - started
+    result = {"rows": sent, "invalid": invalid, "seconds": round(elapsed, 3),
+              "rows_per_second": round(sent / elapsed) if elapsed else None, target.name: target.get_stats()}
+    print(f"✅ Replayed {sent:,} rows in {elapsed:.1f}s ({result['rows_per_second']:,} rows/s) into {target.name}")
+    return result
+
+def _speed(value: str) -> Optional[float]:
+    if value == "max":
+        return None
+    speed = float(value)
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be positive or 'max'")
+    return speed
+
+def _limit(value: str) -> int:
+    limit = int(value)
+    if limit < 0:
+        raise argparse.ArgumentTypeError("limit must not be negative")
+    return limit
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Replay or bulk-load archived AirSense readings")
+    parser.add_argument("paths", nargs="+", help="NDJSON, CSV or Parquet archives (.gz for NDJSON/CSV)")
+    parser.add_argument("--format", choices=FORMATS, help="archive format (default: from the file extension)")
+    parser.add_argument("--to", choices=("backplane", "mqtt", "database"), default="backplane")
+    parser.add_argument("--speed", type=_speed, default=None, help="replay speed factor, or 'max' (default)")
+    parser.add_argument("--retime", action="store_true", help="stamp readings with the time they are replayed")
+    parser.add_argument("--persist", action="store_true",
+                        help="have the leader persist replayed readings (backplane target)")
+    parser.add_argument("--limit", type=_limit, help="stop after this many rows")
+    parser.add_argument("--chunk-rows", type=int, default=5000)
+    parser.add_argument("--report-interval", type=float, default=5.0)
+    parser.add_argument("--socket", default=os.getenv("BACKPLANE_SOCKET", "/tmp/airsense-backplane.sock"))
+    parser.add_argument("--broker-host", default=os.getenv("MQTT_BROKER_HOST", "localhost"))
+    parser.add_argument("--broker-port", type=int, default=int(os.getenv("MQTT_BROKER_PORT", "1883")))
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("PERSIST_BATCH_SIZE", "1000")),
+                        help="rows per bulk insert (database target)")
+    parser.add_argument("--spool", default="spool/replay_air_quality_data.ndjson",
+                        help="where rows that can't be inserted are spooled (database target)")
+    args = parser.parse_args(argv)
+
+    if args.to == "backplane":
+        target = BackplaneTarget(args.socket, persist=args.persist)
+    elif args.to == "mqtt":
+        target = MqttTarget(args.broker_host, args.broker_port)
+    else:
+        target = DatabaseTarget(args.batch_size, args.spool)
+    try:
+        asyncio.run(replay(args.paths, target, args.format, args.speed, args.retime,
+                           args.chunk_rows, args.limit, args.report_interval))
+    except (RuntimeError, ValueError, OSError) as e:
+        parser.exit(1, f"❌ {e}\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from timeseries import METRICS, SensorRingBuffer, to_epoch
+
+# Rollup tiers: name -> (bucket seconds, closed buckets kept in memory)
+TIERS = {
+    "1m": (60, 1440),
+    "1h": (3600, 24 * 30),
+    "1d": (86400, 365),
+}
+
+# Per-metric moments kept for every bucket, in row order
+STATS = ("count", "sum", "min", "max", "sum_sq")
+_COUNT, _SUM, _MIN, _MAX, _SUM_SQ = range(len(STATS))
+
+# Aggregates that can be answered from moments alone (p95 needs raw readings)
+ROLLUP_AGGREGATES = ("mean", "min", "max", "count")
+
+def _empty_stats() -> np.ndarray:
+    stats = np.zeros((len(STATS), len(METRICS)))
+    stats[_MIN] = np.inf
+    stats[_MAX] = -np.inf
+    return stats
+
+class RollupSeries:
+    """One sensor's rollups for one tier: the open bucket plus a ring of closed ones"""
+
+    __slots__ = ("seconds", "open_start", "open_stats", "closed")
+
+    def __init__(self, seconds: int, retention: int):
+        self.seconds = seconds
+        self.open_start: Optional[float] = None
+        self.open_stats = _empty_stats()
+        self.closed = SensorRingBuffer(retention, width=len(STATS) * len(METRICS))
+
+    def add(self, timestamp: float, values: np.ndarray, present: np.ndarray) -> Optional[Tuple[float, np.ndarray]]:
+        """Fold a reading into its bucket; returns the bucket it closed, if any"""
+        start = (timestamp // self.seconds) * self.seconds
+        closed = None
+        if self.open_start is None:
+            self.open_start = start
+        elif start > self.open_start:
+            closed = self.close()
+            self.open_start = start
+        elif start < self.open_start:
+            # Late reading for an already-closed bucket
+            return None
+
+        stats = self.open_stats
+        stats[_COUNT] += present
+        filled = np.where(present, values, 0.0)
+        stats[_SUM] += filled
+        stats[_SUM_SQ] += filled * filled
+        np.fmin(stats[_MIN], values, out=stats[_MIN])
+        np.fmax(stats[_MAX], values, out=stats[_MAX])
+        return closed
+
+    def close(self) -> Optional[Tuple[float, np.ndarray]]:
+        """Move the open bucket into the closed ring"""
+        if self.open_start is None or not self.open_stats[_COUNT].any():
+            return None
+        bucket = (self.open_start, self.open_stats)
+        self.closed.append(self.open_start, self.open_stats.ravel())
+        self.open_stats = _empty_stats()
+        return bucket
+
+    @property
+    def first_start(self) -> Optional[float]:
+        """Start of the oldest bucket still held"""
+        starts, _ = self.closed.range(-np.inf, np.inf, 1)
+        return float(starts[0]) if len(starts) else self.open_start
+
+    def range(self, start: float, end: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Bucket starts and (n, len(STATS), len(METRICS)) moments within [start, end]"""
+        starts, flat = self.closed.range(start, end)
+        stats = flat.reshape(-1, len(STATS), len(METRICS))
+        if self.open_start is not None and start <= self.open_start <= end and self.open_stats[_COUNT].any():
+            starts = np.append(starts, self.open_start)
+            stats = np.concatenate([stats, self.open_stats[None]])
+        return starts, stats
+
+class RollupStore:
+    """Count/sum/min/max/sum-of-squares per sensor and tier, updated at ingest.
+
+    ``on_close`` receives one row per metric for every bucket that closes,
+    ready to be persisted to the ``air_quality_rollups`` table.
+    """
+
+    def __init__(self, tiers: Dict[str, Tuple[int, int]] = TIERS,
+                 on_close: Optional[Callable[[dict], object]] = None):
+        self.tiers = tiers
+        self.on_close = on_close
+        self.series: Dict[str, Dict[str, RollupSeries]] = {}
+        self.buckets_closed = 0
+
+    def add(self, data: dict):
+        """Fold a reading into every tier"""
+        sensor_id = data.get("sensor_id")
+        if sensor_id is None:
+            return
+        try:
+            timestamp = to_epoch(data.get("timestamp"))
+        except (TypeError, ValueError):
+            return
+        values = np.array([np.nan if data.get(m) is None else data.get(m) for m in METRICS], dtype=np.float64)
+        present = ~np.isnan(values)
+        if not present.any():
+            return
+
+        tiers = self.series.get(sensor_id)
+        if tiers is None:
+            tiers = self.series[sensor_id] = {
+                name: RollupSeries(seconds, retention) for name, (seconds, retention) in self.tiers.items()
+            }
+        for name, series in tiers.items():
+            closed = series.add(timestamp, values, present)
+            if closed is not None:
+                self._emit(sensor_id, name, *closed)
+
+    def flush_open(self):
+        """Close every open bucket, e.g. at shutdown"""
+        for sensor_id, tiers in self.series.items():
+            for name, series in tiers.items():
+                closed = series.close()
+                if closed is not None:
+                    self._emit(sensor_id, name, *closed)
+
+    def _emit(self, sensor_id: str, tier: str, start: float, stats: np.ndarray):
+        self.buckets_closed += 1
+        if self.on_close is None:
+            return
+        bucket_start = datetime.fromtimestamp(start).isoformat()
+        for column, metric in enumerate(METRICS):
+            count = int(stats[_COUNT, column])
+            if not count:
+                continue
+            self.on_close({
+                "sensor_id": sensor_id,
+                "tier": tier,
+                "bucket_start": bucket_start,
+                "metric": metric,
+                "count": count,
+                "sum": float(stats[_SUM, column]),
+                "min": float(stats[_MIN, column]),
+                "max": float(stats[_MAX, column]),
+                "sum_sq": float(stats[_SUM_SQ, column])
+            })
+
+    def tier_for(self, resolution: int) -> Optional[str]:
+        """Coarsest tier whose bucket size evenly divides ``resolution``"""
+        best = None
+        for name, (seconds, _) in self.tiers.items():
+            if resolution % seconds == 0 and (best is None or seconds > self.tiers[best][0]):
+                best = name
+        return best
+
+    def query(self, sensor_id: str, tier: str, start: float, end: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Rollup buckets for one sensor and tier"""
+        series = self.series.get(sensor_id, {}).get(tier)
+        if series is None:
+            return np.empty(0), np.empty((0, len(STATS), len(METRICS)))
+        return series.range(start, end)
+
+    def coverage_start(self, sensor_id: str, tier: str) -> Optional[float]:
+        """Start of the oldest in-memory bucket for a sensor and tier; older buckets
+        are only in the database"""
+        series = self.series.get(sensor_id, {}).get(tier)
+        return None if series is None else series.first_start
+
+    def retention_seconds(self, tier: str) -> int:
+        """How far back a tier's in-memory buckets reach"""
+        seconds, retention = self.tiers[tier]
+        return seconds * retention
+
+    def __contains__(self, sensor_id: str) -> bool:
+        return sensor_id in self.series
+
+    def get_stats(self) -> dict:
+        """Report rollup coverage"""
+        return {
+            "sensors": len(self.series),
+            "tiers": list(self.tiers),
+            "buckets_closed": self.buckets_closed
+        }
+
+def rollup_arrays(rows: List[dict]) -> Tuple[np.ndarray, np.ndarray]:
+    """Bucket starts and moments from ``air_quality_rollups`` rows, as ``RollupStore.query`` returns them"""
+    buckets: Dict[float, np.ndarray] = {}
+    for row in rows:
+        if row.get("metric") not in METRICS:
+            continue
+        start = to_epoch(row["bucket_start"])
+        stats = buckets.get(start)
+        if stats is None:
+            stats = buckets[start] = _empty_stats()
+        stats[:, METRICS.index(row["metric"])] = [row[stat] for stat in STATS]
+    starts = sorted(buckets)
+    if not starts:
+        return np.empty(0), np.empty((0, len(STATS), len(METRICS)))
+    return np.array(starts), np.stack([buckets[start] for start in starts])
+
+def aggregate_rollups(starts: np.ndarray, stats: np.ndarray, resolution: int, agg: str = "mean") -> List[dict]:
+    """Merge rollup buckets into ``resolution``-sized buckets as API records"""
+    if agg not in ROLLUP_AGGREGATES:
+        raise ValueError(f"Aggregate {agg} is not available from rollups")
+    if not len(starts):
+        return []
+    buckets = (starts // resolution) * resolution
+    frames = {
+        stat: pd.DataFrame(stats[:, i, :], columns=list(METRICS)).groupby(buckets, sort=True)
+        for i, stat in enumerate(STATS) if stat != "sum_sq"
+    }
+    counts = frames["count"].sum()
+    if agg == "mean":
+        result = frames["sum"].sum() / counts.where(counts > 0)
+    elif agg == "min":
+        result = frames["min"].min().replace(np.inf, np.nan)
+    elif agg == "max":
+        result = frames["max"].max().replace(-np.inf, np.nan)
+    else:
+        result = counts
+
+    records = []
+    rows = counts.max(axis=1).tolist()
+    values = result.to_numpy().tolist()
+    for i, bucket in enumerate(result.index.tolist()):
+        record = {"timestamp": datetime.fromtimestamp(float(bucket)).isoformat(), "count": int(rows[i])}
+        if agg != "count":
+            for metric, value in zip(METRICS, values[i]):
+                record[metric] = None if value != value else value
+        records.append(record)
+    return records
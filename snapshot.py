@@ -0,0 +1,133 @@
+import gzip
+import hashlib
+import json
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Callable, Dict, Optional
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional encoding
+    brotli = None
+
+def dumps(value) -> bytes:
+    """Serialize to JSON bytes, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(value, default=str, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(value, default=str, separators=(",", ":")).encode()
+
+def loads(data):
+    """Parse JSON bytes or text, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+def supported_encodings() -> tuple:
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick br or gzip from an Accept-Encoding header, honouring q=0"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, *params = part.split(";")
+        quality = 1.0
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in supported_encodings():
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+class Snapshot:
+    """One serialized version of a payload; compressed variants are built on first use"""
+
+    __slots__ = ("version", "body", "etag", "last_modified", "modified_at", "_encoded")
+
+    def __init__(self, version: int, body: bytes, modified_at: float):
+        self.version = version
+        self.body = body
+        self.etag = f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+        self.modified_at = int(modified_at)
+        self.last_modified = formatdate(self.modified_at, usegmt=True)
+        self._encoded: Dict[str, bytes] = {}
+
+    def encoded(self, encoding: Optional[str]) -> bytes:
+        if encoding is None:
+            return self.body
+        payload = self._encoded.get(encoding)
+        if payload is None:
+            payload = self._encoded[encoding] = _compress(self.body, encoding)
+        return payload
+
+    def not_modified(self, if_none_match: Optional[str], if_modified_since: Optional[str]) -> bool:
+        """Conditional GET check; If-None-Match wins over If-Modified-Since"""
+        if if_none_match:
+            if if_none_match.strip() == "*":
+                return True
+            tags = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+            return self.etag in tags
+        if if_modified_since:
+            try:
+                return int(parsedate_to_datetime(if_modified_since).timestamp()) >= self.modified_at
+            except (TypeError, ValueError):
+                return False
+        return False
+
+class SnapshotCache:
+    """Serialize ``build()`` once per change instead of once per request.
+
+    Writers call ``mark_changed()`` (O(1)); the next ``get()`` rebuilds the
+    bytes, ETag and Last-Modified, and every later ``get()`` until the next
+    change returns the same ``Snapshot``.
+    """
+
+    def __init__(self, build: Callable[[], object], clock: Callable[[], float] = time.time):
+        self.build = build
+        self.clock = clock
+        self.version = 0
+        self.changed_at = clock()
+        self._snapshot: Optional[Snapshot] = None
+        self.builds = 0
+        self.hits = 0
+        self.not_modified = 0
+
+    def mark_changed(self):
+        self.version += 1
+        self.changed_at = self.clock()
+
+    def get(self) -> Snapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == self.version:
+            self.hits += 1
+            return snapshot
+        self.builds += 1
+        snapshot = self._snapshot = Snapshot(self.version, dumps(self.build()), self.changed_at)
+        return snapshot
+
+    def get_stats(self) -> dict:
+        """Report version, rebuilds, cache hits and 304s"""
+        return {
+            "version": self.version,
+            "builds": self.builds,
+            "hits": self.hits,
+            "not_modified": self.not_modified,
+            "bytes": len(self._snapshot.body) if self._snapshot else 0,
+            "encodings": list(supported_encodings()),
+            "serializer": "orjson" if orjson is not None else "json"
+        }
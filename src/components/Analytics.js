@@ -3,13 +3,52 @@ import { motion } from 'framer-motion';
 import { BarChart3, TrendingUp, TrendingDown, Activity, Thermometer, Droplets, Wind, Download } from 'lucide-react';
 import ChartComponent from './ChartComponent';
 import { exportService } from '../services/export';
+import { ApiService } from '../services/api';
 
 const Analytics = ({ sensorData, alerts = [] }) => {
   const [timeRange, setTimeRange] = useState('24h');
   const [analyticsData, setAnalyticsData] = useState({});
   const [chartData, setChartData] = useState(null);
+  const [serverAnalytics, setServerAnalytics] = useState(null);
 
   useEffect(() => {
+    // Fleet statistics computed by the API; falls back to live data if unavailable
+    let cancelled = false;
+    ApiService.getAnalytics(timeRange)
+      .then((result) => { if (!cancelled) setServerAnalytics(result); })
+      .catch(() => { if (!cancelled) setServerAnalytics(null); });
+    return () => { cancelled = true; };
+  }, [timeRange]);
+
+  useEffect(() => {
+    const fleetMean = serverAnalytics?.fleet?.mean;
+    if (fleetMean && fleetMean.pm25 != null) {
+      const avgPM25 = fleetMean.pm25;
+      setAnalyticsData({
+        avgPM25: avgPM25.toFixed(1),
+        avgTemp: (fleetMean.temperature ?? 0).toFixed(1),
+        avgHumidity: (fleetMean.humidity ?? 0).toFixed(1),
+        avgCO2: (fleetMean.co2 ?? 0).toFixed(0),
+        trend: avgPM25 > 20 ? 'up' : 'down',
+        healthScore: avgPM25 <= 12 ? 95 : avgPM25 <= 35 ? 75 : avgPM25 <= 55 ? 50 : 25,
+        p95PM25: serverAnalytics.fleet.p95?.pm25,
+        exceedanceHours: serverAnalytics.fleet.exceedance_hours
+      });
+      const series = serverAnalytics.series || [];
+      setChartData(buildChartData(
+        series.map((point) => new Date(point.timestamp).toLocaleTimeString('en-US', {
+          hour: '2-digit',
+          minute: '2-digit',
+          hour12: false
+        })),
+        series.map((point) => point.pm25),
+        series.map((point) => point.temperature),
+        series.map((point) => point.humidity),
+        series.map((point) => point.co2)
+      ));
+      return;
+    }
+
     // Generate analytics data from current sensor data
     if (sensorData) {
       const sensors = Object.values(sensorData);
@@ -32,7 +71,7 @@ const Analytics = ({ sensorData, alerts = [] }) => {
         generateChartData(sensors, timeRange);
       }
     }
-  }, [sensorData, timeRange]);
+  }, [sensorData, timeRange, serverAnalytics]);
 
   const generateChartData = (sensors, range) => {
     const hours = range === '1h' ? 1 : range === '24h' ? 24 : 168; // 7 days
@@ -69,7 +108,11 @@ const Analytics = ({ sensorData, alerts = [] }) => {
       co2Data.push(Number((baseCO2 + baseCO2 * variation * 0.15).toFixed(0)));
     }
     
-    setChartData({
+    setChartData(buildChartData(labels, pm25Data, tempData, humidityData, co2Data));
+  };
+
+  const buildChartData = (labels, pm25Data, tempData, humidityData, co2Data) => {
+    return {
       labels,
       datasets: [
         {
@@ -105,7 +148,7 @@ const Analytics = ({ sensorData, alerts = [] }) => {
           tension: 0.4
         }
       ]
-    });
+    };
   };
 
   const getHealthScoreColor = (score) => {
@@ -132,6 +175,11 @@ const Analytics = ({ sensorData, alerts = [] }) => {
     exportService.exportAnalytics(analyticsExport);
   };
 
+  const handleExportReadings = () => {
+    const hours = timeRange === '1h' ? 1 : timeRange === '24h' ? 24 : 168;
+    exportService.downloadHistorical({ format: 'csv', hours });
+  };
+
   const handleExportFullReport = () => {
     exportService.generateReport(sensorData, alerts, {
       timestamp: new Date().toISOString(),
@@ -182,6 +230,14 @@ const Analytics = ({ sensorData, alerts = [] }) => {
                   <Download className="w-4 h-4" />
                   Export CSV
                 </button>
+                <button 
+                  className="export-btn"
+                  onClick={handleExportReadings}
+                  title="Export every reading in the selected range"
+                >
+                  <Download className="w-4 h-4" />
+                  Raw Readings
+                </button>
                 <button 
                   className="export-btn"
                   onClick={handleExportFullReport}
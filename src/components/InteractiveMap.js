@@ -1,5 +1,12 @@
 import React, { useEffect, useState } from 'react';
 import { motion } from 'framer-motion';
+import { ApiService } from '../services/api';
+
+const DEFAULT_STATIONS = [
+  { id: "sensor_001", name: "Downtown Station", location: "Toronto, ON", coordinates: [43.6532, -79.3832], status: "online" },
+  { id: "sensor_002", name: "Suburban Station", location: "Mississauga, ON", coordinates: [43.5890, -79.6441], status: "online" },
+  { id: "sensor_003", name: "Industrial Station", location: "Brampton, ON", coordinates: [43.6834, -79.7663], status: "online" }
+];
 
 const InteractiveMap = ({ sensorData }) => {
   const [mapLoaded, setMapLoaded] = useState(false);
@@ -32,47 +39,32 @@ const InteractiveMap = ({ sensorData }) => {
     loadMap();
   }, []);
 
-  const sensors = [
-    {
-      id: "sensor_001",
-      name: "Downtown Station",
-      location: "Toronto, ON",
-      coordinates: [43.6532, -79.3832],
-      aqi: sensorData?.sensor_001?.aqi || 0,
-      pm25: sensorData?.sensor_001?.pm25 || 0,
-      pm10: sensorData?.sensor_001?.pm10 || 0,
-      temperature: sensorData?.sensor_001?.temperature || 0,
-      humidity: sensorData?.sensor_001?.humidity || 0,
-      co2: sensorData?.sensor_001?.co2 || 0,
-      status: "online"
-    },
-    {
-      id: "sensor_002", 
-      name: "Suburban Station",
-      location: "Mississauga, ON",
-      coordinates: [43.5890, -79.6441],
-      aqi: sensorData?.sensor_002?.aqi || 0,
-      pm25: sensorData?.sensor_002?.pm25 || 0,
-      pm10: sensorData?.sensor_002?.pm10 || 0,
-      temperature: sensorData?.sensor_002?.temperature || 0,
-      humidity: sensorData?.sensor_002?.humidity || 0,
-      co2: sensorData?.sensor_002?.co2 || 0,
-      status: "online"
-    },
-    {
-      id: "sensor_003",
-      name: "Industrial Station", 
-      location: "Brampton, ON",
-      coordinates: [43.6834, -79.7663],
-      aqi: sensorData?.sensor_003?.aqi || 0,
-      pm25: sensorData?.sensor_003?.pm25 || 0,
-      pm10: sensorData?.sensor_003?.pm10 || 0,
-      temperature: sensorData?.sensor_003?.temperature || 0,
-      humidity: sensorData?.sensor_003?.humidity || 0,
-      co2: sensorData?.sensor_003?.co2 || 0,
-      status: "online"
-    }
-  ];
+  // Metadata comes from /api/sensors; the browser revalidates it with its ETag,
+  // so an unchanged registry costs a 304 rather than a re-download
+  const [stations, setStations] = useState(DEFAULT_STATIONS);
+
+  useEffect(() => {
+    ApiService.getSensors()
+      .then((data) => {
+        if (data?.sensors?.length) setStations(data.sensors);
+      })
+      .catch(() => {
+        // Keep the built-in stations
+      });
+  }, []);
+
+  const sensors = stations.map((station) => {
+    const reading = sensorData?.[station.id];
+    return {
+      ...station,
+      aqi: reading?.aqi || 0,
+      pm25: reading?.pm25 || 0,
+      pm10: reading?.pm10 || 0,
+      temperature: reading?.temperature || 0,
+      humidity: reading?.humidity || 0,
+      co2: reading?.co2 || 0
+    };
+  });
 
   const getAQIColor = (aqi) => {
     if (aqi <= 50) return "#10b981"; // Green
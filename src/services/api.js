@@ -48,9 +48,10 @@ export const ApiService = {
   },
 
   // Get all sensors
-  async getSensors() {
+  // params: { bbox: 'minLat,minLon,maxLat,maxLon', near: 'lat,lon', radius_km, offset, limit }
+  async getSensors(params = {}) {
     try {
-      const response = await apiClient.get('/api/sensors');
+      const response = await apiClient.get('/api/sensors', { params });
       return response.data;
     } catch (error) {
       console.error('Failed to fetch sensors:', error);
@@ -70,9 +71,12 @@ export const ApiService = {
   },
 
   // Get historical data
-  async getHistoricalData(sensorId, hours = 24) {
+  // options: { resolution: '5m' | '1h' | ..., agg: 'mean' | 'min' | 'max' | 'p95' | 'count' | 'all' | 'lttb', points }
+  async getHistoricalData(sensorId, hours = 24, options = {}) {
     try {
-      const response = await apiClient.get(`/api/data/historical?sensor_id=${sensorId}&hours=${hours}`);
+      const response = await apiClient.get('/api/data/historical', {
+        params: { sensor_id: sensorId, hours, ...options }
+      });
       return response.data;
     } catch (error) {
       console.error('Failed to fetch historical data:', error);
@@ -135,10 +139,18 @@ export const ApiService = {
     }
   },
 
-  // Get air quality forecast
-  async getForecast(location) {
+  // URL of a server-side streaming export (format: csv, ndjson or parquet)
+  getExportUrl(params = {}) {
+    const query = new URLSearchParams(
+      Object.entries(params).filter(([, value]) => value !== undefined && value !== null && value !== '')
+    );
+    return `${API_BASE_URL}/api/export?${query.toString()}`;
+  },
+
+  // Get air quality forecast (location: sensor id, location name or 'lat,lon')
+  async getForecast(location, horizon = '1h') {
     try {
-      const response = await apiClient.get(`/api/forecast?location=${location}`);
+      const response = await apiClient.get('/api/forecast', { params: { location, horizon } });
       return response.data;
     } catch (error) {
       console.error('Failed to fetch forecast:', error);
@@ -1,4 +1,5 @@
 import { notificationService } from './notifications';
+import { ApiService } from './api';
 
 class ExportService {
   exportToCSV(data, filename = 'airsense-data') {
@@ -99,6 +100,22 @@ class ExportService {
     return [csvHeader, ...csvRows].join('\n');
   }
 
+  // Download historical data streamed by the server, so months of readings
+  // never have to be held in the browser
+  downloadHistorical({ format = 'csv', hours = 24, sensorIds = [], cursor } = {}) {
+    const link = document.createElement('a');
+    link.setAttribute('href', ApiService.getExportUrl({
+      format,
+      hours,
+      sensor_id: sensorIds.join(','),
+      cursor
+    }));
+    link.style.visibility = 'hidden';
+    document.body.appendChild(link);
+    link.click();
+    document.body.removeChild(link);
+  }
+
   exportSensorData(sensorData) {
     const exportData = Object.entries(sensorData).map(([sensorId, data]) => ({
       sensor_id: sensorId,
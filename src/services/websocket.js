@@ -1,5 +1,20 @@
 import { clientDataGenerator } from './clientDataGenerator';
 
+// Columnar sensor frames (see frames.py): 28-byte little-endian header, then
+// uint32 sensor indices, int32 ms offsets from the frame time and one float32
+// column per metric
+const COLUMNAR_MAGIC = 'ASC1';
+const COLUMNAR_HEADER_BYTES = 28;
+const COLUMNAR_TYPES = ['sensor_data', 'sensor_update'];
+const NO_TIMESTAMP = -2147483648;
+// First byte of a zlib stream; shared-deflate frames are sent this way
+const ZLIB_HEADER = 0x78;
+
+async function inflate(buffer) {
+  const stream = new Blob([buffer]).stream().pipeThrough(new DecompressionStream('deflate'));
+  return new Response(stream).arrayBuffer();
+}
+
 class WebSocketService {
   constructor() {
     this.socket = null;
@@ -13,6 +28,16 @@ class WebSocketService {
     };
     this.clientDataGenerator = null;
     this.isClientMode = false;
+    this.lastSeq = null;
+    this.isFiltered = false;
+    // 'json' or 'columnar' (binary frames, several times smaller for large deployments)
+    this.encoding = process.env.REACT_APP_WS_ENCODING === 'columnar' ? 'columnar' : 'json';
+    this.sensorIds = [];
+    this.metrics = [];
+    // Shared zlib compression of large frames, decoded with DecompressionStream
+    this.compression = process.env.REACT_APP_WS_COMPRESSION === 'deflate' &&
+      typeof DecompressionStream !== 'undefined';
+    this.inbound = Promise.resolve();
   }
 
   async connect() {
@@ -32,7 +57,13 @@ class WebSocketService {
           }
         }, 5000); // 5 second timeout
 
-        this.socket = new WebSocket(wsUrl);
+        const params = new URLSearchParams();
+        if (this.encoding !== 'json') params.set('encoding', this.encoding);
+        if (this.compression) params.set('compression', 'deflate');
+        const query = params.toString();
+        this.socket = new WebSocket(query ? `${wsUrl}?${query}` : wsUrl);
+        this.socket.binaryType = 'arraybuffer';
+        this.sensorIds = [];
 
         this.socket.onopen = () => {
           clearTimeout(connectionTimeout);
@@ -44,12 +75,17 @@ class WebSocketService {
         };
 
         this.socket.onmessage = (event) => {
-          try {
-            const data = JSON.parse(event.data);
-            this.handleMessage(data);
-          } catch (error) {
-            console.error('Failed to parse WebSocket message:', error);
-          }
+          // Inflating is asynchronous, so chain frames to keep them in order
+          this.inbound = this.inbound
+            .then(() => this.decodeFrame(event.data))
+            .then((data) => {
+              if (data) {
+                this.handleMessage(data);
+              }
+            })
+            .catch((error) => {
+              console.error('Failed to parse WebSocket message:', error);
+            });
         };
 
         this.socket.onclose = () => {
@@ -78,17 +114,108 @@ class WebSocketService {
     });
   }
 
+  async decodeFrame(payload) {
+    if (typeof payload === 'string') {
+      return JSON.parse(payload);
+    }
+    let buffer = payload;
+    if (new Uint8Array(buffer, 0, 1)[0] === ZLIB_HEADER) {
+      buffer = await inflate(buffer);
+    }
+    const magic = String.fromCharCode(...new Uint8Array(buffer, 0, Math.min(4, buffer.byteLength)));
+    if (magic === COLUMNAR_MAGIC) {
+      return this.decodeColumnar(buffer);
+    }
+    // Compressed JSON text
+    return JSON.parse(new TextDecoder().decode(buffer));
+  }
+
+  decodeColumnar(buffer) {
+    const view = new DataView(buffer);
+    const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+    if (magic !== COLUMNAR_MAGIC) {
+      throw new Error('Unknown binary frame');
+    }
+    const metricCount = view.getUint8(5);
+    const seq = view.getUint32(8, true);
+    const dictionarySize = view.getUint32(12, true);
+    const frameTime = view.getFloat64(16, true) * 1000;
+    const count = view.getUint32(24, true);
+    if (dictionarySize > this.sensorIds.length) {
+      // Missed a sensor_dictionary update
+      this.send({ type: 'resync' });
+      return null;
+    }
+
+    const indices = new Uint32Array(buffer, COLUMNAR_HEADER_BYTES, count);
+    const offsets = new Int32Array(buffer, COLUMNAR_HEADER_BYTES + 4 * count, count);
+    const values = new Float32Array(buffer, COLUMNAR_HEADER_BYTES + 8 * count, count * metricCount);
+    const data = {};
+    for (let i = 0; i < count; i++) {
+      const sensorId = this.sensorIds[indices[i]];
+      const reading = { sensor_id: sensorId };
+      for (let m = 0; m < metricCount; m++) {
+        const value = values[m * count + i];
+        if (!Number.isNaN(value)) {
+          reading[this.metrics[m]] = value;
+        }
+      }
+      if (offsets[i] !== NO_TIMESTAMP) {
+        reading.timestamp = new Date(frameTime + offsets[i]).toISOString();
+      }
+      data[sensorId] = reading;
+    }
+    return { type: COLUMNAR_TYPES[view.getUint8(4)], seq, data };
+  }
+
   handleMessage(data) {
     switch (data.type) {
+      case 'connection':
+        this.metrics = data.metrics || [];
+        break;
+      case 'sensor_dictionary':
+        // Columnar frames refer to sensors by index into this list
+        if (data.offset === 0) {
+          this.sensorIds = data.ids;
+        } else if (data.offset === this.sensorIds.length) {
+          this.sensorIds = this.sensorIds.concat(data.ids);
+        } else {
+          this.send({ type: 'resync' });
+        }
+        break;
       case 'sensor_data':
+        // Full snapshot: resets the delta sequence
+        if (data.seq !== undefined) {
+          this.lastSeq = data.seq;
+        }
         this.notifySensorData(data.data);
         break;
       case 'sensor_update':
+        // Delta with only the changed sensors
+        if (data.seq !== undefined) {
+          if (this.lastSeq !== null && data.seq <= this.lastSeq) {
+            break; // Already covered by a newer snapshot
+          }
+          // Filtered streams only carry the frames that match, so gaps are expected
+          // and can't be told from lost frames; the server sends every client a
+          // fresh sensor_data snapshot when its queue drops a frame
+          if (!this.isFiltered && this.lastSeq !== null && data.seq > this.lastSeq + 1) {
+            console.warn(`Missed sensor updates (${this.lastSeq} -> ${data.seq}), requesting resync`);
+            this.send({ type: 'resync' });
+          }
+          this.lastSeq = data.seq;
+        }
         this.notifySensorData(data.data);
         break;
       case 'alert':
         this.notifyAlert(data.alert);
         break;
+      case 'subscriptions':
+        this.isFiltered = data.sensor_ids.length > 0 || data.topics.length > 0 || data.bboxes.length > 0;
+        break;
+      case 'error':
+        console.error('WebSocket server error:', data.message);
+        break;
       case 'ping':
         // Respond to ping
         this.send({ type: 'pong', timestamp: new Date().toISOString() });
@@ -242,6 +369,30 @@ class WebSocketService {
     });
   }
 
+  // Subscribe to sensors by MQTT-style wildcard, e.g. 'airsense/sensors/+'
+  subscribeToTopic(topic) {
+    this.send({
+      type: 'subscribe',
+      topic: topic
+    });
+  }
+
+  // Subscribe to sensors inside [minLat, minLon, maxLat, maxLon]
+  subscribeToBounds(bbox) {
+    this.send({
+      type: 'subscribe',
+      bbox: bbox
+    });
+  }
+
+  // Drop all subscriptions and receive every sensor again
+  unsubscribeAll() {
+    this.send({
+      type: 'unsubscribe',
+      all: true
+    });
+  }
+
   // Request historical data
   requestHistoricalData(sensorId, hours = 24) {
     this.send({
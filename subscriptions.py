@@ -0,0 +1,250 @@
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+import math
+
+# Sensors are addressed by this topic when matching MQTT-style wildcard filters
+SENSOR_TOPIC = "airsense/sensors/{sensor_id}"
+
+BBox = Tuple[float, float, float, float]  # (min_lat, min_lon, max_lat, max_lon)
+
+def sensor_topic(sensor_id: str) -> str:
+    """Topic used to match a sensor against wildcard subscriptions"""
+    return SENSOR_TOPIC.format(sensor_id=sensor_id)
+
+def parse_bbox(value) -> BBox:
+    """Validate a [min_lat, min_lon, max_lat, max_lon] bounding box"""
+    if not isinstance(value, (list, tuple)) or len(value) != 4:
+        raise ValueError("bbox must be [min_lat, min_lon, max_lat, max_lon]")
+    min_lat, min_lon, max_lat, max_lon = (float(v) for v in value)
+    if min_lat > max_lat or min_lon > max_lon:
+        raise ValueError("bbox minimums must not exceed maximums")
+    return (min_lat, min_lon, max_lat, max_lon)
+
+def validate_topic_filter(topic_filter: str):
+    """Check MQTT wildcard rules: '+' is a whole level, '#' only as the last level"""
+    levels = topic_filter.split("/")
+    for i, level in enumerate(levels):
+        if "#" in level and (level != "#" or i != len(levels) - 1):
+            raise ValueError(f"Invalid topic filter: {topic_filter}")
+        if "+" in level and level != "+":
+            raise ValueError(f"Invalid topic filter: {topic_filter}")
+
+class _TopicNode:
+    __slots__ = ("children", "subscribers")
+
+    def __init__(self):
+        self.children: Dict[str, "_TopicNode"] = {}
+        self.subscribers: Set[Hashable] = set()
+
+class SubscriptionIndex:
+    """Routes sensor ids to interested clients without scanning every connection.
+
+    Three kinds of subscription are indexed:
+    - exact sensor ids, in a dict of sensor id -> clients
+    - MQTT-style wildcard filters ('+' and '#') over ``airsense/sensors/<id>``,
+      in a topic trie
+    - geographic bounding boxes, in a uniform lat/lon grid of ``cell_size`` degrees
+
+    Lookups are cached per sensor id and the cache is dropped whenever a
+    subscription changes.
+    """
+
+    def __init__(self, coordinates_for: Callable[[str], Optional[Tuple[float, float]]],
+                 cell_size: float = 0.5, max_cells_per_bbox: int = 4096):
+        self.coordinates_for = coordinates_for
+        self.cell_size = cell_size
+        self.max_cells_per_bbox = max_cells_per_bbox
+
+        self._by_sensor: Dict[str, Set[Hashable]] = {}
+        self._topics = _TopicNode()
+        self._grid: Dict[Tuple[int, int], List[Tuple[BBox, Hashable]]] = {}
+        self._wide_bboxes: List[Tuple[BBox, Hashable]] = []
+
+        # Per-client record of what it subscribed to, for unsubscribe and cleanup
+        self._clients: Dict[Hashable, dict] = {}
+        self._cache: Dict[str, frozenset] = {}
+
+    def __contains__(self, client: Hashable) -> bool:
+        return client in self._clients
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def _client_entry(self, client: Hashable) -> dict:
+        entry = self._clients.get(client)
+        if entry is None:
+            entry = {"sensor_ids": set(), "topics": set(), "bboxes": set()}
+            self._clients[client] = entry
+        return entry
+
+    def _prune(self, client: Hashable):
+        entry = self._clients.get(client)
+        if entry is not None and not any(entry.values()):
+            del self._clients[client]
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.cell_size), math.floor(lon / self.cell_size))
+
+    def _bbox_cells(self, bbox: BBox) -> Optional[List[Tuple[int, int]]]:
+        min_row, min_col = self._cell(bbox[0], bbox[1])
+        max_row, max_col = self._cell(bbox[2], bbox[3])
+        if (max_row - min_row + 1) * (max_col - min_col + 1) > self.max_cells_per_bbox:
+            return None
+        return [(row, col) for row in range(min_row, max_row + 1)
+                for col in range(min_col, max_col + 1)]
+
+    # Subscribe / unsubscribe
+
+    def subscribe_sensor(self, client: Hashable, sensor_id: str):
+        self._by_sensor.setdefault(sensor_id, set()).add(client)
+        self._client_entry(client)["sensor_ids"].add(sensor_id)
+        self._cache.clear()
+
+    def unsubscribe_sensor(self, client: Hashable, sensor_id: str):
+        subscribers = self._by_sensor.get(sensor_id)
+        if subscribers is not None:
+            subscribers.discard(client)
+            if not subscribers:
+                del self._by_sensor[sensor_id]
+        if client in self._clients:
+            self._clients[client]["sensor_ids"].discard(sensor_id)
+            self._prune(client)
+        self._cache.clear()
+
+    def subscribe_topic(self, client: Hashable, topic_filter: str):
+        validate_topic_filter(topic_filter)
+        node = self._topics
+        for level in topic_filter.split("/"):
+            node = node.children.setdefault(level, _TopicNode())
+        node.subscribers.add(client)
+        self._client_entry(client)["topics"].add(topic_filter)
+        self._cache.clear()
+
+    def unsubscribe_topic(self, client: Hashable, topic_filter: str):
+        path = [self._topics]
+        for level in topic_filter.split("/"):
+            node = path[-1].children.get(level)
+            if node is None:
+                break
+            path.append(node)
+        else:
+            path[-1].subscribers.discard(client)
+            # Remove empty branches
+            levels = topic_filter.split("/")
+            for depth in range(len(levels), 0, -1):
+                node = path[depth]
+                if node.subscribers or node.children:
+                    break
+                del path[depth - 1].children[levels[depth - 1]]
+        if client in self._clients:
+            self._clients[client]["topics"].discard(topic_filter)
+            self._prune(client)
+        self._cache.clear()
+
+    def subscribe_bbox(self, client: Hashable, bbox: BBox):
+        bbox = parse_bbox(bbox)
+        if bbox in self._client_entry(client)["bboxes"]:
+            # Already indexed; a second copy would outlive the matching unsubscribe
+            return
+        cells = self._bbox_cells(bbox)
+        if cells is None:
+            self._wide_bboxes.append((bbox, client))
+        else:
+            for cell in cells:
+                self._grid.setdefault(cell, []).append((bbox, client))
+        self._client_entry(client)["bboxes"].add(bbox)
+        self._cache.clear()
+
+    def unsubscribe_bbox(self, client: Hashable, bbox: BBox):
+        bbox = parse_bbox(bbox)
+        item = (bbox, client)
+        cells = self._bbox_cells(bbox)
+        if cells is None:
+            if item in self._wide_bboxes:
+                self._wide_bboxes.remove(item)
+        else:
+            for cell in cells:
+                occupants = self._grid.get(cell)
+                if occupants and item in occupants:
+                    occupants.remove(item)
+                    if not occupants:
+                        del self._grid[cell]
+        if client in self._clients:
+            self._clients[client]["bboxes"].discard(bbox)
+            self._prune(client)
+        self._cache.clear()
+
+    def remove_client(self, client: Hashable):
+        """Drop every subscription held by a client"""
+        entry = self._clients.get(client)
+        if entry is None:
+            return
+        for sensor_id in list(entry["sensor_ids"]):
+            self.unsubscribe_sensor(client, sensor_id)
+        for topic_filter in list(entry["topics"]):
+            self.unsubscribe_topic(client, topic_filter)
+        for bbox in list(entry["bboxes"]):
+            self.unsubscribe_bbox(client, bbox)
+        self._clients.pop(client, None)
+        self._cache.clear()
+
+    def get_subscriptions(self, client: Hashable) -> dict:
+        """Describe a client's subscriptions"""
+        entry = self._clients.get(client, {"sensor_ids": set(), "topics": set(), "bboxes": set()})
+        return {
+            "sensor_ids": sorted(entry["sensor_ids"]),
+            "topics": sorted(entry["topics"]),
+            "bboxes": [list(bbox) for bbox in sorted(entry["bboxes"])]
+        }
+
+    # Matching
+
+    def _match_topic(self, node: _TopicNode, levels: List[str], depth: int, out: Set[Hashable]):
+        hash_node = node.children.get("#")
+        if hash_node is not None:
+            out.update(hash_node.subscribers)
+        if depth == len(levels):
+            out.update(node.subscribers)
+            return
+        for key in (levels[depth], "+"):
+            child = node.children.get(key)
+            if child is not None:
+                self._match_topic(child, levels, depth + 1, out)
+
+    def match(self, sensor_id: str) -> frozenset:
+        """Get the clients subscribed to a sensor"""
+        cached = self._cache.get(sensor_id)
+        if cached is not None:
+            return cached
+
+        clients: Set[Hashable] = set(self._by_sensor.get(sensor_id, ()))
+        if self._topics.children:
+            self._match_topic(self._topics, sensor_topic(sensor_id).split("/"), 0, clients)
+        if self._grid or self._wide_bboxes:
+            coordinates = self.coordinates_for(sensor_id)
+            if coordinates is not None:
+                lat, lon = coordinates
+                for bbox, client in self._grid.get(self._cell(lat, lon), ()):
+                    if bbox[0] <= lat <= bbox[2] and bbox[1] <= lon <= bbox[3]:
+                        clients.add(client)
+                for bbox, client in self._wide_bboxes:
+                    if bbox[0] <= lat <= bbox[2] and bbox[1] <= lon <= bbox[3]:
+                        clients.add(client)
+
+        result = frozenset(clients)
+        self._cache[sensor_id] = result
+        return result
+
+    def route(self, sensor_ids: Iterable[str]) -> Dict[Hashable, List[str]]:
+        """Map each interested client to the subset of sensor ids it should receive"""
+        routed: Dict[Hashable, List[str]] = {}
+        for sensor_id in sensor_ids:
+            for client in self.match(sensor_id):
+                routed.setdefault(client, []).append(sensor_id)
+        return routed
+
+    def invalidate(self, sensor_id: Optional[str] = None):
+        """Forget cached matches, e.g. after a sensor moves"""
+        if sensor_id is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(sensor_id, None)
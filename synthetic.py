@@ -0,0 +1,280 @@
+"""Synthetic sensor fleet for development and load tests.
+
+In the server it stands in for MQTT (INGEST_SOURCE=synthetic, or when the
+broker is unreachable) and feeds the ingest bridge directly. Run on its own,
+it publishes to a broker on the sensors' topics, e.g. the local stand-in:
+
+    python benchmarks/local_broker.py 1883 &
+    python synthetic.py --sensors 50000 --interval 10
+"""
+import argparse
+import asyncio
+import logging
+import math
+import os
+import time
+from datetime import datetime
+from typing import Callable, List, Optional
+
+import numpy as np
+import paho.mqtt.client as mqtt
+
+from snapshot import dumps
+
+logger = logging.getLogger(__name__)
+
+# Sensors are spread around these (name, location, lat, lon); each is also a weather/pollution region
+CITIES = (
+    ("Downtown", "Toronto, ON", 43.6532, -79.3832),
+    ("Suburban", "Mississauga, ON", 43.5890, -79.6441),
+    ("Industrial", "Hamilton, ON", 43.2557, -79.8711),
+    ("Uptown", "Markham, ON", 43.8561, -79.3370),
+    ("Northwest", "Brampton, ON", 43.7315, -79.7624),
+    ("Lakeshore", "Oakville, ON", 43.4675, -79.6877),
+    ("Escarpment", "Burlington, ON", 43.3255, -79.7990),
+    ("Eastern", "Oshawa, ON", 43.8971, -78.8658)
+)
+# Correlation of the per-sensor innovations: particulates, CO2, weather
+_CORRELATION = np.array([[1.0, 0.6, -0.2],
+                         [0.6, 1.0, -0.1],
+                         [-0.2, -0.1, 1.0]])
+_LOCAL_TAU = 15 * 60      # seconds for a sensor's own deviations to decorrelate
+_REGIONAL_TAU = 2 * 3600  # same for the shared regional pollution/weather factors
+_INCIDENT_SECONDS = 600
+
+def sensor_ids(count: int) -> List[str]:
+    """The first three are the catalog sensors (sensor_001..sensor_003)"""
+    return [f"sensor_{i + 1:03d}" for i in range(count)]
+
+class SyntheticFleet:
+    """Vectorized state and readings for ``sensors`` simulated sensors.
+
+    Particulates follow a per-sensor lognormal baseline driven by an AR(1)
+    deviation, a regional AR(1) factor shared with nearby sensors and a
+    rush-hour profile; CO2 is correlated with particulates, humidity moves
+    against temperature, and sensors occasionally go through a pollution
+    incident (``incident_rate`` per sensor per hour) several times their
+    baseline. ``readings`` advances only the sensors it is asked for.
+    """
+
+    def __init__(self, sensors: int, interval: float = 10.0, seed: Optional[int] = None,
+                 incident_rate: float = 0.01):
+        self.count = sensors
+        self.interval = interval
+        self.incident_rate = incident_rate
+        self.rng = np.random.default_rng(seed)
+        rng = self.rng
+        self.ids = sensor_ids(sensors)
+        self.region = np.arange(sensors) % len(CITIES)
+        self.locations = [CITIES[r][1] for r in self.region.tolist()]
+        centers = np.array([(lat, lon) for _, _, lat, lon in CITIES])
+        self.coordinates = centers[self.region] + rng.normal(0, 0.05, (sensors, 2))
+        self.coordinates[:min(sensors, 3)] = centers[:min(sensors, 3)]
+
+        self.pm25_base = rng.lognormal(math.log(12), 0.35, sensors)
+        self.pm10_ratio = rng.uniform(1.5, 2.0, sensors)
+        self.co2_base = 420 + rng.uniform(0, 60, sensors)
+        self.temperature_offset = rng.normal(0, 0.8, sensors)
+        self.humidity_offset = rng.normal(0, 4, sensors)
+
+        self.local = rng.standard_normal((sensors, 3))
+        self.regional = rng.standard_normal((len(CITIES), 2))
+        self.incident_until = np.zeros(sensors)
+        self.incident_factor = np.ones(sensors)
+        self._cholesky = np.linalg.cholesky(_CORRELATION)
+        self._regional_at = time.time()
+
+    def metadata(self) -> List[dict]:
+        """Registry rows for the simulated sensors"""
+        return [{"id": sensor_id, "name": f"{CITIES[region][0]} Station {i + 1}", "location": location,
+                 "coordinates": coordinates}
+                for i, (sensor_id, region, location, coordinates) in
+                enumerate(zip(self.ids, self.region.tolist(), self.locations, self.coordinates.tolist()))]
+
+    def _advance_regions(self, now: float):
+        elapsed = max(now - self._regional_at, 0.0)
+        self._regional_at = now
+        phi = math.exp(-elapsed / _REGIONAL_TAU)
+        self.regional = phi * self.regional + math.sqrt(1 - phi * phi) * self.rng.standard_normal(self.regional.shape)
+
+    def readings(self, index: np.ndarray, now: float) -> List[dict]:
+        """Next reading of every sensor in ``index`` as of ``now`` (epoch seconds)"""
+        rng = self.rng
+        self._advance_regions(now)
+        phi = math.exp(-self.interval / _LOCAL_TAU)
+        noise = rng.standard_normal((len(index), 3)) @ self._cholesky.T
+        local = self.local[index] = phi * self.local[index] + math.sqrt(1 - phi * phi) * noise
+        regional = self.regional[self.region[index]]
+
+        starting = rng.random(len(index)) < self.incident_rate * self.interval / 3600
+        if starting.any():
+            started = index[starting]
+            self.incident_until[started] = now + rng.exponential(_INCIDENT_SECONDS, len(started))
+            self.incident_factor[started] = rng.uniform(3, 6, len(started))
+        incident = np.where(self.incident_until[index] > now, self.incident_factor[index], 1.0)
+
+        moment = datetime.fromtimestamp(now)
+        hour = moment.hour + moment.minute / 60
+        traffic = 0.25 * (math.exp(-((hour - 8) / 1.5) ** 2) + math.exp(-((hour - 18) / 2) ** 2))
+        daily = math.sin(2 * math.pi * (hour - 9) / 24)
+
+        pm25 = self.pm25_base[index] * np.exp(0.35 * local[:, 0] + 0.3 * regional[:, 0]) * (1 + traffic) * incident
+        pm10 = pm25 * self.pm10_ratio[index] + np.abs(rng.normal(0, 2, len(index)))
+        co2 = self.co2_base[index] + 40 * local[:, 1] + 20 * regional[:, 0] + 240 * traffic
+        temperature = 15 + self.temperature_offset[index] + 4 * daily + 2 * regional[:, 1] + 0.3 * local[:, 2]
+        humidity = np.clip(60 + self.humidity_offset[index] - 2.5 * (temperature - 15) + 5 * local[:, 2], 15, 100)
+
+        timestamp = moment.isoformat()
+        ids, locations = self.ids, self.locations
+        return [{"sensor_id": ids[i], "location": locations[i], "pm25": p25, "pm10": p10, "co2": c,
+                 "temperature": t, "humidity": h, "timestamp": timestamp}
+                for i, p25, p10, c, t, h in zip(index.tolist(), np.round(pm25, 1).tolist(),
+                                                np.round(pm10, 1).tolist(), np.round(np.maximum(co2, 350)).tolist(),
+                                                np.round(temperature, 1).tolist(), np.round(humidity, 1).tolist())]
+
+class SyntheticLoadGenerator:
+    """Runs a ``SyntheticFleet`` as a background task.
+
+    Every sensor reports once per ``fleet.interval`` seconds, spread evenly:
+    each ``tick`` the next slice of sensors (round-robin) is generated in one
+    NumPy batch and passed to ``emit`` as a list, e.g.
+    ``IngestBridge.submit_many`` or an ``MqttPublisher``. Batches are built and
+    emitted in a worker thread so the event loop only schedules them. When a
+    tick takes longer than the schedule allows, the backlog is skipped
+    (counted in ``skipped``) rather than bursting.
+    """
+
+    def __init__(self, fleet: SyntheticFleet, emit: Callable[[List[dict]], object], tick: float = 0.1):
+        self.fleet = fleet
+        self.emit = emit
+        self.tick = tick
+        self.running = False
+        self._task: Optional[asyncio.Task] = None
+        self._cursor = 0
+        self._carry = 0.0
+        self.readings = 0
+        self.batches = 0
+        self.skipped = 0
+        self.errors = 0
+        self.last_tick_ms = 0.0
+        self.max_tick_ms = 0.0
+        self._started_at: Optional[float] = None
+
+    def start(self):
+        """Start generating in the background; returns right away"""
+        if self._task is not None:
+            return
+        self.running = True
+        self._started_at = time.monotonic()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"🎭 Simulating {self.fleet.count:,} sensors, one reading each per {self.fleet.interval:g}s")
+
+    async def stop(self):
+        self.running = False
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            logger.info("🛑 Synthetic load generator stopped")
+
+    async def _run(self):
+        last = time.monotonic()
+        while self.running:
+            await asyncio.sleep(self.tick)
+            now = time.monotonic()
+            self._carry += (now - last) * self.fleet.count / self.fleet.interval
+            last = now
+            due = int(self._carry)
+            if due > self.fleet.count:
+                self.skipped += due - self.fleet.count
+                due = self.fleet.count
+            self._carry -= int(self._carry)
+            if due:
+                await asyncio.to_thread(self._generate, due)
+
+    def _generate(self, due: int):
+        started = time.perf_counter()
+        index = (self._cursor + np.arange(due)) % self.fleet.count
+        self._cursor = (self._cursor + due) % self.fleet.count
+        try:
+            self.emit(self.fleet.readings(index, time.time()))
+            self.readings += due
+            self.batches += 1
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"❌ Synthetic batch of {due} readings failed: {e}")
+        self.last_tick_ms = (time.perf_counter() - started) * 1000
+        self.max_tick_ms = max(self.max_tick_ms, self.last_tick_ms)
+
+    def get_stats(self) -> dict:
+        """Report fleet size, target and achieved rates and batch timings"""
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+        return {
+            "running": self.running,
+            "sensors": self.fleet.count,
+            "interval": self.fleet.interval,
+            "target_per_sec": round(self.fleet.count / self.fleet.interval, 1),
+            "readings": self.readings,
+            "readings_per_sec": round(self.readings / elapsed, 1) if elapsed else None,
+            "batches": self.batches,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "last_tick_ms": round(self.last_tick_ms, 3),
+            "max_tick_ms": round(self.max_tick_ms, 3)
+        }
+
+class MqttPublisher:
+    """``emit`` target publishing each reading on its sensor's air_quality topic"""
+
+    def __init__(self, host: str, port: int):
+        self.client = mqtt.Client(client_id="airsense-synthetic")
+        self.client.connect(host, port, 60)
+        self.client.loop_start()
+
+    def __call__(self, readings: List[dict]):
+        for reading in readings:
+            payload = {key: value for key, value in reading.items() if key not in ("sensor_id", "timestamp")}
+            self.client.publish(f"airsense/sensors/{reading['sensor_id']}/air_quality", dumps(payload))
+
+    def close(self):
+        self.client.loop_stop()
+        self.client.disconnect()
+
+async def _publish(args):
+    publisher = MqttPublisher(args.broker_host, args.broker_port)
+    generator = SyntheticLoadGenerator(SyntheticFleet(args.sensors, args.interval, args.seed, args.incident_rate),
+                                       publisher, tick=args.tick)
+    generator.start()
+    started = time.monotonic()
+    try:
+        while args.duration is None or time.monotonic() - started < args.duration:
+            await asyncio.sleep(5)
+            stats = generator.get_stats()
+            print(f"📊 {stats['readings']:,} readings, {stats['readings_per_sec']:,} /s "
+                  f"(target {stats['target_per_sec']:,}), last batch {stats['last_tick_ms']} ms")
+    finally:
+        await generator.stop()
+        publisher.close()
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Publish a synthetic AirSense sensor fleet over MQTT")
+    parser.add_argument("--sensors", type=int, default=10000)
+    parser.add_argument("--interval", type=float, default=10.0, help="seconds between readings per sensor")
+    parser.add_argument("--tick", type=float, default=0.1)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--incident-rate", type=float, default=0.01, help="incidents per sensor per hour")
+    parser.add_argument("--duration", type=float, help="stop after this many seconds")
+    parser.add_argument("--broker-host", default=os.getenv("MQTT_BROKER_HOST", "localhost"))
+    parser.add_argument("--broker-port", type=int, default=int(os.getenv("MQTT_BROKER_PORT", "1883")))
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(_publish(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import asyncio
+
+from alerts import AlertEngine, alert_row
+from database import LocalTableClient
+from models import AlertType
+from persistence import WriteBehindBuffer
+
+def reading(value: float, timestamp: float) -> dict:
+    return {"sensor_id": "sensor_001", "pm25": value, "timestamp": timestamp}
+
+def test_alert_ids_come_from_the_firing_reading():
+    first, second = AlertEngine(), AlertEngine()
+    for engine in (first, second):
+        engine.add_rule("sensor_001", AlertType.HIGH_PM25, 35.0, rule_id="rule_1")
+    fired_first = first.evaluate(reading(50.0, 1_700_000_000.0))
+    fired_second = second.evaluate(reading(50.0, 1_700_000_000.0))
+    assert fired_first[0]["id"] == fired_second[0]["id"]
+
+def test_resolution_updates_the_persisted_alert():
+    engine = AlertEngine()
+    engine.add_rule("sensor_001", AlertType.HIGH_PM25, 35.0)
+    client = LocalTableClient()
+    buffer = WriteBehindBuffer(lambda: client, table="alerts", row_builder=alert_row,
+                               upsert=True, key="alert_id")
+
+    async def scenario():
+        await buffer.start()
+        (fired,) = engine.evaluate(reading(50.0, 1_700_000_000.0))
+        buffer.add(fired)
+        await buffer.flush()
+        assert client.tables["alerts"][0]["active"] is True
+
+        (resolved,) = engine.evaluate(reading(10.0, 1_700_000_060.0))
+        buffer.add(resolved)
+        await buffer.flush()
+        await buffer.stop()
+        return fired
+
+    fired = asyncio.run(scenario())
+    (row,) = client.tables["alerts"]
+    assert row["alert_id"] == fired["id"]
+    assert row["active"] is False
+    assert row["resolved_at"] is not None
+
+def test_fire_and_resolve_in_one_batch_write_one_row():
+    engine = AlertEngine()
+    engine.add_rule("sensor_001", AlertType.HIGH_PM25, 35.0)
+    client = LocalTableClient()
+    buffer = WriteBehindBuffer(lambda: client, table="alerts", row_builder=alert_row,
+                               upsert=True, key="alert_id")
+
+    async def scenario():
+        await buffer.start()
+        for event in engine.evaluate(reading(50.0, 1_700_000_000.0)) + engine.evaluate(reading(10.0, 1_700_000_060.0)):
+            buffer.add(event)
+        await buffer.stop()
+
+    asyncio.run(scenario())
+    (row,) = client.tables["alerts"]
+    assert row["active"] is False
+
+def test_removing_a_rule_resolves_its_active_alerts():
+    engine = AlertEngine()
+    rule = engine.add_rule("*", AlertType.HIGH_PM25, 35.0)
+    engine.add_rule("sensor_001", AlertType.HIGH_PM10, 50.0)
+    client = LocalTableClient()
+    buffer = WriteBehindBuffer(lambda: client, table="alerts", row_builder=alert_row,
+                               upsert=True, key="alert_id")
+
+    async def scenario():
+        await buffer.start()
+        for sensor_id in ("sensor_001", "sensor_002"):
+            for event in engine.evaluate({"sensor_id": sensor_id, "pm25": 80.0, "pm10": 90.0,
+                                          "timestamp": 1_700_000_000.0}):
+                buffer.add(event)
+        await buffer.flush()
+        removed, resolved = engine.remove_rule(rule.id)
+        for event in resolved:
+            buffer.add(event)
+        await buffer.stop()
+        return removed, resolved
+
+    removed, resolved = asyncio.run(scenario())
+    assert removed is rule
+    assert sorted(event["sensor_id"] for event in resolved) == ["sensor_001", "sensor_002"]
+    assert all(event["active"] is False and event["resolved_at"] for event in resolved)
+    # The other rule's alert stays active
+    assert [alert["type"] for alert in engine.get_active_alerts()] == [AlertType.HIGH_PM10.value]
+    rows = {row["alert_id"]: row["active"] for row in client.tables["alerts"]}
+    assert sorted(rows.values()) == [False, False, True]
+
+def test_removing_an_unknown_rule():
+    assert AlertEngine().remove_rule("rule_404") == (None, [])
@@ -0,0 +1,70 @@
+import asyncio
+import json
+
+import analytics
+from analytics import AnalyticsCache, AnalyticsEngine
+from rollups import RollupStore
+from timeseries import TimeSeriesStore
+
+NOW = 1_700_003_600.0
+
+def make_engine(sensors: int = 40, readings: int = 60) -> AnalyticsEngine:
+    history, rollups = TimeSeriesStore(capacity=200), RollupStore()
+    for i in range(readings):
+        for s in range(sensors):
+            reading = {"sensor_id": f"sensor_{s:03d}", "timestamp": NOW - 3600 + i * 60,
+                       "pm25": float(s + i % 7), "pm10": float(2 * s), "aqi": 40}
+            history.add(reading)
+            rollups.add(reading)
+    return AnalyticsEngine(history, rollups)
+
+def test_async_compute_matches_the_synchronous_one(monkeypatch):
+    # Small blocks and steps, so the result is assembled from several of each
+    monkeypatch.setattr(analytics, "MAX_BLOCK_CELLS", 7 * 60)
+    monkeypatch.setattr(analytics, "FILL_STEP", 3)
+    engine = make_engine()
+    expected = engine.compute(3600, 60, now=NOW)
+    assert asyncio.run(engine.compute_async(3600, 60, now=NOW)) == expected
+    assert expected["fleet"]["sensors"] == 40
+    assert expected["fleet"]["mean"]["pm10"] == 39.0
+
+def test_ingest_can_run_while_computing(monkeypatch):
+    monkeypatch.setattr(analytics, "FILL_STEP", 1)
+    engine = make_engine()
+
+    async def scenario():
+        async def ingest():
+            for i in range(200):
+                # New sensors and readings arrive between the sensors read for the result
+                engine.history.add({"sensor_id": f"late_{i:03d}", "timestamp": NOW - 30, "pm25": 1.0})
+                engine.history.add({"sensor_id": "sensor_000", "timestamp": NOW - 5 + i / 100, "pm25": 500.0})
+                await asyncio.sleep(0)
+        result, _ = await asyncio.gather(engine.compute_async(3600, 60, now=NOW), ingest())
+        return result
+
+    result = asyncio.run(scenario())
+    # Sensors are fixed when the computation starts
+    assert result["fleet"]["sensors"] == 40
+
+def test_cache_shares_one_build_between_concurrent_requests():
+    calls = []
+
+    async def compute(range_seconds, bucket_seconds):
+        calls.append((range_seconds, bucket_seconds))
+        await asyncio.sleep(0.01)
+        return {"range_seconds": range_seconds}
+
+    cache = AnalyticsCache(compute, refresh_interval=0)
+
+    async def scenario():
+        first, second = await asyncio.gather(cache.get(3600, 60), cache.get(3600, 60))
+        assert first is second
+        assert await cache.get(3600, 60) is first
+        cache.mark_changed()
+        return first, await cache.get(3600, 60)
+
+    first, rebuilt = asyncio.run(scenario())
+    assert calls == [(3600, 60), (3600, 60)]
+    assert json.loads(first.body) == {"range_seconds": 3600}
+    assert rebuilt.version == 1
+    assert cache.joined == 1 and cache.hits == 1
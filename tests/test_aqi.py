@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from aqi import CATEGORIES, aqi_category, aqi_value, category_names, compute_aqi, fill_missing_aqi
+
+# (concentration, AQI) at both sides of every EPA breakpoint
+PM25_EDGES = [(0.0, 0), (12.0, 50), (12.1, 51), (35.4, 100), (35.5, 101), (55.4, 150), (55.5, 151),
+              (150.4, 200), (150.5, 201), (250.4, 300), (250.5, 301), (350.4, 400), (350.5, 401),
+              (500.4, 500)]
+PM10_EDGES = [(0, 0), (54, 50), (55, 51), (154, 100), (155, 101), (254, 150), (255, 151), (354, 200),
+              (355, 201), (424, 300), (425, 301), (504, 400), (505, 401), (604, 500)]
+CO2_EDGES = [(600, 50), (601, 51), (1000, 100), (1001, 101), (1500, 150), (1501, 151), (2000, 200),
+             (2001, 201), (5000, 300), (5001, 301), (10000, 400), (10001, 401), (40000, 500)]
+
+@pytest.mark.parametrize("pm25, expected", PM25_EDGES)
+def test_pm25_breakpoints(pm25, expected):
+    assert aqi_value(pm25) == expected
+    assert compute_aqi(pm25)[0] == expected
+
+@pytest.mark.parametrize("pm10, expected", PM10_EDGES)
+def test_pm10_breakpoints(pm10, expected):
+    assert aqi_value(None, pm10=pm10) == expected
+    assert compute_aqi(np.nan, pm10=pm10)[0] == expected
+
+@pytest.mark.parametrize("co2, expected", CO2_EDGES)
+def test_co2_bands(co2, expected):
+    assert aqi_value(None, co2=co2) == expected
+    assert compute_aqi(np.nan, co2=co2)[0] == expected
+
+def test_concentrations_are_truncated_before_the_lookup():
+    # EPA truncates PM2.5 to 0.1 µg/m³ and PM10 to 1 µg/m³
+    assert aqi_value(12.09) == 50
+    assert aqi_value(35.0) == 99
+    assert aqi_value(None, pm10=54.9) == 50
+
+def test_out_of_range_and_missing_values():
+    assert aqi_value(-3.0) == 0
+    assert aqi_value(900.0) == 500
+    assert aqi_value(None) == -1
+    assert compute_aqi(np.nan)[0] == -1
+
+def test_highest_sub_index_wins():
+    assert aqi_value(10.0, pm10=200, co2=700) == 123
+    aqi, category = compute_aqi(10.0, 200, 700)
+    assert aqi == 123 and CATEGORIES[int(category)] == "Unhealthy for Sensitive Groups"
+
+def test_vectorized_and_scalar_paths_agree():
+    rng = np.random.default_rng(0)
+    n = 5000
+    pm25 = rng.uniform(-5, 600, n).round(2)
+    pm10 = rng.uniform(0, 700, n).round(1)
+    co2 = rng.uniform(300, 45000, n).round(0)
+    pm10[rng.random(n) < 0.2] = np.nan
+    co2[rng.random(n) < 0.2] = np.nan
+    aqi, category = compute_aqi(pm25, pm10, co2)
+    scalar = [aqi_value(a, None if b != b else b, None if c != c else c)
+              for a, b, c in zip(pm25.tolist(), pm10.tolist(), co2.tolist())]
+    assert aqi.tolist() == scalar
+    assert category_names(category) == [aqi_category(value) for value in scalar]
+
+@pytest.mark.parametrize("aqi, name", [(0, "Good"), (50, "Good"), (51, "Moderate"), (150, "Unhealthy for Sensitive Groups"),
+                                        (300, "Very Unhealthy"), (301, "Hazardous"), (500, "Hazardous")])
+def test_categories(aqi, name):
+    assert aqi_category(aqi) == name
+    assert category_names(compute_aqi(np.nan, co2={0: 0, 50: 600, 51: 601, 150: 1500, 300: 5000,
+                                                   301: 5001, 500: 40000}[aqi])[1]) == [name]
+
+def test_fill_missing_aqi_keeps_reported_values():
+    readings = [{"pm25": 35.5, "aqi": 7}, {"pm25": 35.5}, {"pm10": 300}, {"pm25": None, "co2": 700}]
+    fill_missing_aqi(readings)
+    assert [reading.get("aqi") for reading in readings] == [7, 101, None, None]
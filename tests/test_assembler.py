@@ -0,0 +1,79 @@
+import asyncio
+
+from assembler import RecordAssembler
+
+class Clock:
+    def __init__(self, now: float = 1_700_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+def fragment(topic: str, at: float, **fields) -> dict:
+    return {"sensor_id": "sensor_001", "timestamp": at, "topic": f"airsense/sensors/sensor_001/{topic}", **fields}
+
+def test_fragments_within_the_window_merge_into_one_record():
+    emitted = []
+    assembler = RecordAssembler(emitted.append, window=0.01, clock=Clock(101.0))
+
+    async def scenario():
+        assembler.add(fragment("air_quality", 100.0, pm25=12.0, pm10=20.0, location="Toronto, ON"))
+        assembler.add(fragment("temperature", 100.5, temperature=21.5))
+        assembler.add(fragment("humidity", 100.2, humidity=40.0, firmware="2.1"))
+        assembler.add({"sensor_id": "sensor_002", "timestamp": 100.0, "pm25": 3.0})
+        await asyncio.sleep(0.05)
+
+    asyncio.run(scenario())
+    assert len(emitted) == 2
+    merged = emitted[0]
+    assert merged == {"sensor_id": "sensor_001", "pm25": 12.0, "pm10": 20.0, "temperature": 21.5, "humidity": 40.0,
+                      "location": "Toronto, ON", "firmware": "2.1", "timestamp": 100.5}
+    assert assembler.get_stats()["fragments_per_update"] == 2.0
+
+def test_older_fragments_do_not_overwrite_newer_values():
+    emitted = []
+    assembler = RecordAssembler(emitted.append, window=0, stale_after=None)
+    assembler.add(fragment("air_quality", 200.0, pm25=30.0))
+    assembler.add(fragment("air_quality", 150.0, pm25=10.0, pm10=5.0))
+    # The late fragment still fills fields the record didn't have
+    assert emitted[-1]["pm25"] == 30.0 and emitted[-1]["pm10"] == 5.0
+    assert emitted[-1]["timestamp"] == 200.0
+
+def test_null_fields_keep_the_previous_value():
+    emitted = []
+    assembler = RecordAssembler(emitted.append, window=0, stale_after=None)
+    assembler.add(fragment("air_quality", 100.0, pm25=12.0))
+    assembler.add(fragment("air_quality", 101.0, pm25=None, co2=450.0))
+    assert emitted[-1]["pm25"] == 12.0 and emitted[-1]["co2"] == 450.0
+
+def test_stale_fields_are_dropped():
+    emitted = []
+    clock = Clock()
+    assembler = RecordAssembler(emitted.append, window=0, stale_after=600, clock=clock)
+    assembler.add(fragment("humidity", clock.now - 900, humidity=40.0))
+    assembler.add(fragment("air_quality", clock.now, pm25=12.0))
+    assert "humidity" not in emitted[-1]
+    assert emitted[-1]["pm25"] == 12.0
+    assert assembler.stale_fields == 2
+    clock.now += 601
+    assembler.add(fragment("temperature", clock.now, temperature=20.0))
+    assert set(emitted[-1]) == {"sensor_id", "temperature", "timestamp"}
+
+def test_emit_errors_are_counted_and_do_not_stop_other_sensors():
+    emitted = []
+
+    def emit(record):
+        if record["sensor_id"] == "sensor_001":
+            raise RuntimeError("database down")
+        emitted.append(record)
+
+    assembler = RecordAssembler(emit, window=1, clock=Clock(101.0))
+
+    async def scenario():
+        assembler.add(fragment("air_quality", 100.0, pm25=12.0))
+        assembler.add({"sensor_id": "sensor_002", "timestamp": 100.0, "pm25": 3.0})
+        assembler.flush()
+
+    asyncio.run(scenario())
+    assert [record["sensor_id"] for record in emitted] == ["sensor_002"]
+    assert assembler.errors == 1 and assembler.get_stats()["pending"] == 0
@@ -0,0 +1,38 @@
+import asyncio
+
+from backplane import InProcessBackplane, InProcessHub, SocketBackplane
+
+def test_malformed_envelopes_are_counted_as_dropped():
+    backplane = SocketBackplane("/unused")
+    received = []
+    backplane.subscribe("readings", received.append)
+    for line in (b"not json\n", b"[1, 2]\n", b'"text"\n', b'{"channel": "readings"}\n',
+                 b'{"message": {}}\n', b'{"channel": "readings", "message": {"sensor_id": "s1"}}\n'):
+        backplane._receive_line(line)
+    assert backplane.dropped == 5
+    assert backplane.received == 1
+    assert received == [{"sensor_id": "s1"}]
+
+def test_in_process_workers_share_messages_and_promote_a_successor():
+    async def scenario():
+        hub = InProcessHub()
+        promoted = asyncio.Event()
+
+        async def on_promoted():
+            promoted.set()
+
+        first, second = InProcessBackplane(hub), InProcessBackplane(hub, on_promoted=on_promoted)
+        await first.start()
+        await second.start()
+        received = []
+        second.subscribe("readings", received.append)
+        first.publish("readings", {"sensor_id": "s1"})
+        await asyncio.sleep(0)
+        assert received == [{"sensor_id": "s1"}]
+        assert first.is_leader and not second.is_leader
+
+        await first.stop()
+        await asyncio.wait_for(promoted.wait(), 1)
+        assert second.is_leader
+
+    asyncio.run(scenario())
@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from decoding import MessageDecoder, validate_reading
+
+def test_valid_readings_pass_through_unchanged():
+    payload = {"pm25": 12.5, "pm10": 20, "aqi": 52, "location": "Toronto, ON", "firmware": "1.2"}
+    assert validate_reading(dict(payload)) == payload
+
+def test_numeric_strings_are_converted():
+    reading = validate_reading({"pm25": "12.5", "aqi": "52", "co2": None})
+    assert reading == {"pm25": 12.5, "aqi": 52, "co2": None}
+    assert type(reading["aqi"]) is int
+
+@pytest.mark.parametrize("payload", [
+    [1, 2, 3],
+    "12.5",
+    {"pm25": "high"},
+    {"pm25": True},
+    {"pm10": [20]},
+    {"co2": {"value": 400}},
+    {"aqi": "52.x"},
+    {"location": 42},
+])
+def test_invalid_payloads_are_rejected(payload):
+    with pytest.raises(ValueError):
+        validate_reading(payload)
+
+def encode(payload) -> bytes:
+    return json.dumps(payload).encode()
+
+def test_batches_are_emitted_at_batch_size():
+    batches = []
+    decoder = MessageDecoder(batches.append, batch_size=3)
+    for i in range(7):
+        decoder.add(f"airsense/sensors/sensor_{i:03d}/pm25", encode({"pm25": float(i)}))
+    assert [len(batch) for batch in batches] == [3, 3]
+    decoder.flush()
+    assert [len(batch) for batch in batches] == [3, 3, 1]
+    reading = batches[0][1]
+    assert (reading["sensor_id"], reading["topic"], reading["pm25"]) == ("sensor_001", "airsense/sensors/sensor_001/pm25", 1.0)
+    # One receive time per batch
+    assert len({reading["timestamp"] for reading in batches[0]}) == 1
+
+def test_invalid_messages_are_counted_and_skipped():
+    batches = []
+    decoder = MessageDecoder(batches.append, batch_size=10)
+    decoder.add("airsense/sensors/sensor_001/pm25", encode({"pm25": 10.0}))
+    decoder.add("airsense/sensors/sensor_001/pm25", b"{not json")
+    decoder.add("airsense/sensors/sensor_001/pm25", encode({"pm25": "high"}))
+    decoder.add("airsense", encode({"pm25": 10.0}))
+    # Overflows to infinity, which is no AQI
+    decoder.add("airsense/sensors/sensor_002/aqi", b'{"aqi": 1e999}')
+    decoder.flush()
+    assert [reading["sensor_id"] for reading in batches[0]] == ["sensor_001"]
+    stats = decoder.get_stats()
+    assert (stats["decoded"], stats["invalid"], stats["batches"]) == (1, 4, 1)
+    assert stats["last_error"].startswith("airsense/sensors/sensor_002/aqi")
+
+def test_a_batch_of_only_invalid_messages_emits_nothing():
+    batches = []
+    decoder = MessageDecoder(batches.append, batch_size=2)
+    decoder.add("airsense/sensors/sensor_001/pm25", b"null")
+    decoder.add("airsense/sensors/sensor_001/pm25", b"[]")
+    assert batches == []
+    assert decoder.invalid == 2
+
+def test_stale_partial_batches_are_flushed():
+    batches = []
+    decoder = MessageDecoder(batches.append, batch_size=100, max_delay=0)
+    decoder.add("airsense/sensors/sensor_001/pm25", encode({"pm25": 1.0}))
+    decoder.flush_stale()
+    assert len(batches) == 1
+    decoder.flush_stale()
+    assert len(batches) == 1
@@ -0,0 +1,93 @@
+import asyncio
+import csv
+import io
+import json
+
+import pytest
+
+from export import CSV, NDJSON, PARQUET, Export, HistorySource, available_formats, parse_cursor
+from timeseries import TimeSeriesStore
+
+START = 1_700_000_000.0
+
+def make_store(sensors: int = 3, readings: int = 40, per_timestamp: int = 1) -> TimeSeriesStore:
+    store = TimeSeriesStore(capacity=100)
+    for i in range(readings):
+        for s in range(sensors):
+            store.add({"sensor_id": f"sensor_{s:03d}", "timestamp": START + (i // per_timestamp) * 10,
+                       "pm25": float(i)})
+    return store
+
+def collect(export: Export) -> bytes:
+    async def run():
+        await export.open()
+        return b"".join([chunk async for chunk in export.stream()])
+    return asyncio.run(run())
+
+def export_rows(source, after=None, **kwargs) -> list:
+    body = collect(Export(source, NDJSON, after=after, **kwargs))
+    return [json.loads(line) for line in body.splitlines()]
+
+def test_rows_are_merged_in_timestamp_then_sensor_order():
+    # Pairs of readings share a timestamp, so ties span chunk boundaries
+    store = make_store(per_timestamp=2)
+    rows = export_rows(HistorySource(store, START, START + 1000), page_size=7)
+    assert len(rows) == 3 * 40
+    keys = [(row["timestamp"], row["sensor_id"]) for row in rows]
+    assert keys == sorted(keys)
+    # Both readings of a shared timestamp come through for every sensor
+    assert sum(1 for row in rows if row["sensor_id"] == "sensor_001") == 40
+
+def test_small_chunks_return_every_reading():
+    store = make_store(sensors=1, readings=50, per_timestamp=2)
+    source = HistorySource(store, START, START + 1000)
+    source.step = 3
+    rows = asyncio.run(source.page(None, 50))
+    assert [row["pm25"] for row in rows] == [float(i) for i in range(50)]
+
+def test_resuming_from_a_cursor_returns_the_rest():
+    store = make_store()
+    everything = export_rows(HistorySource(store, START, START + 1000), page_size=11)
+    cut = everything[50]
+    cursor = parse_cursor(f"{cut['timestamp']},{cut['sensor_id']}")
+    resumed = export_rows(HistorySource(store, START, START + 1000), after=cursor, page_size=11)
+    assert resumed == everything[51:]
+
+def test_resume_is_clamped_to_the_requested_window():
+    store = make_store(sensors=1)
+    window_start = START + 100
+    source = HistorySource(store, window_start, START + 1000)
+    rows = export_rows(source, after=parse_cursor("2000-01-01T00:00:00,sensor_000"))
+    assert rows == export_rows(HistorySource(store, window_start, START + 1000))
+    assert [row["pm25"] for row in rows] == [float(i) for i in range(10, 40)]
+
+def test_limit_stops_the_export():
+    rows = export_rows(HistorySource(make_store(), START, START + 1000), page_size=7, limit=10)
+    assert len(rows) == 10
+
+def test_csv_has_a_header_and_one_line_per_row():
+    body = collect(Export(HistorySource(make_store(), START, START + 1000), CSV, page_size=7))
+    rows = list(csv.reader(io.StringIO(body.decode())))
+    assert rows[0] == list(HistorySource.columns)
+    assert len(rows) == 1 + 3 * 40
+    # Missing metrics are written as empty cells
+    assert rows[1][HistorySource.columns.index("co2")] == ""
+
+@pytest.mark.skipif(PARQUET not in available_formats(), reason="needs pyarrow")
+def test_parquet_round_trip():
+    import pyarrow.parquet as pq
+    body = collect(Export(HistorySource(make_store(), START, START + 1000), PARQUET, page_size=25))
+    table = pq.read_table(io.BytesIO(body))
+    assert table.num_rows == 3 * 40
+    assert table.column_names == list(HistorySource.columns)
+    assert table.column("co2").null_count == 3 * 40
+
+@pytest.mark.parametrize("cursor", ["", "2024-01-01T00:00:00", "not-a-date,sensor_001", ",sensor_001"])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError):
+        parse_cursor(cursor)
+
+def test_numeric_cursor_ids_are_required_for_database_rows():
+    assert parse_cursor("2024-01-01T00:00:00Z,42", numeric_id=True) == ("2024-01-01T00:00:00+00:00", "42")
+    with pytest.raises(ValueError):
+        parse_cursor("2024-01-01T00:00:00,1 OR 1=1", numeric_id=True)
@@ -0,0 +1,22 @@
+from fanout import OutboundChannel
+
+class IdleSocket:
+    """Stands in for a WebSocket; frames are only queued, never written"""
+
+def test_snapshots_are_conflated_and_deltas_are_not():
+    channel = OutboundChannel(IdleSocket(), max_queue=10)
+    channel.offer("snapshot 1", "sensor_data")
+    channel.offer("delta 1", "sensor_delta")
+    channel.offer("snapshot 2", "sensor_data")
+    channel.offer("delta 2", "sensor_delta")
+    assert [frame for _, frame in channel._queue] == ["snapshot 2", "delta 1", "delta 2"]
+    assert channel.conflated == 1
+    assert not channel.gap
+
+def test_full_queue_drops_the_oldest_frame():
+    channel = OutboundChannel(IdleSocket(), max_queue=2)
+    for i in range(3):
+        channel.offer(f"delta {i}", "sensor_delta")
+    assert [frame for _, frame in channel._queue] == ["delta 1", "delta 2"]
+    assert channel.dropped == 1
+    assert channel.gap
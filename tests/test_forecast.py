@@ -0,0 +1,83 @@
+from forecast import ForecastCache, ForecastModel
+
+STEP = 300
+START = 1_700_000_100.0 // STEP * STEP
+
+def feed(model: ForecastModel, values, sensor_id: str = "sensor_001", start: float = START):
+    """One reading per step, plus a second one halfway through it"""
+    for i, value in enumerate(values):
+        for offset in (0, STEP / 2):
+            model.add({"sensor_id": sensor_id, "timestamp": start + i * STEP + offset, "pm25": value})
+
+def test_no_forecast_until_a_step_closes():
+    model = ForecastModel(step=STEP)
+    assert model.forecast("sensor_001", 3600) is None
+    feed(model, [10.0])
+    assert "sensor_001" in model
+    assert model.forecast("sensor_001", 3600) is None
+
+def test_metrics_are_forecast_once_fitted_on_two_steps():
+    model = ForecastModel(step=STEP)
+    feed(model, [10.0, 10.0])
+    points = model.forecast("sensor_001", 3600)["forecast"]
+    assert "pm25" not in points[0]
+    feed(model, [10.0], start=START + 2 * STEP)
+    result = model.forecast("sensor_001", 3600)
+    assert len(result["forecast"]) == 12
+    assert result["forecast"][0]["pm25"]["value"] == 10.0
+    # Metrics the sensor never reported are left out
+    assert "co2" not in result["forecast"][0]
+
+def test_constant_series_forecasts_the_constant():
+    model = ForecastModel(step=STEP)
+    feed(model, [25.0] * 50)
+    for point in model.forecast("sensor_001", 7200)["forecast"]:
+        assert point["pm25"] == {"value": 25.0, "low": 25.0, "high": 25.0}
+
+def test_rising_series_forecasts_a_rise_with_a_widening_interval():
+    model = ForecastModel(step=STEP)
+    feed(model, [10.0 + i for i in range(60)])
+    points = [point["pm25"] for point in model.forecast("sensor_001", 3600)["forecast"]]
+    assert points[-1]["value"] > points[0]["value"] > 60.0
+    assert points[-1]["high"] - points[-1]["low"] > points[0]["high"] - points[0]["low"] > 0
+
+def test_late_readings_are_ignored():
+    model = ForecastModel(step=STEP)
+    feed(model, [10.0, 10.0, 10.0])
+    readings = model.readings
+    model.add({"sensor_id": "sensor_001", "timestamp": START, "pm25": 500.0})
+    assert model.readings == readings
+
+def test_state_arrays_grow_with_the_fleet():
+    model = ForecastModel(step=STEP, capacity=2)
+    for s in range(5):
+        feed(model, [float(s)] * 3, sensor_id=f"sensor_{s}")
+    assert len(model.level) == 8
+    assert [model.forecast(f"sensor_{s}", STEP)["forecast"][0]["pm25"]["value"] for s in range(5)] == \
+        [0.0, 1.0, 2.0, 3.0, 4.0]
+
+def test_cache_is_invalidated_when_a_step_closes():
+    model = ForecastModel(step=STEP)
+    cache = ForecastCache(model)
+    feed(model, [10.0, 10.0, 10.0])
+    first = cache.get("sensor_001", 3600)
+    assert cache.get("sensor_001", 3600) is first
+    # More readings for the open step don't change the state
+    model.add({"sensor_id": "sensor_001", "timestamp": START + 2 * STEP + 200, "pm25": 90.0})
+    assert cache.get("sensor_001", 3600) is first
+    # The next step closes it
+    model.add({"sensor_id": "sensor_001", "timestamp": START + 3 * STEP, "pm25": 90.0})
+    second = cache.get("sensor_001", 3600)
+    assert second is not first
+    assert second["based_on"] > first["based_on"]
+    assert second["forecast"][0]["pm25"]["value"] > first["forecast"][0]["pm25"]["value"]
+    assert (cache.hits, cache.misses) == (2, 2)
+    assert cache.get("sensor_404", 3600) is None
+
+def test_cache_evicts_the_least_recently_used():
+    model = ForecastModel(step=STEP)
+    cache = ForecastCache(model, max_entries=2)
+    feed(model, [10.0, 10.0])
+    for horizon in (600, 1200, 600, 1800):
+        cache.get("sensor_001", horizon)
+    assert list(cache._entries) == [("sensor_001", 600), ("sensor_001", 1800)]
@@ -0,0 +1,47 @@
+import json
+import math
+
+from frames import (COLUMNAR, JSON, NO_TIMESTAMP, SensorDictionary, decode_columnar, encode_columnar,
+                    encode_sensor_frame, negotiate)
+
+FRAME_TIME = "2024-01-01T12:00:00"
+
+def test_columnar_round_trip():
+    dictionary = SensorDictionary()
+    data = {
+        "sensor_002": {"timestamp": "2024-01-01T11:59:58.500000", "pm25": 12.5, "pm10": 30.0, "aqi": 52},
+        "sensor_001": {"timestamp": None, "pm25": 3.25, "location": "Toronto, ON"},
+    }
+    dictionary.extend(data)
+    message = {"type": "sensor_update", "seq": 7, "timestamp": FRAME_TIME}
+    decoded = decode_columnar(encode_columnar(message, data, dictionary), dictionary)
+    assert decoded["type"] == "sensor_update"
+    assert decoded["seq"] == 7
+    assert list(decoded["data"]) == ["sensor_002", "sensor_001"]
+    first = decoded["data"]["sensor_002"]
+    assert first["timestamp"] - decoded["timestamp"] == -1.5
+    assert (first["pm25"], first["pm10"], first["aqi"]) == (12.5, 30.0, 52.0)
+    # Missing metrics and timestamps are left out; metadata doesn't travel
+    assert decoded["data"]["sensor_001"] == {"pm25": 3.25}
+
+def test_columnar_values_are_float32():
+    dictionary = SensorDictionary()
+    dictionary.extend(["sensor_001"])
+    frame = encode_columnar({"type": "sensor_data", "timestamp": FRAME_TIME},
+                            {"sensor_001": {"timestamp": FRAME_TIME, "pm25": 0.1}}, dictionary)
+    reading = decode_columnar(frame, dictionary)["data"]["sensor_001"]
+    assert reading["pm25"] != 0.1 and math.isclose(reading["pm25"], 0.1, rel_tol=1e-6)
+
+def test_dictionary_indices_are_stable():
+    dictionary = SensorDictionary()
+    assert dictionary.extend(["b", "a"]) == ["b", "a"]
+    assert dictionary.extend(["a", "c"]) == ["c"]
+    assert dictionary.indices(["c", "b"]).tolist() == [2, 0]
+    assert dictionary.message(2) == {"type": "sensor_dictionary", "offset": 2, "ids": ["c"]}
+
+def test_unknown_encodings_fall_back_to_json():
+    assert negotiate("cbor") == JSON
+    assert negotiate("COLUMNAR") == COLUMNAR
+    frame = encode_sensor_frame({"type": "sensor_data", "seq": 1}, {"s": {"pm25": 1.0}}, negotiate(None),
+                                SensorDictionary())
+    assert json.loads(frame) == {"type": "sensor_data", "seq": 1, "data": {"s": {"pm25": 1.0}}}
@@ -0,0 +1,53 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+import main
+from timeseries import TimeSeriesStore
+
+@pytest.fixture
+def history(monkeypatch):
+    """A ring holding the last 2 hours at 10 minute intervals, with the database holding what came before"""
+    now = datetime.now()
+    store = TimeSeriesStore(capacity=12)
+    for i in range(30):
+        store.add({"sensor_id": "sensor_001", "timestamp": (now - timedelta(minutes=10 * (29 - i))).timestamp(),
+                   "pm25": float(i)})
+    oldest = store.coverage_start("sensor_001")
+    database = [{"sensor_id": "sensor_001", "timestamp": (now - timedelta(minutes=10 * (29 - i))).isoformat(),
+                 "pm25": float(i)} for i in range(30)]
+    calls = []
+
+    def get_historical_air_quality(sensor_id, hours, before=None):
+        calls.append(before)
+        start = (now - timedelta(hours=hours)).timestamp()
+        return [row for row in database
+                if start <= datetime.fromisoformat(row["timestamp"]).timestamp() < (before or float("inf"))]
+
+    monkeypatch.setattr(main, "history_store", store)
+    monkeypatch.setattr(main, "get_historical_air_quality", get_historical_air_quality)
+    return calls, oldest
+
+def pm25(response: dict) -> list:
+    return [row["pm25"] for row in response["data"]]
+
+def test_range_within_the_ring_does_not_query_the_database(history):
+    calls, _ = history
+    response = asyncio.run(main.get_historical_data("sensor_001", hours=1))
+    assert pm25(response) == [24.0, 25.0, 26.0, 27.0, 28.0, 29.0]
+    assert calls == []
+
+def test_older_readings_come_from_the_database(history):
+    calls, oldest = history
+    response = asyncio.run(main.get_historical_data("sensor_001", hours=6))
+    assert pm25(response) == [float(i) for i in range(30)]
+    assert calls == [oldest]
+
+def test_downsampling_covers_the_whole_range(history):
+    response = asyncio.run(main.get_historical_data("sensor_001", hours=6, agg="lttb", points=3))
+    assert len(pm25(response)) == 3
+    assert (pm25(response)[0], pm25(response)[-1]) == (0.0, 29.0)
+    # p95 can't come from rollups, so it is computed over the raw readings
+    response = asyncio.run(main.get_historical_data("sensor_001", hours=6, resolution="1d", agg="p95"))
+    assert sum(row["count"] for row in response["data"]) == 30
@@ -0,0 +1,39 @@
+import asyncio
+
+from ingest import COALESCE, IngestBridge
+
+def drained(bridge: IngestBridge, handled: list) -> list:
+    asyncio.run(bridge.drain())
+    return handled
+
+def test_coalesce_keeps_the_newest_payload_per_sensor_and_topic():
+    handled = []
+    bridge = IngestBridge(handled.append, policy=COALESCE)
+    bridge.submit_many([
+        {"sensor_id": "s1", "topic": "sensors/s1/air_quality", "pm25": 10.0},
+        {"sensor_id": "s1", "topic": "sensors/s1/temperature", "temperature": 21.0},
+        {"sensor_id": "s1", "topic": "sensors/s1/air_quality", "pm25": 12.0},
+        {"sensor_id": "s2", "topic": "sensors/s2/air_quality", "pm25": 30.0},
+    ])
+    assert bridge.coalesced == 1
+    assert drained(bridge, handled) == [
+        {"sensor_id": "s1", "topic": "sensors/s1/air_quality", "pm25": 12.0},
+        {"sensor_id": "s1", "topic": "sensors/s1/temperature", "temperature": 21.0},
+        {"sensor_id": "s2", "topic": "sensors/s2/air_quality", "pm25": 30.0},
+    ]
+
+def test_coalesce_drops_the_oldest_key_when_full():
+    handled = []
+    bridge = IngestBridge(handled.append, policy=COALESCE, max_size=2)
+    for sensor in ("s1", "s2", "s3"):
+        bridge.submit({"sensor_id": sensor, "topic": f"sensors/{sensor}/air_quality"})
+    assert bridge.dropped == 1
+    assert [payload["sensor_id"] for payload in drained(bridge, handled)] == ["s2", "s3"]
+
+def test_drop_oldest_keeps_every_payload_until_full():
+    handled = []
+    bridge = IngestBridge(handled.append, max_size=3)
+    for i in range(5):
+        bridge.submit({"sensor_id": "s1", "pm25": float(i)})
+    assert bridge.dropped == 2
+    assert [payload["pm25"] for payload in drained(bridge, handled)] == [2.0, 3.0, 4.0]
@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+from liveness import LivenessTracker
+from models import SensorStatus
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def make_tracker(offline_after: float = 60.0):
+    clock, transitions = Clock(), []
+    tracker = LivenessTracker(offline_after, on_transition=lambda sensor_id, status, _: transitions.append(
+        (sensor_id, status)), clock=clock)
+    return tracker, clock, transitions
+
+def test_first_report_is_an_online_transition():
+    tracker, _, transitions = make_tracker()
+    assert tracker.status("sensor_001") == SensorStatus.OFFLINE
+    tracker.touch("sensor_001")
+    tracker.touch("sensor_001")
+    assert transitions == [("sensor_001", SensorStatus.ONLINE)]
+    assert tracker.status("sensor_001") == SensorStatus.ONLINE
+    assert tracker.last_seen("sensor_001") is not None
+
+def test_silent_sensors_expire_at_their_deadline():
+    tracker, clock, transitions = make_tracker()
+    tracker.touch("sensor_001")  # due at 1060
+    clock.now = 1030
+    tracker.touch("sensor_002")  # due at 1090
+    assert tracker.expire(1059) == 1060
+    assert tracker.status("sensor_001") == SensorStatus.ONLINE
+    assert tracker.expire(1060) == 1090
+    assert transitions[-1] == ("sensor_001", SensorStatus.OFFLINE)
+    assert tracker.expire(1090) is None
+    assert transitions[-1] == ("sensor_002", SensorStatus.OFFLINE)
+    assert tracker.get_stats()["offline"] == 2
+
+def test_reports_push_the_deadline_back_without_extra_heap_entries():
+    tracker, clock, transitions = make_tracker()
+    tracker.touch("sensor_001")
+    for _ in range(10):
+        clock.now += 50
+        tracker.touch("sensor_001")
+    assert tracker.get_stats()["pending_deadlines"] == 1
+    # The stale deadline is re-checked and pushed back to the last report
+    assert tracker.expire() == clock.now + 60
+    assert transitions == [("sensor_001", SensorStatus.ONLINE)]
+
+def test_offline_sensor_comes_back_online():
+    tracker, clock, transitions = make_tracker()
+    tracker.touch("sensor_001")
+    clock.now += 61
+    tracker.expire()
+    tracker.touch("sensor_001")
+    assert [status for _, status in transitions] == [SensorStatus.ONLINE, SensorStatus.OFFLINE, SensorStatus.ONLINE]
+    # Rescheduled once back online
+    clock.now += 61
+    tracker.expire()
+    assert transitions[-1] == ("sensor_001", SensorStatus.OFFLINE)
+
+def test_background_task_wakes_for_an_earlier_deadline():
+    transitions = []
+    tracker = LivenessTracker(0.05, on_transition=lambda sensor_id, status, _: transitions.append(status))
+
+    async def scenario():
+        tracker.start()
+        # Sleeping with no deadline at all; the first report must wake it
+        await asyncio.sleep(0.01)
+        tracker.touch("sensor_001")
+        started = time.monotonic()
+        while tracker.status("sensor_001") == SensorStatus.ONLINE and time.monotonic() - started < 1:
+            await asyncio.sleep(0.01)
+        await tracker.stop()
+        return time.monotonic() - started
+
+    elapsed = asyncio.run(scenario())
+    assert transitions == [SensorStatus.ONLINE, SensorStatus.OFFLINE]
+    assert 0.04 <= elapsed < 0.5
@@ -0,0 +1,146 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import mqtt_client
+from mqtt_client import MQTTClient, MQTTIngestPool
+
+class FakePaho:
+    """Stands in for paho's client: connects at once and records subscriptions and publishes"""
+
+    def __init__(self, client_id=""):
+        self.client_id = client_id
+        self.subscribed = []
+        self.published = []
+        self.running = False
+
+    def connect(self, host, port, keepalive):
+        self.on_connect(self, None, {}, 0)
+
+    def loop_start(self):
+        self.running = True
+
+    def loop_stop(self):
+        self.running = False
+
+    def disconnect(self):
+        self.on_disconnect(self, None, 0)
+
+    def subscribe(self, topic):
+        self.subscribed.append(topic)
+
+    def publish(self, topic, payload):
+        self.published.append((topic, json.loads(payload)))
+
+def message(sensor_id: str, pm25: float) -> SimpleNamespace:
+    return SimpleNamespace(topic=f"airsense/sensors/{sensor_id}/air_quality",
+                           payload=json.dumps({"pm25": pm25}).encode())
+
+def test_several_shards_need_a_shared_group():
+    with pytest.raises(ValueError):
+        MQTTIngestPool(shards=0)
+    with pytest.raises(ValueError):
+        MQTTIngestPool(shards=2)
+    assert len(MQTTIngestPool(shards=1).clients) == 1
+
+def test_shards_subscribe_through_the_shared_group():
+    pool = MQTTIngestPool(shards=3, shared_group="ingest", client_id_prefix="worker-a")
+    assert [client.client_id for client in pool.clients] == ["worker-a-0", "worker-a-1", "worker-a-2"]
+    assert [client.shard for client in pool.clients] == [0, 1, 2]
+    for client in pool.clients:
+        assert client.subscription_topics() == [f"$share/ingest/{topic}" for topic in client.topics.values()]
+    assert pool.get_connection_status()["shards"] == 3
+
+def test_without_a_group_topics_are_subscribed_directly():
+    client = MQTTClient()
+    paho = FakePaho()
+    client.on_connect(paho, None, {}, 0)
+    assert client.connected
+    assert paho.subscribed == list(client.topics.values())
+
+def test_an_empty_prefix_lets_paho_pick_client_ids():
+    pool = MQTTIngestPool(shards=2, shared_group="ingest")
+    assert [client.client_id for client in pool.clients] == ["", ""]
+
+def test_messages_are_decoded_in_batches_per_shard():
+    pool = MQTTIngestPool(shards=2, shared_group="ingest", decode_batch=2)
+    batches = []
+    pool.set_data_callback(lambda reading: None, batch_callback=batches.append)
+    first, second = pool.clients
+    first.on_message(None, None, message("sensor_001", 10.0))
+    second.on_message(None, None, message("sensor_002", 20.0))
+    assert batches == []
+    first.on_message(None, None, message("sensor_003", 30.0))
+    assert [[reading["sensor_id"] for reading in batch] for batch in batches] == [["sensor_001", "sensor_003"]]
+    second.decoder.flush()
+    assert [reading["pm25"] for reading in batches[1]] == [20.0]
+
+    stats = pool.get_stats()
+    assert [shard["messages"] for shard in stats["shards"]] == [2, 1]
+    assert stats["messages"] == 3
+    assert stats["errors"] == 0
+
+def test_without_a_batch_callback_readings_are_passed_one_at_a_time():
+    client = MQTTClient(decode_batch=2)
+    readings = []
+    client.set_data_callback(readings.append)
+    client.on_message(None, None, message("sensor_001", 10.0))
+    client.on_message(None, None, message("sensor_002", 20.0))
+    assert [reading["sensor_id"] for reading in readings] == ["sensor_001", "sensor_002"]
+
+def test_callback_errors_are_counted_not_raised():
+    pool = MQTTIngestPool(shards=2, shared_group="ingest", decode_batch=1)
+
+    def fail(readings):
+        raise RuntimeError("store unavailable")
+
+    pool.set_data_callback(lambda reading: None, batch_callback=fail)
+    pool.clients[1].on_message(None, None, message("sensor_001", 10.0))
+    pool.clients[1].on_message(None, None, SimpleNamespace(topic="airsense/sensors/sensor_001/air_quality",
+                                                           payload=b"{not json"))
+    stats = pool.get_stats()
+    assert stats["errors"] == 1
+    assert stats["invalid"] == 1
+    assert [shard["errors"] for shard in stats["shards"]] == [0, 1]
+
+def test_commands_go_through_a_connected_shard():
+    pool = MQTTIngestPool(shards=2, shared_group="ingest")
+    pahos = [FakePaho(), FakePaho()]
+    for client, paho in zip(pool.clients, pahos):
+        client.client = paho
+    pool.clients[1].connected = True
+    assert pool.connected
+    pool.publish_sensor_command("sensor_001", "calibrate", {"zero": True})
+    assert pahos[0].published == []
+    topic, body = pahos[1].published[0]
+    assert topic == "airsense/sensors/sensor_001/commands"
+    assert (body["command"], body["zero"]) == ("calibrate", True)
+
+def test_commands_are_dropped_while_disconnected():
+    pool = MQTTIngestPool(shards=2, shared_group="ingest")
+    paho = pool.clients[0].client = FakePaho()
+    pool.publish_sensor_command("sensor_001", "calibrate")
+    assert paho.published == []
+
+def test_connect_and_disconnect_flush_partial_batches(monkeypatch):
+    monkeypatch.setattr(mqtt_client.mqtt, "Client", FakePaho)
+    pool = MQTTIngestPool(shards=2, shared_group="ingest", client_id_prefix="worker", decode_batch=100,
+                          decode_max_delay=60.0)
+    batches = []
+    pool.set_data_callback(lambda reading: None, batch_callback=batches.append)
+
+    async def run():
+        await pool.connect()
+        assert pool.connected
+        assert [client.client.client_id for client in pool.clients] == ["worker-0", "worker-1"]
+        assert all(client.client.subscribed == client.subscription_topics() for client in pool.clients)
+        pool.clients[0].on_message(None, None, message("sensor_001", 10.0))
+        assert batches == []
+        await pool.disconnect()
+
+    asyncio.run(run())
+    assert not pool.connected
+    assert [[reading["sensor_id"] for reading in batch] for batch in batches] == [["sensor_001"]]
+    assert all(client._flusher is None for client in pool.clients)
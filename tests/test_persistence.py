@@ -0,0 +1,151 @@
+import asyncio
+import json
+
+from database import LocalTableClient
+from persistence import WriteBehindBuffer
+
+def reading(i: int) -> dict:
+    return {"sensor_id": f"sensor_{i % 3:03d}", "pm25": float(i)}
+
+class FlakyClient(LocalTableClient):
+    """LocalTableClient whose first ``failures`` writes raise"""
+
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+        self.attempts = 0
+
+    def table(self, name: str):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise ConnectionError("database unreachable")
+        return super().table(name)
+
+def make_buffer(client, **kwargs) -> WriteBehindBuffer:
+    options = dict(table="readings", batch_size=4, flush_interval=60, max_retries=2,
+                   retry_base_delay=0.001, retry_max_delay=0.001)
+    options.update(kwargs)
+    return WriteBehindBuffer(lambda: client, **options)
+
+def test_rows_are_written_in_batches():
+    client = LocalTableClient()
+    buffer = make_buffer(client)
+
+    async def scenario():
+        await buffer.start()
+        for i in range(3):
+            buffer.add(reading(i))
+        await asyncio.sleep(0.05)
+        # Less than a batch waits for flush_interval
+        assert buffer.rows_flushed == 0
+        for i in range(3, 10):
+            buffer.add(reading(i))
+        # A full batch wakes the flusher, which writes everything buffered
+        await asyncio.sleep(0.05)
+        assert buffer.rows_flushed == 10
+        assert buffer.flush_count == 3
+        await buffer.stop()
+
+    asyncio.run(scenario())
+    assert [row["pm25"] for row in client.tables["readings"]] == [float(i) for i in range(10)]
+    assert buffer.backlog == 0
+
+def test_row_builder_skips_rows():
+    client = LocalTableClient()
+    buffer = make_buffer(client, row_builder=lambda data: data if data["pm25"] % 2 == 0 else None)
+
+    async def scenario():
+        await buffer.start()
+        for i in range(6):
+            buffer.add(reading(i))
+        await buffer.stop()
+
+    asyncio.run(scenario())
+    assert len(client.tables["readings"]) == 3
+    assert buffer.rows_skipped == 3
+
+def test_failed_writes_are_retried_before_succeeding():
+    client = FlakyClient(failures=2)
+    buffer = make_buffer(client)
+
+    async def scenario():
+        await buffer.start()
+        for i in range(3):
+            buffer.add(reading(i))
+        await buffer.flush()
+        await buffer.stop()
+
+    asyncio.run(scenario())
+    assert len(client.tables["readings"]) == 3
+    assert buffer.failed_attempts == 2
+    assert buffer.rows_spooled == 0
+
+def test_rows_are_spooled_when_retries_run_out(tmp_path):
+    spool = tmp_path / "spool" / "readings.ndjson"
+    client = FlakyClient(failures=100)
+    buffer = make_buffer(client, spool_path=str(spool))
+
+    async def scenario():
+        await buffer.start()
+        for i in range(5):
+            buffer.add(reading(i))
+        await buffer.flush()
+        await buffer.stop()
+
+    asyncio.run(scenario())
+    assert "readings" not in client.tables
+    # Every batch gets max_retries + 1 attempts
+    assert buffer.failed_attempts == 2 * 3
+    assert buffer.rows_spooled == 5
+    assert [json.loads(line)["pm25"] for line in spool.read_text().splitlines()] == [float(i) for i in range(5)]
+
+def test_stop_spools_without_retrying(tmp_path):
+    spool = tmp_path / "readings.ndjson"
+    client = FlakyClient(failures=100)
+    buffer = make_buffer(client, spool_path=str(spool))
+
+    async def scenario():
+        await buffer.start()
+        buffer.add(reading(0))
+        await buffer.stop()
+
+    asyncio.run(scenario())
+    assert buffer.failed_attempts == 1
+    assert len(spool.read_text().splitlines()) == 1
+
+def test_spooled_rows_are_replayed_on_start(tmp_path):
+    spool = tmp_path / "readings.ndjson"
+
+    async def fail_then_replay():
+        failing = make_buffer(FlakyClient(failures=100), spool_path=str(spool))
+        await failing.start()
+        for i in range(5):
+            failing.add(reading(i))
+        await failing.stop()
+
+        client = LocalTableClient()
+        replaying = make_buffer(client, spool_path=str(spool))
+        await replaying.start()
+        replaying.add(reading(5))
+        await replaying.stop()
+        return client
+
+    client = asyncio.run(fail_then_replay())
+    # Spooled rows go first, ahead of anything added after start
+    assert [row["pm25"] for row in client.tables["readings"]] == [float(i) for i in range(6)]
+    assert not spool.exists()
+    assert not (tmp_path / "readings.ndjson.replay").exists()
+
+def test_replay_that_fails_again_is_kept(tmp_path):
+    spool = tmp_path / "readings.ndjson"
+    spool.write_text("".join(json.dumps(reading(i)) + "\n" for i in range(3)) + "not json\n")
+
+    async def replay_against_failing_database():
+        buffer = make_buffer(FlakyClient(failures=100), spool_path=str(spool))
+        await buffer.start()
+        await buffer.stop()
+
+    asyncio.run(replay_against_failing_database())
+    # The corrupt line is dropped; the rows are spooled again for the next start
+    assert len(spool.read_text().splitlines()) == 3
+    assert not (tmp_path / "readings.ndjson.replay").exists()
@@ -0,0 +1,49 @@
+from models import SensorStatus
+from registry import SensorRegistry
+
+def sensor(i: int) -> dict:
+    return {"id": f"sensor_{i:03d}", "name": f"Station {i}", "location": "Toronto, ON",
+            "coordinates": [43.6 + i / 100, -79.4]}
+
+def make_registry(count: int = 3) -> SensorRegistry:
+    registry = SensorRegistry()
+    registry.load([sensor(i) for i in range(count)], "test")
+    return registry
+
+def test_unfiltered_query_is_sorted_and_paged():
+    registry = make_registry(5)
+    page, total, _ = registry.query(offset=1, limit=2)
+    assert [record["id"] for record in page] == ["sensor_001", "sensor_002"]
+    assert total == 5
+
+def test_status_change_invalidates_the_etag():
+    registry = make_registry()
+    _, _, etag = registry.query()
+    assert registry.query()[2] == etag
+    registry.set_status("sensor_001", SensorStatus.OFFLINE)
+    page, _, changed = registry.query()
+    assert changed != etag
+    assert page[1]["status"] == SensorStatus.OFFLINE.value
+
+def test_added_and_removed_sensors_show_up_in_the_next_query():
+    registry = make_registry()
+    registry.query()
+    registry.upsert(sensor(10))
+    page, total, _ = registry.query()
+    assert total == 4 and page[-1]["id"] == "sensor_010"
+    registry.remove("sensor_000")
+    page, total, _ = registry.query()
+    assert total == 3 and page[0]["id"] == "sensor_001"
+
+def test_etags_depend_on_content_not_on_process_history():
+    # Two workers (or one after a restart) that reached the same content by different routes
+    first, second = make_registry(), make_registry()
+    second.upsert(sensor(1))
+    second.set_status("sensor_002", SensorStatus.OFFLINE)
+    second.set_status("sensor_002", SensorStatus.ONLINE)
+    assert first.query() == second.query()
+    assert first.query(offset=1, limit=1)[2] == second.query(offset=1, limit=1)[2]
+    # Same revision count, different content
+    first.set_status("sensor_000", SensorStatus.OFFLINE)
+    second.set_status("sensor_000", SensorStatus.MAINTENANCE)
+    assert first.query()[2] != second.query()[2]
@@ -0,0 +1,129 @@
+import asyncio
+import csv
+import gzip
+import json
+import time
+from datetime import datetime
+
+import pytest
+
+import replay
+from replay import ArchiveReader, Pacer
+
+START = 1_700_000_000.0
+
+def rows(count: int, spacing: float = 1.0) -> list:
+    return [{"id": i, "sensor_id": f"sensor_{i % 3:03d}", "timestamp": START + i * spacing,
+             "pm25": float(i), "location": "Toronto, ON"} for i in range(count)]
+
+def write_ndjson(path, records, trailing_newline: bool = True):
+    text = "\n".join(json.dumps(record) for record in records)
+    path.write_text(text + ("\n" if trailing_newline else ""))
+    return str(path)
+
+def read_all(reader: ArchiveReader) -> list:
+    return [reading for chunk in reader.chunks() for reading in chunk]
+
+class CollectingTarget:
+    name = "collect"
+
+    def __init__(self):
+        self.readings = []
+        self.sent_at = []
+
+    async def start(self):
+        pass
+
+    async def send(self, readings):
+        self.readings.extend(readings)
+        self.sent_at.extend(time.monotonic() for _ in readings)
+
+    async def stop(self):
+        pass
+
+    def get_stats(self) -> dict:
+        return {"received": len(self.readings)}
+
+@pytest.mark.parametrize("trailing_newline", [True, False])
+def test_mmap_blocks_split_on_line_boundaries(tmp_path, monkeypatch, trailing_newline):
+    # Blocks smaller than some lines and not aligned to any of them
+    monkeypatch.setattr(replay, "_BLOCK", 97)
+    records = rows(50)
+    records[10]["note"] = "x" * 300
+    reader = ArchiveReader(write_ndjson(tmp_path / "archive.ndjson", records, trailing_newline), chunk_rows=7)
+    readings = read_all(reader)
+    assert [reading["pm25"] for reading in readings] == [float(i) for i in range(50)]
+    assert readings[10]["note"] == "x" * 300
+    assert reader.rows == 50 and reader.invalid == 0
+
+def test_readings_drop_export_columns_and_carry_epoch_time(tmp_path):
+    (reading,) = read_all(ArchiveReader(write_ndjson(tmp_path / "one.jsonl", rows(1))))
+    assert "id" not in reading
+    assert reading["_at"] == START
+
+def test_invalid_rows_are_counted_and_skipped(tmp_path):
+    path = tmp_path / "archive.ndjson"
+    path.write_text("\n".join([
+        json.dumps(rows(1)[0]),
+        "{not json",
+        json.dumps({"sensor_id": "sensor_001"}),
+        json.dumps({"sensor_id": "sensor_001", "timestamp": START, "pm25": "high"}),
+        "[1, 2]",
+        "",
+        json.dumps(rows(2)[1]),
+    ]))
+    reader = ArchiveReader(str(path))
+    assert [reading["pm25"] for reading in read_all(reader)] == [0.0, 1.0]
+    assert (reader.rows, reader.invalid) == (6, 4)
+
+def test_gzipped_ndjson_and_csv(tmp_path):
+    with gzip.open(tmp_path / "archive.ndjson.gz", "wt") as archive:
+        archive.write("".join(json.dumps(record) + "\n" for record in rows(5)))
+    assert len(read_all(ArchiveReader(str(tmp_path / "archive.ndjson.gz")))) == 5
+
+    with open(tmp_path / "archive.csv", "w", newline="") as archive:
+        writer = csv.DictWriter(archive, fieldnames=["id", "sensor_id", "timestamp", "pm25", "co2"])
+        writer.writeheader()
+        for record in rows(5):
+            writer.writerow({"id": record["id"], "sensor_id": record["sensor_id"], "pm25": record["pm25"],
+                             "timestamp": datetime.fromtimestamp(record["timestamp"]).isoformat()})
+    readings = read_all(ArchiveReader(str(tmp_path / "archive.csv")))
+    # CSV values arrive as strings; empty cells are missing metrics
+    assert readings[3]["pm25"] == 3.0 and "co2" not in readings[3]
+
+def test_unknown_extensions_need_a_format():
+    with pytest.raises(ValueError):
+        ArchiveReader("archive.txt")
+
+def test_limit_stops_mid_chunk(tmp_path):
+    target = CollectingTarget()
+    path = write_ndjson(tmp_path / "archive.ndjson", rows(20))
+    result = asyncio.run(replay.replay([path, path], target, chunk_rows=3, limit=7))
+    assert result["rows"] == 7
+    assert [reading["pm25"] for reading in target.readings] == [float(i) for i in range(7)]
+    assert "_at" not in target.readings[0]
+
+def test_negative_limit_is_rejected(tmp_path):
+    path = write_ndjson(tmp_path / "archive.ndjson", rows(3))
+    with pytest.raises(SystemExit) as exit:
+        replay.main([path, "--limit", "-1"])
+    assert exit.value.code == 2
+
+def test_pacing_follows_archive_time():
+    pacer = Pacer(10.0)
+    first = pacer.due(START)
+    second = pacer.due(START + 2.0)
+    assert second - first == pytest.approx(0.2)
+    assert 0.15 < pacer.delay(second) <= 0.2
+    unpaced = Pacer(None)
+    unpaced.due(START)
+    assert unpaced.delay(unpaced.due(START + 3600)) == 0.0
+
+def test_paced_replay_spaces_rows_and_retimes_them(tmp_path):
+    target = CollectingTarget()
+    path = write_ndjson(tmp_path / "archive.ndjson", rows(4, spacing=0.5))
+    asyncio.run(replay.replay([path], target, speed=10.0, retime=True))
+    gaps = [b - a for a, b in zip(target.sent_at, target.sent_at[1:])]
+    assert all(gap >= 0.04 for gap in gaps)
+    stamps = [reading["timestamp"] for reading in target.readings]
+    assert stamps == sorted(stamps) and isinstance(stamps[0], str)
@@ -0,0 +1,36 @@
+import numpy as np
+
+from rollups import RollupStore, rollup_arrays
+
+TIERS = {"1m": (60, 10), "1h": (3600, 24)}
+
+def feed(store: RollupStore, start: float, minutes: int):
+    for minute in range(minutes):
+        for second in (0, 30):
+            store.add({"sensor_id": "s1", "timestamp": start + minute * 60 + second,
+                       "pm25": float(minute), "humidity": 50.0 + second})
+
+def test_persisted_rows_round_trip_to_store_arrays():
+    rows = []
+    store = RollupStore(tiers=TIERS, on_close=rows.append)
+    feed(store, 1_700_000_000 // 3600 * 3600, 5)
+    store.flush_open()
+    starts, stats = rollup_arrays([row for row in rows if row["tier"] == "1m"])
+    memory_starts, memory_stats = store.query("s1", "1m", 0, 2e9)
+    np.testing.assert_array_equal(starts, memory_starts)
+    np.testing.assert_array_equal(stats, memory_stats)
+
+def test_coverage_starts_at_the_oldest_bucket_held():
+    store = RollupStore(tiers=TIERS)
+    assert store.coverage_start("s1", "1m") is None
+    start = 1_700_000_000 // 3600 * 3600
+    feed(store, start, 1)
+    assert store.coverage_start("s1", "1m") == start
+    # The 1m ring keeps 10 closed buckets; older ones are only in the database
+    feed(store, start + 60, 15)
+    assert store.coverage_start("s1", "1m") == start + 5 * 60
+    assert store.coverage_start("s1", "1h") == start
+
+def test_rows_without_known_metrics_are_ignored():
+    starts, stats = rollup_arrays([{"metric": "ozone", "bucket_start": 0}])
+    assert starts.shape == (0,) and stats.shape[0] == 0
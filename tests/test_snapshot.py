@@ -0,0 +1,144 @@
+import asyncio
+import gzip
+from email.utils import formatdate
+
+import pytest
+from starlette.requests import Request
+
+import main
+import snapshot
+from snapshot import Snapshot, SnapshotCache, loads, negotiate_encoding
+
+class Clock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+def make_cache():
+    state = {"value": 1}
+    clock = Clock(1_700_000_000.0)
+    return SnapshotCache(lambda: {"value": state["value"]}, clock=clock), state, clock
+
+def test_get_reuses_the_snapshot_until_marked_changed():
+    cache, state, clock = make_cache()
+    first = cache.get()
+    assert cache.get() is first
+    state["value"] = 2
+    assert cache.get() is first  # not rebuilt until a writer marks it changed
+    clock.now += 5
+    cache.mark_changed()
+    second = cache.get()
+    assert loads(second.body) == {"value": 2}
+    assert second.etag != first.etag
+    assert second.modified_at == first.modified_at + 5
+    assert cache.get_stats()["builds"] == 2
+    assert cache.get_stats()["hits"] == 2
+
+def test_etag_depends_only_on_the_body():
+    assert Snapshot(1, b"{}", 0).etag == Snapshot(7, b"{}", 100).etag
+    assert Snapshot(1, b"{}", 0).etag != Snapshot(1, b"[]", 0).etag
+
+def test_if_none_match():
+    shot = Snapshot(1, b'{"a":1}', 1_700_000_000)
+    assert shot.not_modified(shot.etag, None)
+    assert shot.not_modified(f'"other", W/{shot.etag}', None)
+    assert shot.not_modified("*", None)
+    assert not shot.not_modified('"other"', None)
+    # If-None-Match wins over a matching If-Modified-Since
+    assert not shot.not_modified('"other"', shot.last_modified)
+
+def test_if_modified_since():
+    shot = Snapshot(1, b'{"a":1}', 1_700_000_000)
+    assert shot.not_modified(None, shot.last_modified)
+    assert shot.not_modified(None, formatdate(1_700_000_060, usegmt=True))
+    assert not shot.not_modified(None, formatdate(1_699_999_999, usegmt=True))
+    assert not shot.not_modified(None, "not a date")
+    assert not shot.not_modified(None, None)
+
+@pytest.mark.parametrize("header, expected", [
+    ("", None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("deflate, gzip;q=0.5", "gzip"),
+    ("gzip;q=0", None),
+    ("gzip; q=0.0, deflate", None),
+    ("GZIP;Q=0", None),
+    ("gzip;level=1;q=0", None),
+    ("gzip;q=bogus", None),
+    ("*", "gzip"),
+    ("*;q=0", None),
+    ("*, gzip;q=0", None),
+    ("br;q=0, *", "gzip"),
+])
+def test_negotiate_encoding_without_brotli(monkeypatch, header, expected):
+    monkeypatch.setattr(snapshot, "brotli", None)
+    assert negotiate_encoding(header) == expected
+
+class FakeBrotli:
+    @staticmethod
+    def compress(body: bytes, quality: int) -> bytes:
+        return b"br:" + body
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, br", "br"),
+    ("br;q=0, gzip", "gzip"),
+    ("br;q=0, gzip;q=0", None),
+    ("*", "br"),
+])
+def test_negotiate_encoding_prefers_brotli(monkeypatch, header, expected):
+    monkeypatch.setattr(snapshot, "brotli", FakeBrotli)
+    assert negotiate_encoding(header) == expected
+
+def test_encoded_variants_are_built_once(monkeypatch):
+    monkeypatch.setattr(snapshot, "brotli", FakeBrotli)
+    shot = Snapshot(1, b'{"a":1}', 0)
+    assert shot.encoded(None) is shot.body
+    compressed = shot.encoded("gzip")
+    assert gzip.decompress(compressed) == shot.body
+    assert shot.encoded("gzip") is compressed
+    assert shot.encoded("br") == b'br:{"a":1}'
+
+def request(**headers) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/api/data/latest",
+        "query_string": b"",
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]
+    })
+
+@pytest.fixture
+def latest(monkeypatch):
+    cache = SnapshotCache(lambda: {"sensor_001": {"pm25": 12.0}}, clock=Clock(1_700_000_000.0))
+    monkeypatch.setattr(main, "latest_snapshot", cache)
+    monkeypatch.setattr(snapshot, "brotli", None)
+    return cache
+
+def test_latest_data_is_gzipped_when_accepted(latest):
+    response = asyncio.run(main.get_latest_data(request(accept_encoding="gzip, deflate")))
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert loads(gzip.decompress(response.body)) == {"sensor_001": {"pm25": 12.0}}
+
+def test_latest_data_is_plain_when_gzip_is_refused(latest):
+    response = asyncio.run(main.get_latest_data(request(accept_encoding="gzip;q=0")))
+    assert "content-encoding" not in response.headers
+    assert loads(response.body) == {"sensor_001": {"pm25": 12.0}}
+
+def test_latest_data_answers_304_for_a_matching_etag(latest):
+    first = asyncio.run(main.get_latest_data(request()))
+    etag = first.headers["etag"]
+    response = asyncio.run(main.get_latest_data(request(if_none_match=etag)))
+    assert response.status_code == 304
+    assert response.body == b""
+    assert response.headers["etag"] == etag
+    assert latest.get_stats()["not_modified"] == 1
+
+    latest.mark_changed()
+    response = asyncio.run(main.get_latest_data(request(if_none_match=etag)))
+    # The rebuilt body is identical, so the ETag still matches
+    assert response.status_code == 304
+    assert latest.get_stats()["builds"] == 2
@@ -0,0 +1,41 @@
+from subscriptions import SubscriptionIndex
+
+LOCATIONS = {"inside": (40.7, -74.0), "outside": (34.0, -118.2)}
+
+def make_index(**kwargs) -> SubscriptionIndex:
+    return SubscriptionIndex(LOCATIONS.get, **kwargs)
+
+def test_bbox_matches_sensors_inside_it():
+    index = make_index()
+    index.subscribe_bbox("client", [40.0, -75.0, 41.0, -73.0])
+    assert index.match("inside") == {"client"}
+    assert index.match("outside") == frozenset()
+
+def test_duplicate_bbox_subscription_is_removed_by_one_unsubscribe():
+    index = make_index()
+    bbox = [40.0, -75.0, 41.0, -73.0]
+    index.subscribe_bbox("client", bbox)
+    index.subscribe_bbox("client", bbox)
+    index.unsubscribe_bbox("client", bbox)
+    assert index.match("inside") == frozenset()
+    assert "client" not in index
+    assert not index._grid
+
+def test_duplicate_wide_bbox_subscription_is_removed_by_one_unsubscribe():
+    index = make_index(max_cells_per_bbox=1)
+    bbox = [30.0, -120.0, 45.0, -70.0]
+    index.subscribe_bbox("client", bbox)
+    index.subscribe_bbox("client", bbox)
+    assert index.match("outside") == {"client"}
+    index.unsubscribe_bbox("client", bbox)
+    assert index.match("outside") == frozenset()
+    assert not index._wide_bboxes
+
+def test_other_clients_keep_a_shared_bbox():
+    index = make_index()
+    bbox = [40.0, -75.0, 41.0, -73.0]
+    index.subscribe_bbox("a", bbox)
+    index.subscribe_bbox("b", bbox)
+    index.subscribe_bbox("a", bbox)
+    index.unsubscribe_bbox("a", bbox)
+    assert index.match("inside") == {"b"}
@@ -0,0 +1,103 @@
+import asyncio
+from datetime import datetime
+
+import numpy as np
+
+from decoding import validate_reading
+from synthetic import CITIES, SyntheticFleet, SyntheticLoadGenerator, sensor_ids
+
+NOW = datetime(2026, 3, 2, 8, 0).timestamp()
+
+def test_sensor_ids_start_with_the_catalog_sensors():
+    assert sensor_ids(3) == ["sensor_001", "sensor_002", "sensor_003"]
+    assert sensor_ids(1200)[-1] == "sensor_1200"
+
+def test_metadata_spreads_sensors_over_the_cities():
+    fleet = SyntheticFleet(20, seed=1)
+    rows = fleet.metadata()
+    assert [row["id"] for row in rows] == fleet.ids
+    assert rows[0]["name"] == "Downtown Station 1"
+    assert rows[0]["coordinates"] == [CITIES[0][2], CITIES[0][3]]
+    assert {row["location"] for row in rows} == {city[1] for city in CITIES}
+    for row in rows:
+        _, location, lat, lon = next(city for city in CITIES if city[1] == row["location"])
+        assert abs(row["coordinates"][0] - lat) < 0.5 and abs(row["coordinates"][1] - lon) < 0.5
+
+def test_the_same_seed_gives_the_same_readings():
+    index = np.arange(50)
+    first = SyntheticFleet(50, seed=7).readings(index, NOW)
+    assert first == SyntheticFleet(50, seed=7).readings(index, NOW)
+    assert first != SyntheticFleet(50, seed=8).readings(index, NOW)
+
+def test_readings_are_plausible_and_pass_validation():
+    fleet = SyntheticFleet(500, seed=3)
+    index = np.arange(500)
+    for step in range(20):
+        for reading in fleet.readings(index, NOW + step * fleet.interval):
+            payload = {key: value for key, value in reading.items() if key not in ("sensor_id", "timestamp")}
+            assert validate_reading(dict(payload)) == payload
+            assert 0 < reading["pm25"] <= reading["pm10"]
+            assert reading["co2"] >= 350
+            assert 15 <= reading["humidity"] <= 100
+            assert -20 < reading["temperature"] < 45
+
+def test_only_the_requested_sensors_advance():
+    fleet = SyntheticFleet(10, seed=2)
+    before = fleet.local.copy()
+    readings = fleet.readings(np.array([2, 5]), NOW)
+    assert [reading["sensor_id"] for reading in readings] == ["sensor_003", "sensor_006"]
+    assert readings[0]["timestamp"] == datetime.fromtimestamp(NOW).isoformat()
+    changed = np.flatnonzero((fleet.local != before).any(axis=1))
+    assert changed.tolist() == [2, 5]
+
+def test_incidents_raise_particulates_for_a_while():
+    index = np.arange(200)
+    calm = SyntheticFleet(200, seed=4, incident_rate=0.0)
+    polluted = SyntheticFleet(200, seed=4, incident_rate=1e6)
+    calm_pm25 = np.array([reading["pm25"] for reading in calm.readings(index, NOW)])
+    polluted_pm25 = np.array([reading["pm25"] for reading in polluted.readings(index, NOW)])
+    assert (polluted.incident_until > NOW).all()
+    assert (polluted.incident_factor >= 3).all()
+    assert np.median(polluted_pm25 / calm_pm25) > 2.5
+
+def test_generate_walks_the_fleet_round_robin():
+    batches = []
+    generator = SyntheticLoadGenerator(SyntheticFleet(5, seed=1), batches.append)
+    generator._generate(3)
+    generator._generate(3)
+    assert [[reading["sensor_id"] for reading in batch] for batch in batches] == [
+        ["sensor_001", "sensor_002", "sensor_003"],
+        ["sensor_004", "sensor_005", "sensor_001"],
+    ]
+    stats = generator.get_stats()
+    assert (stats["readings"], stats["batches"], stats["errors"]) == (6, 2, 0)
+
+def test_emit_errors_are_counted_and_generation_continues():
+    def fail(readings):
+        raise RuntimeError("queue closed")
+
+    generator = SyntheticLoadGenerator(SyntheticFleet(5, seed=1), fail)
+    generator._generate(2)
+    generator._generate(2)
+    stats = generator.get_stats()
+    assert (stats["readings"], stats["errors"]) == (0, 2)
+    assert generator._cursor == 4
+
+def test_background_task_reports_every_sensor_each_interval():
+    batches = []
+    fleet = SyntheticFleet(100, interval=0.2, seed=1)
+    generator = SyntheticLoadGenerator(fleet, batches.append, tick=0.01)
+
+    async def run():
+        generator.start()
+        generator.start()  # already running
+        await asyncio.sleep(0.45)
+        await generator.stop()
+
+    asyncio.run(run())
+    assert not generator.running
+    readings = [reading["sensor_id"] for batch in batches for reading in batch]
+    # About two intervals' worth, in round-robin order
+    assert 100 <= len(readings) <= 250
+    assert readings[:100] == fleet.ids
+    assert generator.get_stats()["target_per_sec"] == 500.0
@@ -0,0 +1,165 @@
+import asyncio
+import json
+
+from fanout import EVICT
+from frames import SensorDictionary, decode_columnar
+from websocket_manager import ConnectionManager
+
+class FakeSocket:
+    """Records what is written to it; a stalled socket never finishes a send"""
+
+    def __init__(self, encoding: str = "json", stalled: bool = False):
+        self.query_params = {"encoding": encoding}
+        self.stalled = stalled
+        self.frames = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, frame):
+        await self._send(frame)
+
+    async def send_bytes(self, frame):
+        await self._send(frame)
+
+    async def _send(self, frame):
+        if self.stalled:
+            await asyncio.Event().wait()
+        self.frames.append(frame)
+
+def reading(pm25: float) -> dict:
+    return {"timestamp": "2024-01-01T12:00:00", "pm25": pm25}
+
+def connected(manager: ConnectionManager, *websockets):
+    """Connect every socket and leave each stalled one with a full queue"""
+    async def connect():
+        for websocket in websockets:
+            await manager.connect(websocket)
+        await asyncio.sleep(0)
+        for websocket in websockets:
+            if websocket.stalled:
+                await manager.send_personal_message({"type": "ping"}, websocket)
+    return connect()
+
+def test_eviction_during_dictionary_sync_does_not_abort_the_broadcast():
+    manager = ConnectionManager(max_queue=8, slow_consumer_policy=EVICT, lag_threshold=2)
+    stalled, healthy, late = FakeSocket("columnar", stalled=True), FakeSocket("columnar"), FakeSocket("columnar")
+
+    async def scenario():
+        await connected(manager, stalled, healthy, late)
+        # Syncing the dictionary for the new sensor evicts the stalled client
+        await manager.broadcast_sensor_data({"sensor_001": reading(10.0)})
+        await asyncio.sleep(0)
+        await manager.broadcast_sensor_data({"sensor_002": reading(20.0)})
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert stalled not in manager.active_connections
+    assert manager.evicted_count == 1
+    for websocket in (healthy, late):
+        dictionary = SensorDictionary()
+        updates = []
+        for frame in websocket.frames:
+            if isinstance(frame, bytes):
+                updates.append(decode_columnar(frame, dictionary))
+            elif '"sensor_dictionary"' in frame:
+                dictionary.extend(json.loads(frame)["ids"])
+        assert [list(update["data"]) for update in updates] == [["sensor_001"], ["sensor_002"]]
+        assert [update["seq"] for update in updates] == [1, 2]
+
+def test_eviction_of_a_subscribed_client_mid_broadcast():
+    manager = ConnectionManager(max_queue=8, slow_consumer_policy=EVICT, lag_threshold=2)
+    healthy, stalled = FakeSocket("columnar"), FakeSocket("columnar", stalled=True)
+
+    async def scenario():
+        await connected(manager, healthy, stalled)
+        for websocket in (healthy, stalled):
+            manager.subscriptions.subscribe_sensor(websocket, "sensor_001")
+        # Encoding the group's frame for the healthy client evicts the stalled one
+        await manager.broadcast_sensor_data({"sensor_001": reading(10.0)})
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert stalled not in manager.active_connections
+    assert decode_columnar(healthy.frames[-1], manager.dictionary)["type"] == "sensor_update"
+
+def messages(websocket: FakeSocket) -> list:
+    return [json.loads(frame) for frame in websocket.frames]
+
+def queued(manager: ConnectionManager, websocket: FakeSocket) -> list:
+    return [(kind, json.loads(frame)) for kind, frame in manager.active_connections[websocket]._queue]
+
+def test_deltas_are_coalesced_and_numbered():
+    manager = ConnectionManager(delta_window=0.01)
+    manager.snapshot_provider = lambda: {"sensor_001": reading(1.0)}
+    websocket = FakeSocket()
+
+    async def scenario():
+        await manager.connect(websocket)
+        manager.queue_sensor_update("sensor_001", reading(10.0))
+        manager.queue_sensor_update("sensor_001", reading(11.0))
+        manager.queue_sensor_update("sensor_002", reading(20.0))
+        await asyncio.sleep(0.05)
+        manager.queue_sensor_update("sensor_002", reading(21.0))
+        await asyncio.sleep(0.05)
+
+    asyncio.run(scenario())
+    received = messages(websocket)
+    assert [(message["type"], message["seq"]) for message in received] == \
+        [("connection", 0), ("sensor_data", 0), ("sensor_update", 1), ("sensor_update", 2)]
+    assert received[2]["data"] == {"sensor_001": reading(11.0), "sensor_002": reading(20.0)}
+    assert received[3]["data"] == {"sensor_002": reading(21.0)}
+
+def test_resync_sends_a_snapshot_at_the_current_seq():
+    manager = ConnectionManager()
+    manager.snapshot_provider = lambda: {"sensor_001": reading(1.0), "sensor_002": reading(2.0)}
+    websocket = FakeSocket()
+
+    async def scenario():
+        await manager.connect(websocket)
+        for value in (10.0, 11.0):
+            await manager.broadcast_sensor_data({"sensor_001": reading(value)})
+        await asyncio.sleep(0.01)
+        await manager.handle_client_message(websocket, json.dumps({"type": "resync"}))
+        await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+    snapshot = messages(websocket)[-1]
+    assert (snapshot["type"], snapshot["seq"]) == ("sensor_data", 2)
+    assert set(snapshot["data"]) == {"sensor_001", "sensor_002"}
+
+def test_filtered_clients_are_resynced_when_a_delta_is_dropped():
+    # A filtered client skips seq numbers for sensors it doesn't follow, so it
+    # can't tell a dropped delta from a filtered one; the server resyncs it
+    manager = ConnectionManager(max_queue=2)
+    manager.snapshot_provider = lambda: {"sensor_001": reading(1.0), "sensor_002": reading(2.0)}
+    stalled = FakeSocket(stalled=True)
+
+    async def scenario():
+        await manager.connect(stalled)
+        await asyncio.sleep(0)
+        manager.subscriptions.subscribe_sensor(stalled, "sensor_001")
+        for value in (10.0, 11.0, 12.0):
+            await manager.broadcast_sensor_data({"sensor_001": reading(value), "sensor_002": reading(value)})
+        return queued(manager, stalled)
+
+    pending = asyncio.run(scenario())
+    # The resync snapshot took the place of the one already pending; the delta
+    # after it carries no newer seq, so the client skips it
+    assert [(kind, message["seq"]) for kind, message in pending] == [("sensor_data", 3), ("sensor_delta", 3)]
+    snapshot = pending[0][1]
+    assert set(snapshot["data"]) == {"sensor_001"}
+
+def test_no_resync_without_drops():
+    manager = ConnectionManager(max_queue=8)
+    manager.snapshot_provider = lambda: {"sensor_001": reading(1.0)}
+    stalled = FakeSocket(stalled=True)
+
+    async def scenario():
+        await manager.connect(stalled)
+        await asyncio.sleep(0)
+        for value in (10.0, 11.0):
+            await manager.broadcast_sensor_data({"sensor_001": reading(value)})
+        return queued(manager, stalled)
+
+    assert [kind for kind, _ in asyncio.run(scenario())] == ["sensor_data", "sensor_delta", "sensor_delta"]
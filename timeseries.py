@@ -0,0 +1,159 @@
+import numpy as np
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import time
+
+# Metrics kept for every reading, in column order
+METRICS = ("pm25", "pm10", "co2", "temperature", "humidity", "aqi")
+
+def to_epoch(value) -> float:
+    """Convert a reading timestamp (ISO string, datetime or number) to epoch seconds"""
+    if value is None:
+        return time.time()
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+
+class SensorRingBuffer:
+    """Fixed-capacity, array-backed ring of readings for one sensor.
+
+    Timestamps live in a float64 array and metrics in a (capacity, width)
+    float64 array, one column per entry of METRICS by default. Readings must arrive in timestamp order; late readings are
+    rejected so range queries can binary-search both ring segments.
+    """
+
+    __slots__ = ("capacity", "timestamps", "values", "head", "size", "rejected")
+
+    def __init__(self, capacity: int, width: int = len(METRICS)):
+        self.capacity = capacity
+        self.timestamps = np.empty(capacity, dtype=np.float64)
+        self.values = np.empty((capacity, width), dtype=np.float64)
+        self.head = 0  # next slot to write
+        self.size = 0
+        self.rejected = 0
+
+    @property
+    def last_timestamp(self) -> Optional[float]:
+        if not self.size:
+            return None
+        return float(self.timestamps[(self.head - 1) % self.capacity])
+
+    @property
+    def first_timestamp(self) -> Optional[float]:
+        if not self.size:
+            return None
+        return float(self.timestamps[(self.head - self.size) % self.capacity])
+
+    def append(self, timestamp: float, values) -> bool:
+        last = self.last_timestamp
+        if last is not None and timestamp < last:
+            self.rejected += 1
+            return False
+        self.timestamps[self.head] = timestamp
+        self.values[self.head] = values
+        self.head = (self.head + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+        return True
+
+    def _segments(self) -> List[Tuple[int, int]]:
+        """Index ranges of the ring in chronological order"""
+        if self.size < self.capacity:
+            return [(0, self.size)]
+        if self.head == 0:
+            return [(0, self.capacity)]
+        return [(self.head, self.capacity), (0, self.head)]
+
+    def range(self, start: float, end: float, limit: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Readings with start <= timestamp <= end, oldest first, at most ``limit`` of them"""
+        ts_parts, value_parts = [], []
+        remaining = self.capacity if limit is None else limit
+        for lo, hi in self._segments():
+            segment = self.timestamps[lo:hi]
+            i = lo + int(np.searchsorted(segment, start, side="left"))
+            j = min(lo + int(np.searchsorted(segment, end, side="right")), i + remaining)
+            if i < j:
+                ts_parts.append(self.timestamps[i:j])
+                value_parts.append(self.values[i:j])
+                remaining -= j - i
+        if not ts_parts:
+            return np.empty(0), np.empty((0, self.values.shape[1]))
+        if len(ts_parts) == 1:
+            return ts_parts[0].copy(), value_parts[0].copy()
+        return np.concatenate(ts_parts), np.concatenate(value_parts)
+
+    @property
+    def nbytes(self) -> int:
+        return self.timestamps.nbytes + self.values.nbytes
+
+class TimeSeriesStore:
+    """In-process store of recent readings, one ring buffer per sensor"""
+
+    def __init__(self, capacity: int = 8640):
+        self.capacity = capacity
+        self.buffers: Dict[str, SensorRingBuffer] = {}
+
+    def add(self, data: dict) -> bool:
+        """Record a reading; missing metrics are stored as NaN"""
+        sensor_id = data.get("sensor_id")
+        if sensor_id is None:
+            return False
+        try:
+            timestamp = to_epoch(data.get("timestamp"))
+        except (TypeError, ValueError):
+            return False
+        buffer = self.buffers.get(sensor_id)
+        if buffer is None:
+            buffer = self.buffers[sensor_id] = SensorRingBuffer(self.capacity)
+        values = [data.get(metric) for metric in METRICS]
+        return buffer.append(timestamp, [np.nan if v is None else v for v in values])
+
+    def __contains__(self, sensor_id: str) -> bool:
+        return sensor_id in self.buffers
+
+    def coverage_start(self, sensor_id: str) -> Optional[float]:
+        """Timestamp of a sensor's oldest reading still held; older ones are only in the database"""
+        buffer = self.buffers.get(sensor_id)
+        return None if buffer is None else buffer.first_timestamp
+
+    def query(self, sensor_id: str, start: float, end: Optional[float] = None,
+              limit: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Timestamps and metric rows for a sensor within [start, end], at most ``limit``"""
+        buffer = self.buffers.get(sensor_id)
+        if buffer is None:
+            return np.empty(0), np.empty((0, len(METRICS)))
+        return buffer.range(start, time.time() if end is None else end, limit)
+
+    def query_records(self, sensor_id: str, start: float, end: Optional[float] = None) -> List[dict]:
+        """Same as ``query`` but as a list of reading dicts"""
+        timestamps, values = self.query(sensor_id, start, end)
+        return to_records(timestamps, values)
+
+    def get_stats(self) -> dict:
+        """Report per-sensor capacity and memory usage"""
+        return {
+            "sensors": len(self.buffers),
+            "capacity_per_sensor": self.capacity,
+            "bytes_per_sensor": self.capacity * 8 * (1 + len(METRICS)),
+            "total_bytes": sum(buffer.nbytes for buffer in self.buffers.values()),
+            "readings": sum(buffer.size for buffer in self.buffers.values()),
+            "rejected_out_of_order": sum(buffer.rejected for buffer in self.buffers.values())
+        }
+
+def to_records(timestamps: np.ndarray, values: np.ndarray) -> List[dict]:
+    """Convert timestamp/value arrays into JSON-friendly reading dicts"""
+    records = []
+    columns = values.T.tolist()
+    for i, ts in enumerate(timestamps.tolist()):
+        record = {"timestamp": datetime.fromtimestamp(ts).isoformat()}
+        for metric, column in zip(METRICS, columns):
+            value = column[i]
+            if value != value:
+                value = None
+            elif metric == "aqi":
+                value = int(value)
+            record[metric] = value
+        records.append(record)
+    return records
@@ -1,75 +1,311 @@
 from fastapi import WebSocket
-from typing import List
+from typing import Callable, Dict, List, Optional, Set, Tuple
 import json
 import asyncio
+import time
 from datetime import datetime
 
+from fanout import OutboundChannel, CONFLATE, Frame
+from frames import (COLUMNAR, DEFLATE, FrameCompressor, SensorDictionary, available_encodings,
+                    encode_message, encode_sensor_frame, negotiate)
+from subscriptions import SubscriptionIndex
+from timeseries import METRICS
+
+class _FrameVariants:
+    """One outgoing message, encoded at most once per encoding and compressed
+    at most once per encoding, however many clients it goes to"""
+
+    __slots__ = ("encode", "compressor", "_frames")
+
+    def __init__(self, encode: Callable[[str], Frame], compressor: FrameCompressor):
+        self.encode = encode
+        self.compressor = compressor
+        self._frames: Dict[Tuple[str, bool], Tuple[Frame, int]] = {}
+
+    def offer(self, channel: OutboundChannel, encoding: str, compress: bool, kind: Optional[str]) -> bool:
+        entry = self._frames.get((encoding, compress))
+        if entry is None:
+            raw = self._frames.get((encoding, False))
+            if raw is None:
+                raw = self._frames[(encoding, False)] = (self.encode(encoding), 0)
+            entry = self._frames[(encoding, compress)] = self.compressor.compress(raw[0]) if compress else raw
+        frame, saved = entry
+        if compress:
+            self.compressor.record_send(saved)
+        return channel.offer(frame, kind)
+
 class ConnectionManager:
     """Manages WebSocket connections for real-time data broadcasting"""
     
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    def __init__(self, broadcast_interval: float = 5.0, max_queue: int = 256,
+                 slow_consumer_policy: str = CONFLATE, lag_threshold: Optional[int] = None,
+                 delta_window: float = 0.25,
+                 coordinates_for: Optional[Callable[[str], Optional[Tuple[float, float]]]] = None,
+                 compression_level: int = 6, compression_min_size: int = 512):
+        # Keyed by socket so connect/disconnect/lookup are O(1)
+        self.active_connections: Dict[WebSocket, OutboundChannel] = {}
         self.connection_data: dict = {}
+        self.max_queue = max_queue
+        self.slow_consumer_policy = slow_consumer_policy
+        self.lag_threshold = lag_threshold
+        self.evicted_count = 0
+        self._connection_counter = 0
+
+        # Shared broadcast ticker (one per server, not per connection)
+        self.broadcast_interval = broadcast_interval
+        self._ticker_task: Optional[asyncio.Task] = None
+        self.tick_count = 0
+        self.last_fanout_seconds = 0.0
+        self.max_fanout_seconds = 0.0
+        self.total_fanout_seconds = 0.0
+
+        # Delta protocol: a full snapshot on connect, then sensor_update frames
+        # carrying only the sensors changed since the previous frame
+        self.snapshot_provider: Optional[Callable[[], dict]] = None
+        self.delta_window = delta_window
+        self.sequence = 0
+        self._changed: Dict[str, dict] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+        # Per-client subscriptions; clients without any receive every sensor
+        self.subscriptions = SubscriptionIndex(coordinates_for or (lambda sensor_id: None))
+
+        # Per-client wire encoding (json, msgpack or columnar); columnar frames
+        # refer to sensors by index into one shared dictionary
+        self.encodings: Dict[WebSocket, str] = {}
+        self.dictionary = SensorDictionary()
+
+        # Clients that asked for shared deflate get frames compressed once per
+        # broadcast instead of once per socket
+        self.compressed_clients: Set[WebSocket] = set()
+        self.compressor = FrameCompressor(level=compression_level, min_size=compression_min_size)
+        self.last_compress_seconds = 0.0
     
-    async def connect(self, websocket: WebSocket):
-        """Accept new WebSocket connection"""
+    async def connect(self, websocket: WebSocket, encoding: Optional[str] = None,
+                      compression: Optional[str] = None):
+        """Accept new WebSocket connection.
+
+        ``encoding`` (or the ``encoding`` query parameter) selects the wire
+        format; anything unknown falls back to JSON. ``compression=deflate``
+        turns on shared zlib compression of large frames.
+        """
         await websocket.accept()
-        self.active_connections.append(websocket)
-        connection_id = f"conn_{len(self.active_connections)}_{datetime.now().timestamp()}"
+        if encoding is None:
+            encoding = websocket.query_params.get("encoding")
+        if compression is None:
+            compression = websocket.query_params.get("compression")
+        encoding = negotiate(encoding)
+        compression = DEFLATE if (compression or "").lower() == DEFLATE else None
+        channel = OutboundChannel(
+            websocket,
+            max_queue=self.max_queue,
+            policy=self.slow_consumer_policy,
+            lag_threshold=self.lag_threshold,
+            on_close=self._on_channel_closed
+        )
+        self.active_connections[websocket] = channel
+        self.encodings[websocket] = encoding
+        if compression:
+            self.compressed_clients.add(websocket)
+        self._connection_counter += 1
+        connection_id = f"conn_{self._connection_counter}_{datetime.now().timestamp()}"
         self.connection_data[websocket] = {
             "id": connection_id,
             "connected_at": datetime.now(),
             "last_ping": datetime.now()
         }
+        channel.start()
         print(f"🔗 WebSocket connected: {connection_id}")
         
-        # Send welcome message
-        await self.send_personal_message({
+        # Send welcome message followed by the current snapshot
+        welcome = {
             "type": "connection",
             "message": "Connected to AirSense real-time data stream",
-            "connection_id": connection_id
-        }, websocket)
+            "connection_id": connection_id,
+            "seq": self.sequence,
+            "encoding": encoding,
+            "encodings": available_encodings(),
+            "compression": compression
+        }
+        if encoding == COLUMNAR:
+            welcome["metrics"] = list(METRICS)
+        await self.send_personal_message(welcome, websocket)
+        if encoding == COLUMNAR:
+            await self.send_personal_message(self.dictionary.message(), websocket)
+        await self.send_snapshot(websocket)
     
     def disconnect(self, websocket: WebSocket):
         """Remove WebSocket connection"""
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-            connection_info = self.connection_data.pop(websocket, {})
-            print(f"🔌 WebSocket disconnected: {connection_info.get('id', 'unknown')}")
+        channel = self.active_connections.pop(websocket, None)
+        if channel is None:
+            return
+        connection_info = self.connection_data.pop(websocket, {})
+        self.encodings.pop(websocket, None)
+        self.compressed_clients.discard(websocket)
+        self.subscriptions.remove_client(websocket)
+        channel.close()
+        print(f"🔌 WebSocket disconnected: {connection_info.get('id', 'unknown')}")
+
+    def _on_channel_closed(self, channel: OutboundChannel):
+        """Drop a connection whose writer failed or fell too far behind"""
+        if channel.close_reason == "lagging":
+            self.evicted_count += 1
+            print(f"🐢 Evicting slow WebSocket consumer (lag {self.lag_threshold or self.max_queue})")
+        self.disconnect(channel.websocket)
     
     async def send_personal_message(self, message: dict, websocket: WebSocket):
-        """Send message to specific WebSocket connection"""
-        try:
-            await websocket.send_text(json.dumps(message, default=str))
-        except Exception as e:
-            print(f"❌ Failed to send personal message: {e}")
-            self.disconnect(websocket)
+        """Queue a message for a specific WebSocket connection"""
+        channel = self.active_connections.get(websocket)
+        if channel is None:
+            return
+        self._offer(self._variants(lambda encoding: encode_message(message, encoding)),
+                    websocket, channel, message.get("type"))
+
+    def _variants(self, encode: Callable[[str], Frame]) -> _FrameVariants:
+        return _FrameVariants(encode, self.compressor)
+
+    def _offer(self, variants: _FrameVariants, websocket: WebSocket, channel: OutboundChannel,
+               kind: Optional[str]) -> bool:
+        # An offer can evict a lagging client mid-broadcast; later offers to it are skipped
+        encoding = self.encodings.get(websocket)
+        if encoding is None:
+            return False
+        return variants.offer(channel, encoding, websocket in self.compressed_clients, kind)
     
-    async def broadcast(self, message: str):
-        """Broadcast message to all connected WebSockets"""
-        if not self.active_connections:
+    async def broadcast(self, message: dict, kind: Optional[str] = None,
+                        targets: Optional[Dict[WebSocket, OutboundChannel]] = None):
+        """Queue a message for every connected WebSocket without waiting on any of them.
+
+        The message is encoded once per encoding in use (and compressed once
+        for clients that use compression).
+        """
+        if targets is None:
+            targets = self.active_connections
+        variants = self._variants(lambda encoding: encode_message(message, encoding))
+        for websocket, channel in list(targets.items()):
+            self._offer(variants, websocket, channel, kind)
+
+    def _sync_dictionary(self, sensor_ids):
+        """Add unseen sensors to the columnar dictionary and tell columnar clients.
+
+        Called before a columnar frame is encoded, so the delta is queued ahead
+        of the first frame that refers to the new indices.
+        """
+        added = self.dictionary.extend(sensor_ids)
+        if not added:
             return
-            
-        disconnected = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except Exception as e:
-                print(f"❌ Failed to broadcast to connection: {e}")
-                disconnected.append(connection)
-        
-        # Clean up disconnected connections
-        for connection in disconnected:
-            self.disconnect(connection)
+        message = self.dictionary.message(len(self.dictionary) - len(added))
+        variants = self._variants(lambda encoding: encode_message(message, encoding))
+        # Offers can evict (and so disconnect) clients as this loop runs
+        for websocket, encoding in list(self.encodings.items()):
+            channel = self.active_connections.get(websocket)
+            if encoding == COLUMNAR and channel is not None:
+                self._offer(variants, websocket, channel, "sensor_dictionary")
+
+    def _encode_sensors(self, message: dict, data: dict, encoding: str) -> Frame:
+        if encoding == COLUMNAR:
+            self._sync_dictionary(data)
+        return encode_sensor_frame(message, data, encoding, self.dictionary)
     
+    def _fan_out_sensors(self, message: dict, data: dict, kind: str,
+                         targets: Optional[Dict[WebSocket, OutboundChannel]] = None) -> int:
+        """Send ``message`` with ``data`` filtered to each client's subscriptions.
+
+        Clients without subscriptions share one frame per encoding with every
+        sensor; subscribed clients are grouped by the sensor subset routed to
+        them. Each distinct frame is encoded once per encoding and compressed
+        once. Returns frames queued.
+        """
+        if targets is None:
+            targets = self.active_connections
+        queued = 0
+        full = self._variants(lambda encoding: self._encode_sensors(message, data, encoding))
+        for websocket, channel in list(targets.items()):
+            if websocket not in self.subscriptions:
+                queued += self._offer(full, websocket, channel, kind)
+
+        if len(self.subscriptions):
+            queued += self._fan_out_subscribed(message, data, kind, targets)
+        self._resync_gaps(targets, kind)
+        return queued
+
+    def _fan_out_subscribed(self, message: dict, data: dict, kind: str,
+                            targets: Dict[WebSocket, OutboundChannel]) -> int:
+        queued = 0
+        groups: Dict[tuple, List[WebSocket]] = {}
+        for websocket, sensor_ids in self.subscriptions.route(data.keys()).items():
+            if websocket in targets:
+                groups.setdefault(tuple(sensor_ids), []).append(websocket)
+        for sensor_ids, websockets in groups.items():
+            subset = {sensor_id: data[sensor_id] for sensor_id in sensor_ids}
+            variants = self._variants(lambda encoding: self._encode_sensors(message, subset, encoding))
+            for websocket in websockets:
+                channel = targets.get(websocket)
+                if channel is not None:
+                    queued += self._offer(variants, websocket, channel, kind)
+        return queued
+
+    def _resync_gaps(self, targets: Dict[WebSocket, OutboundChannel], kind: str):
+        """Queue a snapshot for clients whose queue dropped a frame.
+
+        Clients only see a gap in ``seq`` if they receive every delta; filtered
+        clients skip sequence numbers anyway, so the server resyncs them all.
+        A snapshot that was just queued already covers the gap.
+        """
+        for websocket, channel in list(targets.items()):
+            if channel.gap:
+                if kind != "sensor_data":
+                    self._queue_snapshot(websocket, channel)
+                # Also covers any frame queueing the snapshot dropped
+                channel.gap = False
+
+    def _snapshot_data(self) -> Optional[dict]:
+        if self.snapshot_provider is None:
+            return None
+        return self.snapshot_provider() or None
+
+    async def send_snapshot(self, websocket: WebSocket):
+        """Send the full (subscription-filtered) snapshot to one connection"""
+        channel = self.active_connections.get(websocket)
+        if channel is not None:
+            self._queue_snapshot(websocket, channel)
+
+    def _queue_snapshot(self, websocket: WebSocket, channel: OutboundChannel):
+        data = self._snapshot_data()
+        if data is None:
+            return
+        if websocket in self.subscriptions:
+            data = {sensor_id: data[sensor_id]
+                    for sensor_id in self.subscriptions.route(data.keys()).get(websocket, [])}
+        message = {"type": "sensor_data", "seq": self.sequence}
+        self._offer(self._variants(lambda encoding: self._encode_sensors(message, data, encoding)),
+                    websocket, channel, "sensor_data")
+
+    def queue_sensor_update(self, sensor_id: str, data: dict):
+        """Record a changed sensor; changes are coalesced and sent after delta_window"""
+        self._changed[sensor_id] = data
+        if self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(self.delta_window, self._flush_changes)
+
+    def _flush_changes(self):
+        self._flush_handle = None
+        if not self._changed:
+            return
+        changed, self._changed = self._changed, {}
+        asyncio.ensure_future(self.broadcast_sensor_data(changed))
+
     async def broadcast_sensor_data(self, sensor_data: dict):
-        """Broadcast sensor data to all connections"""
+        """Broadcast a delta frame for the given sensors to subscribed connections"""
+        self.sequence += 1
         message = {
             "type": "sensor_update",
-            "timestamp": datetime.now().isoformat(),
-            "data": sensor_data
+            "seq": self.sequence,
+            "timestamp": datetime.now().isoformat()
         }
-        await self.broadcast(json.dumps(message, default=str))
+        # Deltas are never conflated: a client that misses one sees a gap in
+        # seq and asks for a resync
+        self._fan_out_sensors(message, sensor_data, "sensor_delta")
     
     async def broadcast_alert(self, alert: dict):
         """Broadcast alert to all connections"""
@@ -78,8 +314,133 @@ class ConnectionManager:
             "timestamp": datetime.now().isoformat(),
             "alert": alert
         }
-        await self.broadcast(json.dumps(message, default=str))
+        sensor_id = alert.get("sensor_id") if isinstance(alert, dict) else None
+        if sensor_id is None or not len(self.subscriptions):
+            await self.broadcast(message, "alert")
+            return
+        interested = self.subscriptions.match(sensor_id)
+        await self.broadcast(message, "alert", {
+            websocket: channel for websocket, channel in self.active_connections.items()
+            if websocket not in self.subscriptions or websocket in interested
+        })
     
+    async def handle_client_message(self, websocket: WebSocket, text: str):
+        """Handle a frame sent by the client"""
+        try:
+            message = json.loads(text)
+        except json.JSONDecodeError:
+            return
+        if not isinstance(message, dict):
+            return
+        message_type = message.get("type")
+        if message_type == "pong" and websocket in self.connection_data:
+            self.connection_data[websocket]["last_ping"] = datetime.now()
+        elif message_type == "resync":
+            if self.encodings.get(websocket) == COLUMNAR:
+                await self.send_personal_message(self.dictionary.message(), websocket)
+            await self.send_snapshot(websocket)
+        elif message_type in ("subscribe", "unsubscribe"):
+            await self._handle_subscription(websocket, message)
+
+    async def _handle_subscription(self, websocket: WebSocket, message: dict):
+        """Apply a subscribe/unsubscribe request.
+
+        Accepted fields: ``sensor_id``/``sensor_ids``, ``topic``/``topics``
+        (MQTT-style filters over ``airsense/sensors/<id>``), ``bbox``
+        ([min_lat, min_lon, max_lat, max_lon]) and, for unsubscribe, ``all``.
+        """
+        if websocket not in self.active_connections:
+            return
+        index = self.subscriptions
+        subscribe = message["type"] == "subscribe"
+        sensor_ids = list(message.get("sensor_ids") or [])
+        if message.get("sensor_id"):
+            sensor_ids.append(message["sensor_id"])
+        topics = list(message.get("topics") or [])
+        if message.get("topic"):
+            topics.append(message["topic"])
+        try:
+            if not subscribe and message.get("all"):
+                index.remove_client(websocket)
+            for sensor_id in sensor_ids:
+                if subscribe:
+                    index.subscribe_sensor(websocket, str(sensor_id))
+                else:
+                    index.unsubscribe_sensor(websocket, str(sensor_id))
+            for topic_filter in topics:
+                if subscribe:
+                    index.subscribe_topic(websocket, str(topic_filter))
+                else:
+                    index.unsubscribe_topic(websocket, str(topic_filter))
+            if message.get("bbox") is not None:
+                if subscribe:
+                    index.subscribe_bbox(websocket, message["bbox"])
+                else:
+                    index.unsubscribe_bbox(websocket, message["bbox"])
+        except (TypeError, ValueError) as e:
+            await self.send_personal_message({"type": "error", "message": str(e)}, websocket)
+            return
+
+        await self.send_personal_message({
+            "type": "subscriptions",
+            **index.get_subscriptions(websocket)
+        }, websocket)
+        await self.send_snapshot(websocket)
+
+    def start_broadcast_ticker(self, snapshot_provider: Callable[[], dict]):
+        """Start the shared ticker that broadcasts the sensor snapshot every interval"""
+        self.snapshot_provider = snapshot_provider
+        if self._ticker_task is None or self._ticker_task.done():
+            self._ticker_task = asyncio.create_task(self._broadcast_ticker())
+
+    async def stop_broadcast_ticker(self):
+        """Stop the shared broadcast ticker"""
+        if self._ticker_task:
+            self._ticker_task.cancel()
+            try:
+                await self._ticker_task
+            except asyncio.CancelledError:
+                pass
+            self._ticker_task = None
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+    async def _broadcast_ticker(self):
+        """Serialize the snapshot once per tick and fan it out to every client"""
+        while True:
+            await asyncio.sleep(self.broadcast_interval)
+            if not self.active_connections:
+                continue
+            try:
+                started = time.perf_counter()
+                compress_before = self.compressor.seconds
+                data = self._snapshot_data()
+                if data is None:
+                    continue
+                self._fan_out_sensors({"type": "sensor_data", "seq": self.sequence}, data, "sensor_data")
+                elapsed = time.perf_counter() - started
+                self.last_compress_seconds = self.compressor.seconds - compress_before
+                self.tick_count += 1
+                self.last_fanout_seconds = elapsed
+                self.total_fanout_seconds += elapsed
+                self.max_fanout_seconds = max(self.max_fanout_seconds, elapsed)
+            except Exception as e:
+                print(f"❌ Broadcast tick failed: {e}")
+
+    def get_broadcast_stats(self) -> dict:
+        """Get fan-out timing for the shared broadcast ticker"""
+        return {
+            "interval_seconds": self.broadcast_interval,
+            "delta_window_seconds": self.delta_window,
+            "sequence": self.sequence,
+            "ticks": self.tick_count,
+            "last_fanout_ms": round(self.last_fanout_seconds * 1000, 3),
+            "max_fanout_ms": round(self.max_fanout_seconds * 1000, 3),
+            "avg_fanout_ms": round(self.total_fanout_seconds * 1000 / self.tick_count, 3) if self.tick_count else 0.0,
+            "last_compress_ms": round(self.last_compress_seconds * 1000, 3)
+        }
+
     def get_connection_count(self) -> int:
         """Get number of active connections"""
         return len(self.active_connections)
@@ -97,21 +458,25 @@ class ConnectionManager:
     
     async def ping_connections(self):
         """Send ping to all connections to check health"""
-        message = {
+        await self.broadcast({
             "type": "ping",
             "timestamp": datetime.now().isoformat()
-        }
-        
-        disconnected = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(json.dumps(message, default=str))
-                if connection in self.connection_data:
-                    self.connection_data[connection]["last_ping"] = datetime.now()
-            except Exception as e:
-                print(f"❌ Ping failed for connection: {e}")
-                disconnected.append(connection)
-        
-        # Clean up disconnected connections
-        for connection in disconnected:
-            self.disconnect(connection)
+        }, "ping")
+
+    def get_fanout_stats(self) -> dict:
+        """Get aggregate delivery counters across all connections"""
+        stats = {"sent": 0, "conflated": 0, "dropped": 0, "max_lag": 0}
+        for channel in self.active_connections.values():
+            stats["sent"] += channel.sent
+            stats["conflated"] += channel.conflated
+            stats["dropped"] += channel.dropped
+            stats["max_lag"] = max(stats["max_lag"], channel.lag)
+        stats["evicted"] = self.evicted_count
+        stats["subscribed_clients"] = len(self.subscriptions)
+        stats["policy"] = self.slow_consumer_policy
+        stats["encodings"] = {}
+        for encoding in self.encodings.values():
+            stats["encodings"][encoding] = stats["encodings"].get(encoding, 0) + 1
+        stats["compressed_clients"] = len(self.compressed_clients)
+        stats["compression"] = self.compressor.get_stats()
+        return stats